@@ -9,27 +9,55 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), "src"))
 
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from datetime import date, datetime
+from functools import partial
 from pathlib import Path
 
-from aq_pipeline.fetch import fetch_openmeteo
-from aq_pipeline.clean import clean_daily
-from aq_pipeline.plot import plot_combined, plot_per_pollutant
+import pandas as pd
+
+from aq_pipeline.cache import DEFAULT_CACHE_DIR, ResponseCache
+from aq_pipeline.fetch import SETTLED_DAYS, fetch_openmeteo, fetch_openmeteo_batch
+from aq_pipeline.clean import daily_means, hourly_values, update_daily
+from aq_pipeline.manifest import Manifest
+from aq_pipeline.nowcast import hourly_aqi, latest
+from aq_pipeline.online import OnlineStats, stats_path, update_stats_file
+from aq_pipeline.plot import combined_job, pollutant_jobs
+from aq_pipeline.render import Renderer
 from aq_pipeline.report import write_summary_report
+from aq_pipeline import dag, rollup, storage
+from aq_pipeline.storage import dataset_path, read_frame, write_frame
 from aq_pipeline.utils import ensure_parent
 from src.config import CITIES as CITY_LOOKUP  # dict: {"city": {"lat":..,"lon":..}}
 
 # ---------------------------- helpers ----------------------------
 
+REPORT_OVERVIEW_ROWS = 24
+LOG_FORMAT = "%(asctime)s | %(levelname)s | %(message)s"
+
+
+def configure_logging(level: str = "INFO") -> None:
+    """Root logging for the main process and for stage worker processes."""
+    logging.basicConfig(level=getattr(logging, level), format=LOG_FORMAT)
+
+
 def slugify(s: str) -> str:
     return "".join(ch if ch.isalnum() else "_" for ch in s.lower()).strip("_")
 
 
 def make_paths(city_slug: str, timestamped: bool) -> dict[str, Path]:
+    """
+    Output locations for one city. Raw and processed data live in the Parquet
+    store (not timestamped); the *_csv paths are only used for CSV exports.
+    """
     stamp = f"_{date.today().isoformat()}" if timestamped else ""
     paths = {
-        "raw": Path(f"data/raw/{city_slug}_multi{stamp}.csv"),
-        "processed": Path(f"data/processed/{city_slug}_daily{stamp}.csv"),
+        "raw": dataset_path("raw", city_slug),
+        "processed": dataset_path("daily", city_slug),
+        "nowcast": dataset_path("nowcast", city_slug),
+        "raw_csv": Path(f"data/raw/{city_slug}_multi{stamp}.csv"),
+        "processed_csv": Path(f"data/processed/{city_slug}_daily{stamp}.csv"),
         "combined": Path(f"figures/{city_slug}_daily_combined{stamp}.png"),
         "per_pol_dir": Path("figures/per_pollutant"),
         "report": Path(f"reports/{city_slug}{stamp}.txt"),
@@ -41,6 +69,210 @@ def make_paths(city_slug: str, timestamped: bool) -> dict[str, Path]:
     return paths
 
 
+def window_settled(past_days: int | None, end: str | None) -> bool:
+    """True if a fetch window is fixed and old enough that the API will return the same data."""
+    if past_days is not None or not end:
+        return False
+    return (date.today() - date.fromisoformat(end)).days > SETTLED_DAYS
+
+
+def fetch_key(memo: Manifest, lat: float, lon: float, parameters: list[str], start: str | None, end: str | None) -> str:
+    return memo.key({"lat": lat, "lon": lon, "parameters": parameters, "start": start, "end": end})
+
+
+@dataclass(frozen=True)
+class CityJob:
+    """Everything the stages need to know about one city/point (picklable, for worker processes)."""
+    city_name: str | None
+    lat: float
+    lon: float
+    parameters: tuple[str, ...]
+    interpolate: bool
+    timestamped: bool
+    dpi: int
+    past_days: int | None
+    start: str | None
+    end: str | None
+    incremental: bool = False
+    export: bool = False
+    force: bool = False
+
+    @property
+    def slug(self) -> str:
+        return slugify(self.city_name or f"{self.lat}_{self.lon}")
+
+    @property
+    def label(self) -> str:
+        return self.city_name or self.slug
+
+    def paths(self) -> dict[str, Path]:
+        return make_paths(self.slug, self.timestamped)
+
+    def manifest(self) -> Manifest:
+        return Manifest.for_city(self.slug, force=self.force)
+
+
+@dataclass
+class StageResult:
+    """What a stage did. The manifest records are applied by the caller, so only one writer touches it."""
+    records: list[tuple[str, str, list[Path]]] = field(default_factory=list)
+    rendered: int = 0
+    skipped: int = 0
+
+
+def record_stage(job: CityJob, result: StageResult) -> None:
+    if result.records:
+        memo = job.manifest()
+        for stage, key, outputs in result.records:
+            memo.record(stage, key, outputs)
+
+
+# ---------------------------- stages -----------------------------
+
+def fetch_stage(job: CityJob, cache: ResponseCache | None = None, max_in_flight: int = 4) -> StageResult:
+    paths, memo = job.paths(), job.manifest()
+    key = fetch_key(memo, job.lat, job.lon, list(job.parameters), job.start, job.end)
+    if window_settled(job.past_days, job.end) and memo.fresh("fetch", key, [paths["raw"]]):
+        logging.info(f"=== {job.label}: FETCH (unchanged window, skipped) ===")
+        return StageResult()
+    logging.info(f"=== {job.label}: FETCH ===")
+    fetch_openmeteo(
+        lat=job.lat,
+        lon=job.lon,
+        parameters=list(job.parameters),
+        out_csv=paths["raw"],
+        past_days=job.past_days,
+        start_date=job.start,
+        end_date=job.end,
+        max_in_flight=max_in_flight,
+        cache=cache,
+        incremental=job.incremental,
+    )
+    return StageResult([("fetch", key, [paths["raw"]])])
+
+
+def clean_stage(job: CityJob) -> StageResult:
+    """Daily means, rollups and statistics, then the hourly NowCast."""
+    paths, memo = job.paths(), job.manifest()
+    out = StageResult()
+    # spans of raw hours written since the last run (see storage.read_changes)
+    changes = storage.read_changes(paths["raw"])
+    rollups = [dataset_path(rollup.layer(lv), job.slug) for lv in rollup.STORED_LEVELS]
+    clean_outputs = [paths["processed"], stats_path(paths["processed"]), *rollups]
+    clean_key = memo.key({"interpolate": job.interpolate}, [paths["raw"]])
+    full = not job.incremental or storage.FULL_SPAN in changes or not paths["processed"].exists()
+    raw = None
+    if memo.fresh("clean", clean_key, clean_outputs):
+        logging.info(f"=== {job.label}: CLEAN (inputs unchanged, skipped) ===")
+    else:
+        logging.info(f"=== {job.label}: CLEAN ===")
+        if full:
+            # raw is read once and reused for the rollups and the NowCast
+            raw = read_frame(paths["raw"], "time")
+            daily = daily_means(raw, interpolate=job.interpolate)
+            write_frame(daily, paths["processed"], "date")
+            changed_from = None
+            rollup.write_rollups(job.slug, hourly_values(raw, interpolate=job.interpolate))
+        else:
+            # only the days touched by the new hours are re-aggregated and spliced in
+            spliced = update_daily(paths["raw"], paths["processed"], changes, interpolate=job.interpolate)
+            daily = read_frame(paths["processed"], "date")
+            changed_from = spliced.index.min() if not spliced.empty else None
+            if changed_from is not None:
+                rollup.update_rollups(
+                    job.slug, paths["raw"], changed_from, spliced.index.max(), interpolate=job.interpolate
+                )
+        # an incremental run only folds the new days into the persisted statistics
+        update_stats_file(paths["processed"], daily, rebuild=full, changed_from=changed_from)
+        out.records.append(("clean", clean_key, clean_outputs))
+
+    nowcast_key = memo.key({}, [paths["raw"]])
+    hourly = None
+    if memo.fresh("nowcast", nowcast_key, [paths["nowcast"]]):
+        logging.info(f"=== {job.label}: NOWCAST (inputs unchanged, skipped) ===")
+    elif full or not paths["nowcast"].exists():
+        logging.info(f"=== {job.label}: NOWCAST ===")
+        if raw is None:
+            raw = read_frame(paths["raw"], "time")
+        hourly = hourly_aqi(raw)
+        write_frame(hourly.drop(columns="dominant"), paths["nowcast"], "time")
+    elif changes:
+        logging.info(f"=== {job.label}: NOWCAST ===")
+        # the NowCast looks back 12 hours, so a day of context is plenty
+        since = min(lo for lo, _ in changes)
+        recent = read_frame(paths["raw"], "time", start=since - pd.Timedelta(days=1))
+        hourly = hourly_aqi(recent).loc[since:]
+        storage.upsert_frame(hourly.drop(columns="dominant"), paths["nowcast"], "time")
+    if hourly is not None:
+        out.records.append(("nowcast", nowcast_key, [paths["nowcast"]]))
+        now = latest(hourly)
+        if now is not None:
+            logging.info(f"Current AQI (NowCast) {now['AQI']:.0f}, dominant {now['dominant']} at {now.name}")
+    storage.clear_changes(paths["raw"], changes)
+    return out
+
+
+def plot_stage(job: CityJob, renderer: Renderer | None = None) -> StageResult:
+    """Combined and per-pollutant figures; a shared `renderer` draws them in its pool."""
+    paths, memo = job.paths(), job.manifest()
+    daily = read_frame(paths["processed"], "date")
+    jobs = [combined_job(daily, paths["combined"], dpi=job.dpi)]
+    jobs += pollutant_jobs(daily, paths["per_pol_dir"], dpi=job.dpi, file_prefix=f"{job.slug}_")
+    figure_paths = [j.out_png for j in jobs]
+    key = memo.key({"dpi": job.dpi}, [paths["processed"]])
+    if memo.fresh("plot", key, figure_paths):
+        return StageResult()
+    local = renderer is None
+    renderer = renderer or Renderer(workers=1)
+    for p in renderer.render(jobs):
+        logging.info(f"Figure → {p}")
+    out = StageResult([("plot", key, figure_paths)])
+    if local:
+        out.rendered, out.skipped = renderer.rendered, renderer.skipped
+    return out
+
+
+def report_stage(job: CityJob) -> StageResult:
+    paths, memo = job.paths(), job.manifest()
+    daily = read_frame(paths["processed"], "date")
+    # the report overview uses the finest rollup level that fits in a short table
+    level = "monthly"
+    if not daily.empty:
+        level = rollup.pick_level(
+            daily.index.min(), daily.index.max(), max_points=REPORT_OVERVIEW_ROWS, levels=rollup.STORED_LEVELS
+        )
+    key = memo.key(
+        {"city": job.city_name, "incremental": job.incremental, "level": level},
+        [paths["processed"], stats_path(paths["processed"]), dataset_path(rollup.layer(level), job.slug)],
+    )
+    if memo.fresh("report", key, [paths["report"]]):
+        logging.info(f"Report unchanged → {paths['report']}")
+        return StageResult()
+    # an incremental run reports from the persisted statistics instead of re-analysing the history
+    stats = OnlineStats.load(stats_path(paths["processed"])) if job.incremental else None
+    write_summary_report(
+        daily,
+        paths["report"],
+        city=job.city_name,
+        metrics=stats.to_metrics() if stats is not None else None,
+        overview=rollup.load_level(job.slug, level, interpolate=job.interpolate),
+        overview_level=level,
+    )
+    return StageResult([("report", key, [paths["report"]])])
+
+
+def export_stage(job: CityJob) -> StageResult:
+    """Raw and daily data as CSV files."""
+    paths, memo = job.paths(), job.manifest()
+    outputs = [paths["raw_csv"], paths["processed_csv"]]
+    key = memo.key({}, [paths["raw"], paths["processed"]])
+    if memo.fresh("export", key, outputs):
+        return StageResult()
+    write_frame(read_frame(paths["raw"], "time"), paths["raw_csv"], "time")
+    write_frame(read_frame(paths["processed"], "date"), paths["processed_csv"], "date")
+    return StageResult([("export", key, outputs)])
+
+
 def run_one_city(
     city_name: str | None,
     lat: float,
@@ -52,34 +284,255 @@ def run_one_city(
     past_days: int | None,
     start: str | None,
     end: str | None,
-) -> None:
-    """Fetch -> clean -> plot -> report for a single city/point."""
-    city_slug = slugify(city_name or f"{lat}_{lon}")
-    paths = make_paths(city_slug, timestamped)
+    max_in_flight: int = 4,
+    cache: ResponseCache | None = None,
+    incremental: bool = False,
+    fetch: bool = True,
+    export: bool = False,
+    renderer: Renderer | None = None,
+    force: bool = False,
+) -> dict[str, Path]:
+    """
+    Fetch -> clean -> plot -> report for a single city/point, in this thread.
+    Returns the output paths.
+    With fetch=False the raw data is expected to exist already (e.g. from a batched fetch).
+    With export=True raw and daily data are also written as CSV files.
+    Figures go through `renderer` (shared across cities) or are drawn inline.
+    A stage is skipped when the city's manifest shows that its inputs and
+    parameters are unchanged since it last ran (unless `force`).
+    """
+    job = CityJob(
+        city_name, lat, lon, tuple(parameters), interpolate, timestamped, dpi,
+        past_days, start, end, incremental=incremental, export=export, force=force,
+    )
+    if fetch:
+        record_stage(job, fetch_stage(job, cache=cache, max_in_flight=max_in_flight))
+    record_stage(job, clean_stage(job))
+    logging.info(f"=== {job.label}: PLOT & REPORT ===")
+    record_stage(job, plot_stage(job, renderer))
+    record_stage(job, report_stage(job))
+    if export:
+        record_stage(job, export_stage(job))
+    paths = job.paths()
+    logging.info(f"Done: {job.label} → {paths['processed']}, {paths['combined']}, {paths['report']}")
+    return paths
 
-    logging.info(f"=== {city_name or city_slug}: FETCH ===")
-    fetch_openmeteo(
-        lat=lat,
-        lon=lon,
+
+def target_label(city_name: str | None, lat: float, lon: float) -> str:
+    return city_name or f"{lat},{lon}"
+
+
+def fetch_targets_batched(
+    targets: list[tuple[str | None, float, float]],
+    *,
+    parameters: list[str],
+    timestamped: bool,
+    past_days: int | None,
+    start: str | None,
+    end: str | None,
+    batch_size: int = 10,
+    max_in_flight: int = 4,
+    cache: ResponseCache | None = None,
+    incremental: bool = False,
+    force: bool = False,
+) -> dict[str, BaseException]:
+    """
+    FETCH stage for many cities at once, packing up to `batch_size` cities into
+    each Open-Meteo request. Cities whose settled window was already fetched
+    (per their manifest) are skipped. Returns {label: error} for cities that failed.
+    """
+    memos: dict[str, tuple[Manifest, str]] = {}
+    locations, out_paths = {}, {}
+    for c, lat, lon in targets:
+        label, slug = target_label(c, lat, lon), slugify(c or f"{lat}_{lon}")
+        raw = make_paths(slug, timestamped)["raw"]
+        memo = Manifest.for_city(slug, force=force)
+        key = fetch_key(memo, lat, lon, parameters, start, end)
+        if window_settled(past_days, end) and memo.fresh("fetch", key, [raw]):
+            logging.info(f"{label}: fetch window unchanged, skipped")
+            continue
+        memos[label] = (memo, key)
+        locations[label] = (lat, lon)
+        out_paths[label] = raw
+    if not locations:
+        return {}
+    logging.info(f"=== FETCH (batched, {len(locations)} cities, batch size {batch_size}) ===")
+    _paths, errors = fetch_openmeteo_batch(
+        locations=locations,
         parameters=parameters,
-        out_csv=paths["raw"],
+        out_paths=out_paths,
         past_days=past_days,
         start_date=start,
         end_date=end,
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+        cache=cache,
+        incremental=incremental,
     )
+    for label, (memo, key) in memos.items():
+        if label not in errors:
+            memo.record("fetch", key, [out_paths[label]])
+    return errors
+
+
+def fetch_batch_stage(batch: list[tuple[str | None, float, float]], **kwargs) -> dict[str, BaseException]:
+    """
+    `fetch_targets_batched` for one batch of cities, as a graph node. A failure
+    of the whole call becomes the error of each city in the batch.
+    """
+    try:
+        return fetch_targets_batched(batch, **kwargs)
+    except Exception as e:
+        logging.error(f"Batched fetch for {[target_label(*t) for t in batch]} failed: {e}")
+        return {target_label(*t): e for t in batch}
+
+
+def batch_outcome(fetch_errors: dict[str, BaseException], label: str) -> StageResult:
+    """A city's share of its batched fetch: fails with the error its batch recorded for it, if any."""
+    if label in fetch_errors:
+        raise fetch_errors[label]
+    return StageResult()
+
+
+def run_targets(
+    targets: list[tuple[str | None, float, float]],
+    workers: int = 1,
+    **kwargs,
+) -> tuple[dict[str, dict[str, Path]], dict[str, BaseException]]:
+    """
+    Run `run_one_city` for every target, at most `workers` at a time.
+    A failing city is logged and recorded; the remaining cities still run.
+    Returns ({label: paths}, {label: error}).
+    """
+    results: dict[str, dict[str, Path]] = {}
+    errors: dict[str, BaseException] = {}
+
+    workers = max(1, min(int(workers), len(targets) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="city") as pool:
+        futures = {
+            pool.submit(run_one_city, city_name=city_name, lat=lat, lon=lon, **kwargs):
+                target_label(city_name, lat, lon)
+            for city_name, lat, lon in targets
+        }
+        for fut in as_completed(futures):
+            name = futures[fut]
+            try:
+                results[name] = fut.result()
+            except Exception as e:
+                logging.exception(f"{name}: pipeline failed")
+                errors[name] = e
+    return results, errors
+
+
+def run_graph(
+    targets: list[tuple[str | None, float, float]],
+    *,
+    io_workers: int = 4,
+    cpu_workers: int = 0,
+    queue_size: int = 2,
+    fetch: bool = True,
+    batch_size: int = 1,
+    cache: ResponseCache | None = None,
+    max_in_flight: int = 4,
+    log_level: str = "INFO",
+    **job_kwargs,
+) -> tuple[dict[str, dict[str, Path]], dict[str, BaseException], StageResult]:
+    """
+    Run every target as a DAG of stage nodes (see aq_pipeline.dag): fetch and
+    export on `io_workers` threads, clean/plot/report on `cpu_workers` processes,
+    so one city's fetch overlaps another's cleaning and rendering. Returns
+    ({label: paths}, {label: error}, figure totals).
+
+    With `batch_size` > 1 cities are fetched `batch_size` at a time through
+    `fetch_targets_batched`, one node per batch; each city's clean waits only for
+    its own batch, and a city its batch failed to fetch is dropped.
+    """
+    graph = dag.Graph()
+    jobs: dict[str, CityJob] = {}
+    batch_nodes: set[str] = set()
+    fetch_errors: dict[str, BaseException] = {}  # filled in by on_done as batches finish
+    batch_of: dict[str, str] = {}
+    if fetch and batch_size > 1:
+        fetch_kwargs = dict(
+            parameters=list(job_kwargs["parameters"]), timestamped=job_kwargs["timestamped"],
+            past_days=job_kwargs["past_days"], start=job_kwargs["start"], end=job_kwargs["end"],
+            batch_size=batch_size, max_in_flight=max_in_flight, cache=cache,
+            incremental=job_kwargs.get("incremental", False), force=job_kwargs.get("force", False),
+        )
+        for i in range(0, len(targets), batch_size):
+            batch = targets[i:i + batch_size]
+            node = graph.add(
+                f"fetch-batch/{i // batch_size}", partial(fetch_batch_stage, batch, **fetch_kwargs), stage="fetch"
+            )
+            batch_nodes.add(node)
+            batch_of.update({target_label(*t): node for t in batch})
 
-    logging.info(f"=== {city_name or city_slug}: CLEAN ===")
-    clean_daily(in_csv=paths["raw"], out_csv=paths["processed"], interpolate=interpolate)
-
-    logging.info(f"=== {city_name or city_slug}: PLOT & REPORT ===")
-    plot_combined(paths["processed"], paths["combined"], dpi=dpi)
-    plot_per_pollutant(paths["processed"], paths["per_pol_dir"], dpi=dpi)
-    write_summary_report(paths["processed"], paths["report"], city=city_name)
-
-    logging.info(
-        f"Done: {city_name or city_slug} → {paths['processed']}, {paths['combined']}, {paths['report']}"
+    for city_name, lat, lon in targets:
+        label = target_label(city_name, lat, lon)
+        job = jobs[label] = CityJob(city_name, lat, lon, **job_kwargs)
+        deps = []
+        if label in batch_of:
+            deps = [graph.add(
+                f"{label}/fetch", partial(batch_outcome, fetch_errors, label), deps=[batch_of[label]], stage="fetched"
+            )]
+        elif fetch:
+            deps = [graph.add(f"{label}/fetch", partial(fetch_stage, job, cache, max_in_flight), stage="fetch")]
+        clean = graph.add(f"{label}/clean", partial(clean_stage, job), deps=deps, kind="cpu", stage="clean")
+        graph.add(f"{label}/plot", partial(plot_stage, job), deps=[clean], kind="cpu", stage="plot")
+        graph.add(f"{label}/report", partial(report_stage, job), deps=[clean], kind="cpu", stage="report")
+        if job.export:
+            graph.add(f"{label}/export", partial(export_stage, job), deps=[clean], stage="export")
+
+    remaining = {label: sum(n.startswith(f"{label}/") for n in graph.nodes) for label in jobs}
+
+    def on_done(name: str, result: StageResult) -> None:
+        if name in batch_nodes:
+            fetch_errors.update(result)
+            return
+        label = name.rsplit("/", 1)[0]
+        record_stage(jobs[label], result)
+        remaining[label] -= 1
+        if remaining[label] == 0:
+            paths = jobs[label].paths()
+            logging.info(f"Done: {label} → {paths['processed']}, {paths['combined']}, {paths['report']}")
+
+    node_results, node_errors = dag.run(
+        graph,
+        io_workers=io_workers,
+        cpu_workers=cpu_workers,
+        queue_size=queue_size,
+        on_done=on_done,
+        cpu_initializer=configure_logging,
+        cpu_initargs=(log_level,),
     )
 
+    results: dict[str, dict[str, Path]] = {}
+    errors: dict[str, BaseException] = {}
+    for name, e in node_errors.items():
+        label = name.rsplit("/", 1)[0]
+        if not isinstance(e, dag.UpstreamFailed):
+            logging.error(f"{name}: {type(e).__name__}: {e}")
+            errors.setdefault(label, e)
+    for label, job in jobs.items():
+        if label not in errors:
+            results[label] = job.paths()
+    figures = StageResult()
+    for name, r in node_results.items():
+        if name in batch_nodes:
+            continue
+        figures.rendered += r.rendered
+        figures.skipped += r.skipped
+    return results, errors, figures
+
+
+def log_summary(results: dict[str, dict[str, Path]], errors: dict[str, BaseException]) -> None:
+    """Log one line per city with its outputs or the error that stopped it."""
+    logging.info(f"=== SUMMARY: {len(results)} ok, {len(errors)} failed ===")
+    for name in sorted(results):
+        logging.info(f"  OK     {name}: {results[name]['processed']}")
+    for name in sorted(errors):
+        logging.error(f"  FAILED {name}: {type(errors[name]).__name__}: {errors[name]}")
+
 
 # ----------------------------- main ------------------------------
 
@@ -108,8 +561,76 @@ def main() -> None:
         action="store_true",
         help="Disable interpolation during daily cleaning.",
     )
-    ap.add_argument("--timestamp", action="store_true", help="Append today's date to output filenames.")
+    ap.add_argument(
+        "--timestamp",
+        action="store_true",
+        help="Append today's date to exported CSV, figure and report filenames.",
+    )
+    ap.add_argument(
+        "--export-csv",
+        action="store_true",
+        help="Also export raw and daily data as CSV under data/raw and data/processed.",
+    )
     ap.add_argument("--dpi", type=int, default=150, help="Figure DPI.")
+    ap.add_argument(
+        "--render-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="With --scheduler threads: processes for drawing figures (default: CPU count; 1 draws inline).",
+    )
+    ap.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of cities to process concurrently (default 1 = sequential). "
+             "With --scheduler dag: threads for the fetch/export stages.",
+    )
+    ap.add_argument(
+        "--scheduler",
+        choices=["dag", "threads"],
+        default="dag",
+        help="dag: stages of all cities as one graph, fetch on threads and clean/plot/report on processes; "
+             "threads: each city runs its stages in turn on one of --workers threads.",
+    )
+    ap.add_argument(
+        "--cpu-workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="With --scheduler dag: processes for the clean/plot/report stages (0 runs them on threads).",
+    )
+    ap.add_argument(
+        "--queue-size",
+        type=int,
+        default=2,
+        help="With --scheduler dag: max cities finished by a stage and waiting for the next one.",
+    )
+    ap.add_argument(
+        "--window-concurrency",
+        type=int,
+        default=4,
+        help="Max date windows fetched concurrently per city for long spans.",
+    )
+
+    # response cache
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="On-disk API response cache directory.")
+    ap.add_argument("--no-cache", action="store_true", help="Always download; do not read or write the cache.")
+    ap.add_argument(
+        "--batch-size",
+        type=int,
+        default=10,
+        help="With --cities, max cities packed into one Open-Meteo request (1 disables batching).",
+    )
+    ap.add_argument("--offline", action="store_true", help="Serve all data from the cache; never hit the network.")
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only fetch hours missing from the stored raw data and merge them in.",
+    )
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-run every stage even if the manifest shows its inputs are unchanged.",
+    )
 
     # date range
     ap.add_argument(
@@ -126,10 +647,7 @@ def main() -> None:
 
     args = ap.parse_args()
 
-    logging.basicConfig(
-        level=getattr(logging, args.log_level),
-        format="%(asctime)s | %(levelname)s | %(message)s",
-    )
+    configure_logging(args.log_level)
 
     # ---- validate/normalize date range ----
     start = args.start
@@ -181,20 +699,96 @@ def main() -> None:
             raise SystemExit("Provide --city/--cities OR both --lat and --lon.")
         targets.append((None, float(args.lat), float(args.lon)))
 
-    # ---- run pipeline for each target ----
-    for city_name, lat, lon in targets:
-        run_one_city(
-            city_name=city_name,
-            lat=lat,
-            lon=lon,
+    if args.workers < 1:
+        raise SystemExit("--workers must be >= 1.")
+    if args.window_concurrency < 1:
+        raise SystemExit("--window-concurrency must be >= 1.")
+    if args.batch_size < 1:
+        raise SystemExit("--batch-size must be >= 1.")
+    if args.render_workers < 1:
+        raise SystemExit("--render-workers must be >= 1.")
+    if args.cpu_workers < 0:
+        raise SystemExit("--cpu-workers must be >= 0.")
+    if args.queue_size < 1:
+        raise SystemExit("--queue-size must be >= 1.")
+    if args.offline and args.no_cache:
+        raise SystemExit("--offline needs the cache; drop --no-cache.")
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, offline=args.offline)
+
+    # ---- batched fetch for --cities (the dag scheduler fetches batches as graph nodes) ----
+    batch_size = args.batch_size if args.cities else 1
+    fetch_errors: dict[str, BaseException] = {}
+    fetch_each = True
+    if args.scheduler == "threads" and batch_size > 1:
+        fetch_errors = fetch_targets_batched(
+            targets,
             parameters=parameters,
+            timestamped=args.timestamp,
+            past_days=past_days,
+            start=start,
+            end=end,
+            batch_size=args.batch_size,
+            max_in_flight=args.window_concurrency,
+            cache=cache,
+            incremental=args.incremental,
+            force=args.force,
+        )
+        targets = [t for t in targets if target_label(*t) not in fetch_errors]
+        fetch_each = False
+
+    # ---- run pipeline for each target ----
+    if args.scheduler == "dag":
+        results, errors, figures = run_graph(
+            targets,
+            io_workers=args.workers,
+            cpu_workers=args.cpu_workers,
+            queue_size=args.queue_size,
+            batch_size=batch_size,
+            cache=cache,
+            max_in_flight=args.window_concurrency,
+            log_level=args.log_level,
+            parameters=tuple(parameters),
             interpolate=interpolate,
             timestamped=args.timestamp,
             dpi=args.dpi,
             past_days=past_days,
             start=start,
             end=end,
+            incremental=args.incremental,
+            export=args.export_csv,
+            force=args.force,
         )
+    else:
+        renderer = Renderer(workers=args.render_workers)
+        try:
+            results, errors = run_targets(
+                targets,
+                workers=args.workers,
+                parameters=parameters,
+                interpolate=interpolate,
+                timestamped=args.timestamp,
+                dpi=args.dpi,
+                past_days=past_days,
+                start=start,
+                end=end,
+                max_in_flight=args.window_concurrency,
+                cache=cache,
+                incremental=args.incremental,
+                fetch=fetch_each,
+                export=args.export_csv,
+                renderer=renderer,
+                force=args.force,
+            )
+        finally:
+            renderer.close()
+        figures = StageResult(rendered=renderer.rendered, skipped=renderer.skipped)
+    errors.update(fetch_errors)
+    log_summary(results, errors)
+    if cache is not None:
+        logging.info(f"Cache: {cache.hits} hits, {cache.misses} misses ({cache.root})")
+    logging.info(f"Figures: {figures.rendered} rendered, {figures.skipped} unchanged")
+    if errors:
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
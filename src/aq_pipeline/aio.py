@@ -0,0 +1,254 @@
+# src/aq_pipeline/aio.py
+"""
+Asyncio HTTP client, for fetching many windows, locations or pages at once
+from one event loop instead of one thread per request.
+
+    max_concurrency   requests in flight overall (a semaphore)
+    per_host          requests in flight per host (the connection limit)
+    rate_per_sec      per-host token bucket; waiting for a token yields to the loop
+
+Uses aiohttp when it is installed. Otherwise each attempt runs on a pooled
+`requests.Session` in a worker thread, under the same limits. Retries follow
+`HttpClient`: backoff with full jitter on connection errors and on
+`retry_statuses`, honoring `Retry-After`.
+
+A client made with `from_client(http_client.get_client())` (the default for
+the fetchers) draws on the process-wide rate buckets and session, so limits
+hold across threads that each run their own event loop.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import functools
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Mapping
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import decode
+from .http_client import RETRY_STATUSES, HttpClient, TokenBucket, _retry_after_seconds, get_client
+from .utils import get_logger
+
+try:  # pragma: no cover - depends on the environment
+    import aiohttp as _aiohttp
+except ImportError:  # pragma: no cover
+    _aiohttp = None
+
+log = get_logger("aq_pipeline")
+
+BACKENDS = ("aiohttp", "thread")
+
+_TRANSPORT_ERRORS: tuple = (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError)
+if _aiohttp is not None:  # pragma: no cover
+    _TRANSPORT_ERRORS += (_aiohttp.ClientConnectionError,)
+
+
+def default_backend() -> str:
+    return "aiohttp" if _aiohttp is not None else "thread"
+
+
+@dataclass
+class AsyncResponse:
+    """A fully read response (the body is in memory once `get` returns)."""
+
+    url: str
+    status_code: int
+    headers: Mapping[str, str]
+    content: bytes
+    elapsed: float = 0.0  # seconds on the wire, excluding time spent queued for limits
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self) -> Any:
+        return decode.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+async def acquire(bucket: TokenBucket, tokens: float = 1.0) -> None:
+    """Take a token from `bucket`, sleeping on the event loop (not the thread) while it is empty."""
+    while True:
+        wait_s = bucket.try_acquire(tokens)
+        if wait_s <= 0:
+            return
+        await asyncio.sleep(wait_s)
+
+
+# ---- client ----------------------------------------------------------------
+
+class AsyncHttpClient:
+    """
+    Rate-limited, retrying GET for coroutines. Use as `async with AsyncHttpClient() as c`
+    (or call `aclose()`); one instance belongs to one event loop.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = 64,
+        per_host: int = 16,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        rate_per_sec: float = 5.0,
+        burst: float = 10.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        backend: str | None = None,
+        session: requests.Session | None = None,
+        shared: HttpClient | None = None,
+    ) -> None:
+        backend = backend or default_backend()
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend {backend!r}; expected one of {BACKENDS}")
+        if backend == "aiohttp" and _aiohttp is None:
+            raise RuntimeError("The 'aiohttp' backend needs the optional 'aiohttp' package.")
+        self.backend = backend
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host = max(1, per_host)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.retry_statuses = frozenset(retry_statuses)
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._buckets: Dict[str, TokenBucket] = {}
+        self.shared = shared
+        self._session = session if session is not None or shared is None else shared.session
+        self._own_session = self._session is None
+        self._aio_session = None
+        self._pool: ThreadPoolExecutor | None = None
+
+    @classmethod
+    def from_client(cls, client: HttpClient, **kw) -> "AsyncHttpClient":
+        """A client with `client`'s retry and rate settings that shares its rate buckets and session."""
+        settings = dict(
+            max_retries=client.max_retries, backoff_base=client.backoff_base, backoff_max=client.backoff_max,
+            rate_per_sec=client.rate_per_sec, burst=client.burst, retry_statuses=client.retry_statuses,
+        )
+        return cls(**{**settings, **kw}, shared=client)
+
+    async def __aenter__(self) -> "AsyncHttpClient":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._aio_session is not None:
+            await self._aio_session.close()
+            self._aio_session = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        if self._session is not None and self._own_session:
+            self._session.close()
+            self._session = None
+
+    def _limits(self, url: str) -> tuple[asyncio.Semaphore, TokenBucket]:
+        host = urlsplit(url).netloc
+        if host not in self._hosts:
+            self._hosts[host] = asyncio.Semaphore(self.per_host)
+            if self.shared is not None:
+                self._buckets[host] = self.shared.bucket(url)
+            else:
+                self._buckets[host] = TokenBucket(self.rate_per_sec, self.burst)
+        return self._hosts[host], self._buckets[host]
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _send(self, url: str, params: Dict[str, Any] | None, timeout: float) -> AsyncResponse:
+        """One attempt, no retries."""
+        if self.backend == "aiohttp":  # pragma: no cover - needs aiohttp
+            if self._aio_session is None:
+                connector = _aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=self.per_host)
+                self._aio_session = _aiohttp.ClientSession(connector=connector)
+            query = {k: str(v) for k, v in (params or {}).items()}
+            async with self._aio_session.get(
+                url, params=query, timeout=_aiohttp.ClientTimeout(total=timeout)
+            ) as r:
+                body = await r.read()
+                return AsyncResponse(str(r.url), r.status, r.headers, body)
+
+        if self._session is None:
+            self._session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=self.per_host, pool_maxsize=self.per_host, max_retries=0)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.max_concurrency, thread_name_prefix="aio-http")
+        call = functools.partial(self._session.get, url, params=params, timeout=timeout)
+        r = await asyncio.get_running_loop().run_in_executor(self._pool, call)
+        try:
+            return AsyncResponse(r.url, r.status_code, r.headers, r.content)
+        finally:
+            r.close()
+
+    async def get(self, url: str, *, params: Dict[str, Any] | None = None, timeout: float = 30) -> AsyncResponse:
+        """
+        GET with concurrency limits, rate limiting and retries, like `HttpClient.get`.
+        Backoff sleeps hold no slot, so other requests proceed meanwhile.
+        """
+        host, bucket = self._limits(url)
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with host, self._slots:
+                    await acquire(bucket)
+                    t0 = time.perf_counter()
+                    resp = await self._send(url, params, timeout)
+                    resp.elapsed = time.perf_counter() - t0
+            except _TRANSPORT_ERRORS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                log.warning(f"{type(e).__name__} on {url}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            if resp.status_code not in self.retry_statuses or attempt >= self.max_retries:
+                return resp
+            retry_after = _retry_after_seconds(resp)
+            delay = min(self.backoff_max, retry_after) if retry_after is not None else self._backoff(attempt)
+            log.warning(f"HTTP {resp.status_code} on {url}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        raise AssertionError("unreachable")
+
+
+@contextlib.asynccontextmanager
+async def using(client: AsyncHttpClient | None = None):
+    """
+    Yield `client`, or a new client on the process-wide `HttpClient` (see
+    `AsyncHttpClient.from_client`) that is closed on exit.
+    """
+    if client is not None:
+        yield client
+        return
+    async with AsyncHttpClient.from_client(get_client()) as own:
+        yield own
+
+
+# ---- sync bridge -----------------------------------------------------------
+
+def run(coro):
+    """
+    Run `coro` to completion from sync code. If this thread already runs an
+    event loop (e.g. a notebook), it runs on a fresh loop in a worker thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    with ThreadPoolExecutor(1, thread_name_prefix="aio-run") as pool:
+        return pool.submit(asyncio.run, coro).result()
@@ -2,10 +2,12 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Mapping
 import numpy as np
 import pandas as pd
 
+from . import storage
+
 
 @dataclass
 class SeriesStats:
@@ -18,68 +20,136 @@ class SeriesStats:
     anomalies: int
 
 
-def _trend_slope_per_day(s: pd.Series) -> float | None:
+# ---- vectorized engine -----------------------------------------------------
+
+_UNIX_EPOCH_ORDINAL = 719163  # date(1970, 1, 1).toordinal()
+
+
+def _day_ordinals(index: pd.Index) -> np.ndarray:
+    """Proleptic Gregorian ordinals of a DatetimeIndex, as float (matches Timestamp.toordinal)."""
+    days = pd.DatetimeIndex(index).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    return (days + _UNIX_EPOCH_ORDINAL).astype(float)
+
+
+def _nan_quantiles(values: np.ndarray, count: np.ndarray, qs: list[float]) -> np.ndarray:
     """
-    Simple OLS slope on daily index (as ordinal) vs value.
-    Returns slope in 'units per day'. None if < 3 points.
+    Column-wise linear-interpolated quantiles ignoring NaN, for all columns at once.
+    Same interpolation as numpy/pandas 'linear'. Returns shape (len(qs), n_cols).
     """
-    s = s.dropna()
-    if len(s) < 3:
-        return None
-    x = s.index.map(pd.Timestamp.toordinal).to_numpy(dtype=float)
-    y = s.to_numpy(dtype=float)
-    # polyfit degree 1 -> slope
-    slope, _intercept = np.polyfit(x, y, 1)
-    return float(slope)
+    if values.shape[0] == 0:
+        return np.full((len(qs), values.shape[1]), np.nan)
+    srt = np.sort(values, axis=0)  # NaN sorts last
+    last = np.maximum(count - 1, 0)
+    out = np.empty((len(qs), values.shape[1]))
+    for i, q in enumerate(qs):
+        pos = last * q
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.minimum(lo + 1, last)
+        t = pos - lo
+        a = np.take_along_axis(srt, lo[None, :], axis=0)[0]
+        b = np.take_along_axis(srt, hi[None, :], axis=0)[0]
+        # numpy's lerp: symmetric form keeps results identical to np.quantile
+        out[i] = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+    out[:, count == 0] = np.nan
+    return out
 
 
-def _iqr_anomaly_count(s: pd.Series, k: float = 1.5) -> int:
+def metrics_arrays(values: np.ndarray, x: np.ndarray, k: float = 1.5) -> Dict[str, np.ndarray]:
     """
-    Count values outside [Q1 - k*IQR, Q3 + k*IQR].
-    Uses non-NA values only.
+    NaN-aware metrics for every column of a (day × series) array in one pass.
+    `x` holds the day ordinals of the rows. Returns arrays of length n_series:
+    count, mean, max, p95, anomalies (IQR rule with factor `k`) and slope
+    (closed-form OLS of value on day; NaN where fewer than 3 points).
     """
-    s = s.dropna()
-    if s.empty:
-        return 0
-    q1 = s.quantile(0.25)
-    q3 = s.quantile(0.75)
+    values = np.asfortranarray(values, dtype=float)  # contiguous columns -> pairwise sums
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=0)
+    has = count > 0
+    safe_count = np.where(has, count, 1)
+
+    total = np.where(valid, values, 0.0).sum(axis=0)
+    mean = np.where(has, total / safe_count, np.nan)
+    vmax = np.where(has, np.where(valid, values, -np.inf).max(axis=0, initial=-np.inf), np.nan)
+
+    q1, q3, p95 = _nan_quantiles(values, count, [0.25, 0.75, 0.95])
     iqr = q3 - q1
-    lo = q1 - k * iqr
-    hi = q3 + k * iqr
-    return int(((s < lo) | (s > hi)).sum())
+    with np.errstate(invalid="ignore"):
+        outside = (values < (q1 - k * iqr)) | (values > (q3 + k * iqr))
+    anomalies = outside.sum(axis=0)
+
+    # OLS slope = Sxy / Sxx over each column's valid rows, centered for stability
+    xs = np.where(valid, x[:, None], 0.0)
+    x_mean = xs.sum(axis=0) / safe_count
+    dx = np.where(valid, x[:, None] - x_mean, 0.0)
+    dy = np.where(valid, values - mean, 0.0)
+    sxx = (dx * dx).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = np.where((count >= 3) & (sxx > 0), (dx * dy).sum(axis=0) / sxx, np.nan)
+
+    return {
+        "count": count,
+        "mean": mean,
+        "max": vmax,
+        "p95": p95,
+        "anomalies": anomalies,
+        "slope": slope,
+    }
+
+
+def _opt(v: float) -> float | None:
+    return None if np.isnan(v) else float(v)
+
+
+def _to_stats(arrays: Dict[str, np.ndarray], j: int, n_days: int) -> SeriesStats:
+    c = int(arrays["count"][j])
+    return SeriesStats(
+        days=n_days,
+        coverage_pct=0.0 if n_days == 0 else round(100 * c / n_days, 1),
+        mean=_opt(arrays["mean"][j]),
+        max=_opt(arrays["max"][j]),
+        p95=_opt(arrays["p95"][j]),
+        trend_slope_per_day=_opt(arrays["slope"][j]),
+        anomalies=int(arrays["anomalies"][j]),
+    )
 
 
 def compute_metrics(daily_df: pd.DataFrame) -> Dict[str, SeriesStats]:
     """
     For each pollutant column, compute coverage, moments, p95,
     trend slope (per day), and simple IQR-based anomaly count.
+    All columns are processed together by `metrics_arrays`.
     """
-    out: Dict[str, SeriesStats] = {}
     n_days = int(len(daily_df))
-    for col in daily_df.columns:
-        s = daily_df[col].dropna()
-        coverage = 0.0 if n_days == 0 else round(100 * len(s) / n_days, 1)
-        mean = float(s.mean()) if not s.empty else None
-        vmax = float(s.max()) if not s.empty else None
-        p95 = float(s.quantile(0.95)) if not s.empty else None
-        slope = _trend_slope_per_day(daily_df[col])
-        anomalies = _iqr_anomaly_count(daily_df[col])
-        out[col] = SeriesStats(
-            days=n_days,
-            coverage_pct=coverage,
-            mean=mean,
-            max=vmax,
-            p95=p95,
-            trend_slope_per_day=slope,
-            anomalies=anomalies,
-        )
+    if n_days == 0:
+        return {col: SeriesStats(0, 0.0, None, None, None, None, 0) for col in daily_df.columns}
+    values = daily_df.to_numpy(dtype=float, na_value=np.nan).reshape(n_days, len(daily_df.columns))
+    arrays = metrics_arrays(values, _day_ordinals(daily_df.index))
+    return {col: _to_stats(arrays, j, n_days) for j, col in enumerate(daily_df.columns)}
+
+
+def compute_metrics_stack(frames: Mapping[str, pd.DataFrame]) -> Dict[str, Dict[str, SeriesStats]]:
+    """
+    `compute_metrics` for many cities in one pass: the daily frames are aligned on
+    the union of their dates into one (day × city·pollutant) array. Coverage is
+    still relative to each city's own number of days.
+    Returns {city: {pollutant: SeriesStats}}.
+    """
+    frames = {city: df for city, df in frames.items()}
+    if not frames:
+        return {}
+    wide = pd.concat(frames, axis=1, sort=True)
+    values = wide.to_numpy(dtype=float, na_value=np.nan).reshape(len(wide), wide.shape[1])
+    arrays = metrics_arrays(values, _day_ordinals(wide.index))
+    out: Dict[str, Dict[str, SeriesStats]] = {city: {} for city in frames}
+    for j, (city, col) in enumerate(wide.columns):
+        out[city][col] = _to_stats(arrays, j, int(len(frames[city])))
     return out
 
 
-def analyze_csv(daily_csv: str | "os.PathLike[str]") -> tuple[pd.DataFrame, Dict[str, SeriesStats]]:
+def analyze_csv(daily_csv: str | "os.PathLike[str]" | pd.DataFrame) -> tuple[pd.DataFrame, Dict[str, SeriesStats]]:
     """
-    Convenience: load daily CSV, return (df, metrics).
+    Convenience: load daily data (CSV, Parquet dataset or DataFrame), return (df, metrics).
     """
-    df = pd.read_csv(daily_csv, parse_dates=["date"]).set_index("date").sort_index()
+    df = storage.read_frame(daily_csv, "date")
     metrics = compute_metrics(df)
     return df, metrics
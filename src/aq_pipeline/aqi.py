@@ -0,0 +1,213 @@
+# src/aq_pipeline/aqi.py
+"""
+US EPA Air Quality Index, computed over whole columns (and 2-D city stacks).
+
+Sub-indices use the EPA breakpoint tables with a `searchsorted` lookup after
+truncating concentrations to the table's precision. Each pollutant has its own
+averaging period:
+
+    pm2_5              24-hour mean          µg/m³, truncated to 0.1
+    pm10               24-hour mean          µg/m³, truncated to 1
+    nitrogen_dioxide   daily max 1-hour      ppb,   truncated to 1
+    carbon_monoxide    daily max 8-hour mean ppm,   truncated to 0.1
+
+Open-Meteo reports every pollutant in µg/m³; NO2 and CO are converted to ppb /
+ppm at 25 °C. `daily_inputs` derives the per-day averages from hourly data; a
+frame of daily means can be passed straight to `aqi_frame` (NO2/CO are then
+only approximations, since the daily mean understates the peak hours).
+"""
+from __future__ import annotations
+
+from typing import Dict, Mapping
+
+import numpy as np
+import pandas as pd
+
+# ---- breakpoint tables -----------------------------------------------------
+
+# (C_low, C_high, I_low, I_high)
+PM25_BP = [
+    (0.0, 12.0, 0, 50),
+    (12.1, 35.4, 51, 100),
+    (35.5, 55.4, 101, 150),
+    (55.5, 150.4, 151, 200),
+    (150.5, 250.4, 201, 300),
+    (250.5, 350.4, 301, 400),
+    (350.5, 500.4, 401, 500),
+]
+PM10_BP = [
+    (0, 54, 0, 50),
+    (55, 154, 51, 100),
+    (155, 254, 101, 150),
+    (255, 354, 151, 200),
+    (355, 424, 201, 300),
+    (425, 504, 301, 400),
+    (505, 604, 401, 500),
+]
+NO2_BP = [  # 1-hour, ppb
+    (0, 53, 0, 50),
+    (54, 100, 51, 100),
+    (101, 360, 101, 150),
+    (361, 649, 151, 200),
+    (650, 1249, 201, 300),
+    (1250, 1649, 301, 400),
+    (1650, 2049, 401, 500),
+]
+CO_BP = [  # 8-hour, ppm
+    (0.0, 4.4, 0, 50),
+    (4.5, 9.4, 51, 100),
+    (9.5, 12.4, 101, 150),
+    (12.5, 15.4, 151, 200),
+    (15.5, 30.4, 201, 300),
+    (30.5, 40.4, 301, 400),
+    (40.5, 50.4, 401, 500),
+]
+
+# µg/m³ -> ppb (NO2) / ppm (CO) at 25 °C and 1 atm: molar mass / 24.45
+NO2_UGM3_PER_PPB = 46.0055 / 24.45
+CO_UGM3_PER_PPM = 28.010 / 24.45 * 1000
+
+# pollutant -> (table, decimals kept by truncation, divisor from µg/m³)
+POLLUTANTS: Dict[str, tuple] = {
+    "pm2_5": (PM25_BP, 1, 1.0),
+    "pm10": (PM10_BP, 0, 1.0),
+    "nitrogen_dioxide": (NO2_BP, 0, NO2_UGM3_PER_PPB),
+    "carbon_monoxide": (CO_BP, 1, CO_UGM3_PER_PPM),
+}
+
+CATEGORIES = [
+    (50, "Good"),
+    (100, "Moderate"),
+    (150, "Unhealthy for Sensitive"),
+    (200, "Unhealthy"),
+    (300, "Very Unhealthy"),
+]
+
+
+def _table(bps) -> tuple[np.ndarray, ...]:
+    a = np.asarray(bps, dtype=float)
+    return a[:, 0], a[:, 1], a[:, 2], a[:, 3]
+
+
+_TABLES = {name: _table(bps) for name, (bps, _d, _u) in POLLUTANTS.items()}
+
+# ---- sub-indices -----------------------------------------------------------
+
+def truncate(c: np.ndarray, decimals: int) -> np.ndarray:
+    """EPA truncation (not rounding) to `decimals` places; tolerant of float noise."""
+    scale = 10.0 ** decimals
+    return np.floor(np.asarray(c, dtype=float) * scale + 1e-9) / scale
+
+
+def sub_index(pollutant: str, conc: np.ndarray | pd.Series, convert: bool = True) -> np.ndarray:
+    """
+    AQI sub-index for an array of any shape of averaged concentrations (µg/m³,
+    or the table's unit with convert=False). NaN and values outside the table
+    give NaN.
+    """
+    _bps, decimals, per_unit = POLLUTANTS[pollutant]
+    c_lo, c_hi, i_lo, i_hi = _TABLES[pollutant]
+    c = np.asarray(conc, dtype=float)
+    if convert and per_unit != 1.0:
+        c = c / per_unit
+    c = truncate(c, decimals)
+    with np.errstate(invalid="ignore"):
+        ok = (c >= 0) & (c <= c_hi[-1])
+    k = np.minimum(np.searchsorted(c_hi, np.where(ok, c, 0.0), side="left"), len(c_hi) - 1)
+    out = (i_hi[k] - i_lo[k]) / (c_hi[k] - c_lo[k]) * (c - c_lo[k]) + i_lo[k]
+    return np.where(ok, out, np.nan)
+
+
+def category(aqi: np.ndarray | pd.Series) -> np.ndarray:
+    """EPA category label per value ("N/A" for NaN)."""
+    a = np.asarray(aqi, dtype=float)
+    upper = np.array([u for u, _ in CATEGORIES], dtype=float)
+    labels = np.array([lbl for _, lbl in CATEGORIES] + ["Hazardous", "N/A"], dtype=object)
+    k = np.searchsorted(upper, a, side="left")
+    return labels[np.where(np.isnan(a), len(labels) - 1, k)]
+
+
+# ---- averaging periods -----------------------------------------------------
+
+def daily_inputs(hourly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-day AQI inputs from an hourly frame (DatetimeIndex): 24-hour means for
+    PM, the daily max 1-hour value for NO2 and the daily max 8-hour rolling
+    mean (at least 6 of 8 hours) for CO.
+    """
+    day = hourly.index.floor("D")
+    out = {}
+    for col in ("pm2_5", "pm10"):
+        if col in hourly.columns:
+            out[col] = hourly[col].groupby(day).mean()
+    if "nitrogen_dioxide" in hourly.columns:
+        out["nitrogen_dioxide"] = hourly["nitrogen_dioxide"].groupby(day).max()
+    if "carbon_monoxide" in hourly.columns:
+        co8 = hourly["carbon_monoxide"].rolling(8, min_periods=6).mean()
+        out["carbon_monoxide"] = co8.groupby(day).max()
+    df = pd.DataFrame(out)
+    df.index.name = "date"
+    return df
+
+
+# ---- frames and stacks -----------------------------------------------------
+
+def _combine(subs: Dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """Overall AQI (max sub-index) and the dominant pollutant per cell."""
+    names = np.array(list(subs) + [None], dtype=object)
+    stack = np.stack(list(subs.values()), axis=0)
+    valid = ~np.isnan(stack)
+    any_valid = valid.any(axis=0)
+    arg = np.argmax(np.where(valid, stack, -np.inf), axis=0)
+    overall = np.where(any_valid, np.take_along_axis(stack, arg[None], axis=0)[0], np.nan)
+    dominant = names[np.where(any_valid, arg, len(names) - 1)]
+    return overall, dominant
+
+
+def aqi_frame(df: pd.DataFrame, pollutants: list[str] | None = None) -> pd.DataFrame:
+    """
+    Sub-index per pollutant present (`AQI_<pollutant>`), overall `AQI` and the
+    `dominant` pollutant for each row of `df` (already averaged per pollutant).
+    """
+    names = [p for p in (pollutants or POLLUTANTS) if p in df.columns]
+    out = pd.DataFrame(index=df.index)
+    if not names:
+        out["AQI"] = np.nan
+        out["dominant"] = None
+        return out
+    subs = {p: sub_index(p, df[p].to_numpy(dtype=float)) for p in names}
+    for p, v in subs.items():
+        out[f"AQI_{p}"] = v
+    out["AQI"], out["dominant"] = _combine(subs)
+    return out
+
+
+def aqi_stack(
+    frames: Mapping[str, pd.DataFrame], pollutants: list[str] | None = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    `aqi_frame` for several cities at once: frames are aligned on a shared
+    date index and each pollutant is looked up as one day x city array.
+    """
+    if not frames:
+        return {}
+    wide = pd.concat(frames, axis=1)
+    cities = list(frames)
+    names = [p for p in (pollutants or POLLUTANTS) if p in wide.columns.get_level_values(1)]
+    subs: Dict[str, np.ndarray] = {}
+    for p in names:
+        block = wide.reindex(columns=pd.MultiIndex.from_product([cities, [p]]))
+        subs[p] = sub_index(p, block.to_numpy(dtype=float))
+    out: Dict[str, pd.DataFrame] = {}
+    if subs:
+        overall, dominant = _combine(subs)
+    for j, city in enumerate(cities):
+        rows = frames[city].index
+        res = pd.DataFrame(index=wide.index)
+        for p, v in subs.items():
+            if p in frames[city].columns:
+                res[f"AQI_{p}"] = v[:, j]
+        res["AQI"] = overall[:, j] if subs else np.nan
+        res["dominant"] = dominant[:, j] if subs else None
+        out[city] = res.loc[rows]
+    return out
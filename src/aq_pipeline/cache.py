@@ -0,0 +1,152 @@
+# src/aq_pipeline/cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Iterable
+
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+DEFAULT_CACHE_DIR = Path("data/cache")
+
+
+class CacheMiss(LookupError):
+    """Raised in offline mode when a required window is not in the cache."""
+
+
+class ResponseCache:
+    """
+    On-disk cache of Open-Meteo window payloads under `root`.
+
+    Entries are content-addressed by sha256 of (lat, lon, hourly params, window)
+    and stored as `<root>/<k[:2]>/<k>.json`. Windows that end within `recent_days`
+    of today (or relative `past_days` windows) expire after `recent_ttl` seconds;
+    older windows never expire. The total size is kept under `max_bytes` by
+    evicting least-recently-used entries (access time is set explicitly on hit).
+    With `offline=True` entries are served regardless of age and misses raise
+    `CacheMiss` at the call site instead of going to the network.
+    """
+
+    def __init__(
+        self,
+        root: str | Path = DEFAULT_CACHE_DIR,
+        *,
+        max_bytes: int = 512 * 1024 * 1024,
+        recent_days: int = 5,
+        recent_ttl: float = 6 * 3600,
+        offline: bool = False,
+    ) -> None:
+        self.root = Path(root)
+        self.max_bytes = int(max_bytes)
+        self.recent_days = recent_days
+        self.recent_ttl = recent_ttl
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        self._total: int | None = None
+        self._lock = threading.Lock()
+
+    # ---- keys -------------------------------------------------------------
+
+    def window_key(
+        self,
+        lat: float,
+        lon: float,
+        hourly_params: Iterable[str],
+        start: date | None = None,
+        end: date | None = None,
+        past_days: int | None = None,
+    ) -> tuple[str, bool]:
+        """Return (key, volatile) for a window; volatile entries are subject to the TTL."""
+        today = date.today()
+        ident = {
+            "lat": round(float(lat), 4),
+            "lon": round(float(lon), 4),
+            "hourly": sorted(hourly_params),
+        }
+        if start is not None and end is not None:
+            ident["window"] = [start.isoformat(), end.isoformat()]
+            volatile = end >= today - timedelta(days=self.recent_days)
+        else:
+            # relative windows move with the calendar, so pin them to today
+            ident["past_days"] = int(past_days or 0)
+            ident["asof"] = today.isoformat()
+            volatile = True
+        raw = json.dumps(ident, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        return hashlib.sha256(raw).hexdigest(), volatile
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    # ---- get / put --------------------------------------------------------
+
+    def get(self, key: str, volatile: bool = False) -> bytes | None:
+        body = self._read(key, volatile)
+        with self._lock:
+            if body is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return body
+
+    def _read(self, key: str, volatile: bool) -> bytes | None:
+        p = self._path(key)
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            return None
+        if volatile and not self.offline and time.time() - st.st_mtime > self.recent_ttl:
+            return None
+        try:
+            body = p.read_bytes()
+            # mark as recently used; mtime keeps the write time for the TTL
+            os.utime(p, (time.time(), st.st_mtime))
+        except FileNotFoundError:  # evicted concurrently
+            return None
+        return body
+
+    def put(self, key: str, body: bytes) -> None:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(body)
+        with self._lock:
+            old = p.stat().st_size if p.exists() else 0
+            os.replace(tmp, p)
+            if self._total is not None:
+                self._total += len(body) - old
+            self._evict_locked()
+
+    # ---- eviction ---------------------------------------------------------
+
+    def _entries(self) -> list[tuple[float, int, Path]]:
+        out = []
+        for p in self.root.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            out.append((st.st_atime, st.st_size, p))
+        return out
+
+    def _evict_locked(self) -> None:
+        if self._total is None:
+            self._total = sum(size for _, size, _ in self._entries())
+        if self._total <= self.max_bytes:
+            return
+        for _atime, size, p in sorted(self._entries()):
+            if self._total <= self.max_bytes:
+                break
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                continue
+            self._total -= size
+            log.debug(f"Cache evicted {p.name}")
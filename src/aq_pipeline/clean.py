@@ -1,16 +1,303 @@
+import numpy as np
 import pandas as pd
 from pathlib import Path
-from .utils import get_logger, ensure_parent
+from typing import Dict, Iterator, List
+from . import storage
+from .utils import get_logger
 
-def clean_daily(in_csv, out_csv, interpolate=True):
-    log = get_logger()
-    df = pd.read_csv(in_csv, parse_dates=["time"]).set_index("time").sort_index()
+DEFAULT_CHUNK_ROWS = 100_000
+
+def daily_means(raw, interpolate=True, chunk_rows=None) -> pd.DataFrame:
+    """
+    Hourly raw data -> daily means, in memory. `raw` may be a DataFrame
+    (indexed by, or with a column, "time") or a path readable by aq_pipeline.storage.
+    With `chunk_rows` the raw data is streamed instead (see iter_daily_means).
+    """
+    if chunk_rows:
+        parts = list(iter_daily_means(raw, interpolate=interpolate, chunk_rows=chunk_rows))
+        if not parts:
+            return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+        return pd.concat(parts)
+    df = storage.read_frame(raw, "time")
     if interpolate:
         df = df.interpolate(method="time", limit_area="inside")
     daily = df.resample("1D").mean(numeric_only=True)
     daily.index.name = "date"
+    return daily
+
+def clean_daily(in_csv, out_csv, interpolate=True, chunk_rows=None):
+    """
+    Hourly raw data -> daily means. `in_csv`/`out_csv` may be CSV files or
+    Parquet datasets (see aq_pipeline.storage); `in_csv` may also be a DataFrame.
+    With `chunk_rows` the input is streamed and days are written as they complete.
+    """
+    log = get_logger()
+    if not chunk_rows:
+        daily = daily_means(in_csv, interpolate=interpolate)
+        out = storage.write_frame(daily, out_csv, "date")
+        log.info(f"Saved daily means → {out}")
+        return out
 
-    out = ensure_parent(out_csv)
-    daily.to_csv(out)
-    log.info(f"Saved daily means → {out}")
+    out, days = None, 0
+    for part in iter_daily_means(in_csv, interpolate=interpolate, chunk_rows=chunk_rows):
+        if out is None:
+            out = storage.write_frame(part, out_csv, "date")
+        else:
+            storage.upsert_frame(part, out, "date")
+        days += len(part)
+    if out is None:
+        out = storage.write_frame(pd.DataFrame(index=pd.DatetimeIndex([], name="date")), out_csv, "date")
+    log.info(f"Saved daily means ({days} days, streamed) → {out}")
     return out
+
+# ---- streaming (out-of-core) ----
+
+class _StreamingDaily:
+    """
+    Chunk-at-a-time equivalent of `daily_means`. Per column it carries the last
+    valid (time, value) and, for the missing rows after it, only a per-day
+    (row count, sum of times): when the next valid value arrives their linearly
+    interpolated contribution to a day's sum is n*v0 + slope*(sum_t - n*t0).
+    A day is emitted once no later row or open gap can change it, so memory is
+    one chunk plus the days spanned by gaps still waiting for a closing value.
+    """
+
+    def __init__(self, columns: List[str], interpolate: bool = True) -> None:
+        self.columns = list(columns)
+        self.interpolate = interpolate
+        m = len(self.columns)
+        self.base = None          # time origin; times are seconds relative to it
+        self.unit = "us"
+        self.day0 = 0             # first open day (days since epoch)
+        self.sums = np.zeros((0, m))
+        self.counts = np.zeros((0, m))
+        self.last_t = np.full(m, np.nan)
+        self.last_v = np.full(m, np.nan)
+        self.pending: List[Dict[int, List[float]]] = [{} for _ in range(m)]
+        self.last_time = None
+
+    def _add(self, j: int, off: np.ndarray, values: np.ndarray) -> None:
+        np.add.at(self.sums[:, j], off, values)
+        np.add.at(self.counts[:, j], off, 1)
+
+    def _ensure(self, last_day: int) -> None:
+        need = last_day - self.day0 + 1 - len(self.sums)
+        if need > 0:
+            pad = np.zeros((need, len(self.columns)))
+            self.sums = np.vstack([self.sums, pad])
+            self.counts = np.vstack([self.counts, pad])
+
+    def _feed_column(self, j: int, t: np.ndarray, off: np.ndarray, v: np.ndarray) -> None:
+        valid = ~np.isnan(v)
+        any_valid = bool(valid.any())
+        if any_valid:
+            self._add(j, off[valid], v[valid])
+        if self.interpolate:
+            if any_valid and self.pending[j]:
+                i1 = int(np.argmax(valid))
+                t0, v0 = self.last_t[j], self.last_v[j]
+                slope = (v[i1] - v0) / (t[i1] - t0)
+                for day, (n, st) in self.pending[j].items():
+                    self.sums[day - self.day0, j] += n * v0 + slope * (st - n * t0)
+                    self.counts[day - self.day0, j] += n
+                self.pending[j].clear()
+            missing = ~valid
+            if missing.any():
+                self._interpolate_rows(j, t, off, v, valid, missing)
+        if any_valid:
+            i_last = len(v) - 1 - int(np.argmax(valid[::-1]))
+            self.last_t[j], self.last_v[j] = t[i_last], v[i_last]
+
+    def _interpolate_rows(self, j, t, off, v, valid, missing) -> None:
+        n = len(v)
+        idx = np.arange(n)
+        prev = np.maximum.accumulate(np.where(valid, idx, -1))
+        nxt = np.minimum.accumulate(np.where(valid, idx, n)[::-1])[::-1]
+        carried = not np.isnan(self.last_t[j])
+        has_prev = (prev >= 0) | carried
+        # fall back to the value carried over from the previous chunk
+        pt = np.where(prev >= 0, t[np.maximum(prev, 0)], self.last_t[j])
+        pv = np.where(prev >= 0, v[np.maximum(prev, 0)], self.last_v[j])
+
+        inner = missing & has_prev & (nxt < n)
+        if inner.any():
+            k = nxt[inner]
+            vals = pv[inner] + (v[k] - pv[inner]) * (t[inner] - pt[inner]) / (t[k] - pt[inner])
+            self._add(j, off[inner], vals)
+
+        tail = missing & has_prev & (nxt >= n)
+        if tail.any():
+            days, inv = np.unique(off[tail], return_inverse=True)
+            cnt = np.bincount(inv)
+            tsum = np.bincount(inv, weights=t[tail])
+            for d, c, s in zip(days, cnt, tsum):
+                acc = self.pending[j].setdefault(int(d) + self.day0, [0, 0.0])
+                acc[0] += int(c)
+                acc[1] += float(s)
+
+    def feed(self, chunk: pd.DataFrame) -> pd.DataFrame | None:
+        """Consume the next chunk (time-ordered); return the days it completed."""
+        if chunk.empty:
+            return None
+        if not chunk.index.is_monotonic_increasing:
+            chunk = chunk.sort_index()
+        if self.last_time is not None and chunk.index[0] < self.last_time:
+            raise ValueError("Streaming clean needs input sorted by time.")
+        idx = pd.DatetimeIndex(chunk.index)
+        if self.base is None:
+            self.base = idx[0]
+            self.unit = idx.unit
+            self.day0 = int(idx[:1].to_numpy().astype("datetime64[D]").astype(np.int64)[0])
+        t = (idx - self.base).total_seconds().to_numpy()
+        days = idx.to_numpy().astype("datetime64[D]").astype(np.int64)
+        self._ensure(int(days[-1]))
+        off = days - self.day0
+        vals = chunk.reindex(columns=self.columns).to_numpy(dtype=float)
+        for j in range(len(self.columns)):
+            self._feed_column(j, t, off, vals[:, j])
+        self.last_time = idx[-1]
+        # the last day may continue in the next chunk; days with open gaps wait
+        hi = int(days[-1])
+        for p in self.pending:
+            if p:
+                hi = min(hi, min(p))
+        return self._emit(hi)
+
+    def finish(self) -> pd.DataFrame | None:
+        """Emit every remaining day (gaps never closed stay missing, as in memory)."""
+        return self._emit(self.day0 + len(self.sums))
+
+    def _emit(self, hi: int) -> pd.DataFrame | None:
+        k = hi - self.day0
+        if k <= 0:
+            return None
+        s, c = self.sums[:k], self.counts[:k]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(c > 0, s / c, np.nan)
+        start = pd.Timestamp(np.datetime64(self.day0, "D"))
+        index = pd.date_range(start, periods=k, freq="D", name="date", unit=self.unit)
+        out = pd.DataFrame(mean, index=index, columns=self.columns)
+        self.sums, self.counts = self.sums[k:], self.counts[k:]
+        self.day0 = hi
+        return out
+
+
+def iter_daily_means(raw, interpolate=True, chunk_rows=DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """
+    Stream hourly raw data (time-sorted CSV, Parquet file/dataset or DataFrame)
+    in chunks of `chunk_rows` and yield consecutive blocks of daily means.
+    Concatenated, the blocks equal `daily_means(raw, interpolate)`.
+    """
+    stream = None
+    for chunk in storage.iter_frames(raw, "time", chunk_rows):
+        if stream is None:
+            stream = _StreamingDaily(chunk.select_dtypes("number").columns, interpolate)
+        out = stream.feed(chunk)
+        if out is not None:
+            yield out
+    if stream is not None:
+        out = stream.finish()
+        if out is not None:
+            yield out
+
+# ---- incremental refresh ----
+
+_MARGIN = pd.Timedelta(days=2)
+_DAY = pd.Timedelta(days=1)
+
+def _context_slice(raw, lo, hi, bounds) -> pd.DataFrame:
+    """
+    Raw rows around [lo, hi], widened (doubling the margin on each side) until
+    every column has a valid value before `lo` and after `hi`, or the stored data
+    runs out. Interpolation of any hour in [lo, hi] only depends on those values.
+    """
+    first, last = bounds
+    left = right = _MARGIN
+    while True:
+        a, b = max(lo - left, first), min(hi + right, last)
+        df = storage.read_frame(raw, "time", start=a, end=b)
+        valid = df.notna()
+        ok_left = a <= first or bool(valid[df.index < lo].any().all())
+        ok_right = b >= last or bool(valid[df.index > hi].any().all())
+        if ok_left and ok_right:
+            return df
+        left = left if ok_left else left * 2
+        right = right if ok_right else right * 2
+
+def hourly_values(raw, start=None, end=None, interpolate=True) -> pd.DataFrame:
+    """
+    Hourly rows in [start, end] as the daily means see them (interpolated inside
+    gaps), reading only a slice of `raw` plus the context interpolation needs.
+    """
+    bounds = None
+    if not isinstance(raw, pd.DataFrame) and (start is not None or end is not None):
+        bounds = storage.time_bounds(raw, "time")
+    if bounds is None:
+        df = storage.read_frame(raw, "time")
+    else:
+        lo = pd.Timestamp(start) if start is not None else bounds[0]
+        hi = pd.Timestamp(end) if end is not None else bounds[1]
+        if interpolate:
+            df = _context_slice(raw, lo, hi, bounds)
+        else:
+            df = storage.read_frame(raw, "time", start=lo, end=hi)
+    if interpolate:
+        df = df.interpolate(method="time", limit_area="inside")
+    if start is not None or end is not None:
+        df = df.loc[start:end]
+    return df
+
+def dirty_days(raw, changes, interpolate=True) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """
+    First and last day whose daily mean can change after hours in `changes`
+    ((first, last) spans) were written: the days of the changed hours plus,
+    with interpolation, the gaps before/after them up to the nearest valid value.
+    """
+    bounds = storage.time_bounds(raw, "time")
+    if bounds is None or not changes:
+        return None
+    lo = max(min(c[0] for c in changes), bounds[0])
+    hi = min(max(c[1] for c in changes), bounds[1])
+    if lo > hi:
+        return None
+    if interpolate:
+        ctx = _context_slice(raw, lo, hi, bounds)
+        valid = ctx.notna()
+        before = valid[ctx.index < lo]
+        after = valid[ctx.index > hi]
+        prev = [before.index[before[c].to_numpy()][-1] for c in ctx.columns if before[c].any()]
+        nxt = [after.index[after[c].to_numpy()][0] for c in ctx.columns if after[c].any()]
+        lo = min(prev + [lo])
+        hi = max(nxt + [hi])
+    return lo.floor("D"), hi.floor("D")
+
+def update_daily(raw, processed, changes, interpolate=True) -> pd.DataFrame:
+    """
+    Recompute only the days affected by `changes` (see storage.read_changes) and
+    splice them into the daily data at `processed`; returns the recomputed days.
+    Falls back to a full clean when the processed data is missing or the raw
+    data was rewritten wholesale. Cost follows the changed span, not the history.
+    """
+    if storage.FULL_SPAN in changes or not Path(processed).exists():
+        daily = daily_means(raw, interpolate=interpolate)
+        storage.write_frame(daily, processed, "date")
+        return daily
+
+    span = dirty_days(raw, changes, interpolate=interpolate)
+    if span is None:
+        return pd.DataFrame(index=pd.DatetimeIndex([], name="date"))
+    d0, d1 = span
+    # keep the calendar continuous when the new hours lie beyond the stored days
+    stored = storage.time_bounds(processed, "date")
+    if stored is not None:
+        if d0 > stored[1] + _DAY:
+            d0 = stored[1] + _DAY
+        if d1 < stored[0] - _DAY:
+            d1 = stored[0] - _DAY
+
+    bounds = storage.time_bounds(raw, "time")
+    ctx = _context_slice(raw, d0, d1 + _DAY - pd.Timedelta(microseconds=1), bounds)
+    days = daily_means(ctx, interpolate=interpolate).loc[d0:d1]
+    storage.upsert_frame(days, processed, "date")
+    get_logger().info(f"Re-aggregated {len(days)} day(s) {d0.date()}..{d1.date()} → {processed}")
+    return days
@@ -0,0 +1,208 @@
+# src/aq_pipeline/dag.py
+"""
+Small DAG executor for the pipeline stages.
+
+Each node is a zero-argument callable (bind parameters with functools.partial)
+with the names of the nodes it depends on. Nodes hand data over through the
+store, not through return values; a node's return value goes to `on_done` and
+into the result map.
+
+    kind="io"    runs on a thread pool (fetching, file copies)
+    kind="cpu"   runs on a process pool (cleaning, analysis, rendering); the
+                 callable and its result must be picklable
+
+Every node belongs to a `stage` (e.g. "fetch"). A stage holds at most
+`queue_size` nodes that are running or finished but not yet picked up by all
+their dependents, so a fast stage cannot run far ahead of a slow one. Ready
+nodes are dispatched deepest-first, which finishes cities already in flight
+before starting new ones, while the two pools keep I/O and CPU work overlapping.
+"""
+from __future__ import annotations
+
+import heapq
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+KINDS = ("io", "cpu")
+
+
+class UpstreamFailed(RuntimeError):
+    """Recorded for a node that was not run because a dependency failed."""
+
+
+@dataclass
+class Node:
+    name: str
+    fn: Callable[[], Any]
+    deps: Tuple[str, ...] = ()
+    kind: str = "io"
+    stage: str = ""
+    order: int = 0
+    depth: int = 0
+    dependents: List[str] = field(default_factory=list)
+
+
+class Graph:
+    """Nodes in insertion order; dependencies must be added before their dependents."""
+
+    def __init__(self) -> None:
+        self.nodes: Dict[str, Node] = {}
+
+    def add(
+        self,
+        name: str,
+        fn: Callable[[], Any],
+        *,
+        deps: Iterable[str] = (),
+        kind: str = "io",
+        stage: str | None = None,
+    ) -> str:
+        if name in self.nodes:
+            raise ValueError(f"Duplicate node {name!r}")
+        if kind not in KINDS:
+            raise ValueError(f"Unknown node kind {kind!r}; expected one of {KINDS}")
+        deps = tuple(deps)
+        missing = [d for d in deps if d not in self.nodes]
+        if missing:
+            raise ValueError(f"Node {name!r} depends on unknown nodes {missing}")
+        depth = 1 + max((self.nodes[d].depth for d in deps), default=-1)
+        self.nodes[name] = Node(name, fn, deps, kind, stage or name, len(self.nodes), depth)
+        for d in deps:
+            self.nodes[d].dependents.append(name)
+        return name
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+
+def _process_pool(workers: int, initializer=None, initargs: tuple = ()) -> ProcessPoolExecutor:
+    # fork is unsafe once the scheduler runs threads
+    method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=mp.get_context(method), initializer=initializer, initargs=initargs
+    )
+
+
+def run(
+    graph: Graph,
+    *,
+    io_workers: int = 4,
+    cpu_workers: int = 0,
+    queue_size: int | Dict[str, int] = 2,
+    on_done: Callable[[str, Any], None] | None = None,
+    cpu_initializer: Callable[..., None] | None = None,
+    cpu_initargs: tuple = (),
+) -> tuple[Dict[str, Any], Dict[str, BaseException]]:
+    """
+    Run every node of `graph`; returns ({name: result}, {name: error}). A failed
+    node's descendants are skipped with `UpstreamFailed`. `on_done(name, result)`
+    runs in the calling thread before the node's dependents are released (an
+    exception there fails the node). `cpu_workers=0` runs cpu nodes on threads.
+    `queue_size` is one limit for every stage or {stage: limit}.
+    """
+    nodes = graph.nodes
+    limits = queue_size if isinstance(queue_size, dict) else {}
+    default_limit = None if isinstance(queue_size, dict) else int(queue_size)
+    if any(v < 1 for v in [*limits.values(), default_limit or 1]):
+        raise ValueError("Stage queue sizes must be >= 1")
+    workers = {"io": max(1, io_workers), "cpu": max(1, cpu_workers or io_workers)}
+
+    waiting = {n: len(node.deps) for n, node in nodes.items()}
+    consumers = {n: len(node.dependents) for n, node in nodes.items()}
+    held: Dict[str, int] = {}        # stage -> nodes running or buffered
+    finished: set[str] = set()
+    released: set[str] = set()
+    results: Dict[str, Any] = {}
+    errors: Dict[str, BaseException] = {}
+    ready: List[tuple] = [(-node.depth, node.order, n) for n, node in nodes.items() if not node.deps]
+    heapq.heapify(ready)
+    running: Dict[Future, str] = {}
+    inflight = {k: 0 for k in KINDS}
+
+    def limit(stage: str) -> int | None:
+        return limits.get(stage, default_limit)
+
+    def release(n: str) -> None:
+        if n not in released:
+            released.add(n)
+            held[nodes[n].stage] -= 1
+
+    def consumed(n: str) -> None:
+        """A dependent of each of n's deps has started (or been skipped)."""
+        for d in nodes[n].deps:
+            consumers[d] -= 1
+            if consumers[d] == 0 and d in finished:
+                release(d)
+
+    def start(node: Node) -> None:
+        held[node.stage] = held.get(node.stage, 0) + 1
+        inflight[node.kind] += 1
+        consumed(node.name)
+        log.debug(f"dag: start {node.name} ({node.kind})")
+        running[pools[node.kind].submit(node.fn)] = node.name
+
+    def skip(n: str, cause: str) -> None:
+        errors[n] = UpstreamFailed(f"{n}: skipped, {cause} failed")
+        consumed(n)
+        for m in nodes[n].dependents:
+            if m not in errors:
+                skip(m, cause)
+
+    pools: Dict[str, Executor] = {"io": ThreadPoolExecutor(workers["io"], thread_name_prefix="dag-io")}
+    if cpu_workers:
+        pools["cpu"] = _process_pool(workers["cpu"], cpu_initializer, cpu_initargs)
+    else:
+        pools["cpu"] = ThreadPoolExecutor(workers["cpu"], thread_name_prefix="dag-cpu")
+    try:
+        while ready or running:
+            deferred = []
+            while ready:
+                item = heapq.heappop(ready)
+                node = nodes[item[2]]
+                cap = limit(node.stage)
+                if inflight[node.kind] >= workers[node.kind] or (cap is not None and held.get(node.stage, 0) >= cap):
+                    deferred.append(item)
+                    continue
+                start(node)
+            if not running:
+                # every ready node waits on a full stage whose consumers wait on other
+                # branches; let the deepest one through rather than stall
+                start(nodes[deferred.pop(0)[2]])
+            for item in deferred:
+                heapq.heappush(ready, item)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                n = running.pop(fut)
+                node = nodes[n]
+                inflight[node.kind] -= 1
+                finished.add(n)
+                try:
+                    result = fut.result()
+                    if on_done is not None:
+                        on_done(n, result)
+                except Exception as e:
+                    log.debug(f"dag: {n} failed: {e!r}")
+                    errors[n] = e
+                    for m in node.dependents:
+                        if m not in errors:
+                            skip(m, n)
+                    release(n)
+                    continue
+                results[n] = result
+                if consumers[n] == 0:
+                    release(n)
+                for m in node.dependents:
+                    waiting[m] -= 1
+                    if waiting[m] == 0 and m not in errors:
+                        heapq.heappush(ready, (-nodes[m].depth, nodes[m].order, m))
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+    return results, errors
@@ -0,0 +1,136 @@
+# src/aq_pipeline/decode.py
+from __future__ import annotations
+
+import json
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+# Optional accelerators: orjson for whole-body decoding, ijson for streaming.
+try:  # pragma: no cover - depends on the environment
+    import orjson as _orjson
+except ImportError:  # pragma: no cover
+    _orjson = None
+
+try:  # pragma: no cover - depends on the environment
+    import ijson as _ijson
+except ImportError:  # pragma: no cover
+    _ijson = None
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M"
+
+# ---- bytes <-> payload -----------------------------------------------------
+
+def loads(body: bytes) -> Any:
+    """Decode a JSON body (orjson if installed, else the stdlib)."""
+    if _orjson is not None:
+        return _orjson.loads(body)
+    return json.loads(body)
+
+
+def _jsonable(v: Any) -> Any:
+    if isinstance(v, np.ndarray):
+        # NaN is not valid JSON; the API itself uses null
+        return [None if x != x else x for x in v.tolist()]
+    if isinstance(v, dict):
+        return {k: _jsonable(x) for k, x in v.items()}
+    return v
+
+
+def dumps(payload: Dict[str, Any]) -> bytes:
+    """Encode a payload (possibly holding float64 arrays) back to JSON bytes."""
+    return json.dumps(_jsonable(payload), separators=(",", ":")).encode("utf-8")
+
+
+def can_stream() -> bool:
+    return _ijson is not None
+
+
+def _stream_payloads(fp: BinaryIO, hourly_params: Iterable[str], base: str) -> List[Dict[str, Any]]:
+    """Incrementally parse the payload objects found at ijson prefix `base`."""
+    if _ijson is None:
+        raise RuntimeError("Streaming decode needs the optional 'ijson' package.")
+    hourly_params = list(hourly_params)
+    lead = f"{base}." if base else ""
+    time_key = f"{lead}hourly.time.item"
+    units_lead = f"{lead}hourly_units."
+    wanted = {f"{lead}hourly.{p}.item": p for p in hourly_params}
+    nan = float("nan")
+    values: Dict[str, array] = {}
+    times: list[str] = []
+    units: Dict[str, str] = {}
+    out: List[Dict[str, Any]] = []
+    for prefix, event, value in _ijson.parse(fp, use_float=True):
+        if prefix == time_key:
+            times.append(value)
+        elif prefix in wanted:
+            values[wanted[prefix]].append(nan if value is None else value)
+        elif prefix.startswith(units_lead) and event == "string":
+            units[prefix[len(units_lead):]] = value
+        elif prefix == base and event == "start_map":
+            values = {p: array("d") for p in hourly_params}
+            times, units = [], {}
+        elif prefix == base and event == "end_map":
+            hourly: Dict[str, Any] = {"time": times}
+            for p, vals in values.items():
+                hourly[p] = np.frombuffer(vals, dtype=np.float64) if len(vals) else np.empty(0)
+            out.append({"hourly": hourly, "hourly_units": units})
+    return out
+
+
+def load_stream(fp: BinaryIO, hourly_params: Iterable[str]) -> Dict[str, Any]:
+    """
+    Incrementally parse a single-location Open-Meteo body from a file-like object.
+    Hourly values are appended to packed C double buffers (null -> NaN), so no
+    list of Python floats is materialized for them. Requires `ijson`.
+    """
+    return _stream_payloads(fp, hourly_params, "")[0]
+
+
+def load_stream_many(fp: BinaryIO, hourly_params: Iterable[str]) -> List[Dict[str, Any]]:
+    """`load_stream` for a multi-location body (a JSON array of payloads); one payload per location."""
+    return _stream_payloads(fp, hourly_params, "item")
+
+
+# ---- payload -> frame ------------------------------------------------------
+
+def hourly_index(times: list[str]) -> pd.DatetimeIndex:
+    """
+    Build the time index for ISO hourly timestamps. For a regular series only
+    the first two and the last strings are parsed and the rest is derived as
+    first + i * step; irregular input falls back to a full parse.
+    """
+    n = len(times)
+    if n == 0:
+        return pd.DatetimeIndex([], name="time")
+    first = pd.Timestamp(times[0])
+    if n == 1:
+        return pd.DatetimeIndex([first], name="time")
+    step = pd.Timestamp(times[1]) - first
+    if step > pd.Timedelta(0) and first + step * (n - 1) == pd.Timestamp(times[-1]):
+        return pd.date_range(first, periods=n, freq=step, name="time")
+    return pd.DatetimeIndex(pd.to_datetime(times, format=TIME_FORMAT), name="time")
+
+
+def column(values: Any, n: int) -> np.ndarray:
+    """Float64 array for an hourly value array; None/null -> NaN, missing -> all-NaN."""
+    if values is None:
+        return np.full(n, np.nan)
+    arr = np.asarray(values, dtype=np.float64) if not isinstance(values, np.ndarray) else values
+    return arr.astype(np.float64, copy=False)
+
+
+def hourly_frame(js: Dict[str, Any], hourly_params: list[str]) -> pd.DataFrame:
+    """Turn an Open-Meteo payload into a tidy DataFrame (time + one float64 column per param)."""
+    hourly = js.get("hourly") or {}
+    times = hourly.get("time")
+    if times is None or len(times) == 0:
+        # empty frame with correct columns
+        return pd.DataFrame(columns=["time"] + hourly_params)
+    n = len(times)
+    data: Dict[str, Any] = {"time": hourly_index(list(times))}
+    for name in hourly_params:
+        data[name] = column(hourly.get(name), n)
+    return pd.DataFrame(data)
@@ -0,0 +1,128 @@
+# src/aq_pipeline/downsample.py
+"""
+Decimation of long series before they are drawn.
+
+    lttb     Largest-Triangle-Three-Buckets: one point per bucket, the one that
+             spans the largest triangle with its neighbours (keeps the shape)
+    minmax   min/max envelope: the lowest and highest point of every bucket
+             (keeps every peak, e.g. pollution spikes)
+
+Both return positions into the input, always keep the first and last point
+and keep all-NaN buckets as a NaN point, so gaps still show as gaps.
+`points_for_width` ties the target count to the width of the output.
+"""
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+METHODS = ("lttb", "minmax", "none")
+
+
+def points_for_width(width_px: float, method: str = "lttb") -> int:
+    """Points worth drawing across `width_px` pixels (minmax keeps two per pixel column)."""
+    px = max(int(width_px), 3)
+    return 2 * px if method == "minmax" else px
+
+
+def _x(index) -> np.ndarray:
+    if isinstance(index, pd.DatetimeIndex):
+        return index.asi8.astype(float)
+    try:
+        return np.asarray(index, dtype=float)
+    except (TypeError, ValueError):
+        return np.arange(len(index), dtype=float)
+
+
+# ---- kernels ---------------------------------------------------------------
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the `n` points LTTB keeps from (x, y), sorted; all of them if len <= n."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size) if n >= size else np.array([0, size - 1][:max(n, 1)])
+    edges = np.linspace(1, size - 1, n - 1).astype(int)  # n - 2 buckets between the end points
+    valid = ~np.isnan(y)
+    csum_x = np.concatenate([[0.0], np.cumsum(x)])
+    csum_y = np.concatenate([[0.0], np.cumsum(np.where(valid, y, 0.0))])
+    ccnt = np.concatenate([[0], np.cumsum(valid)])
+
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for b in range(n - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # average of the next bucket (the last point for the final bucket)
+        nlo, nhi = (hi, edges[b + 2]) if b + 2 < len(edges) else (size - 1, size)
+        cnt = ccnt[nhi] - ccnt[nlo]
+        avg_x = (csum_x[nhi] - csum_x[nlo]) / (nhi - nlo)
+        avg_y = (csum_y[nhi] - csum_y[nlo]) / cnt if cnt else np.nan
+        ys = y[lo:hi]
+        area = np.abs((x[a] - avg_x) * (ys - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        if not np.isnan(area).all():
+            a = lo + int(np.nanargmax(area))
+        elif valid[lo:hi].any():
+            a = lo + int(np.argmax(valid[lo:hi]))
+        else:
+            a = lo
+        out[b + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n: int) -> np.ndarray:
+    """Positions of the min and max of ~n/2 equal-count buckets (plus both ends), sorted."""
+    y = np.asarray(y, dtype=float)
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    if n < 4:
+        return np.unique(np.linspace(0, size - 1, max(n, 1)).round().astype(int))
+    buckets = n // 2 - 1
+    width = -(-size // buckets)
+    padded = np.full(buckets * width, np.nan)
+    padded[:size] = y
+    rows = padded.reshape(buckets, width)
+    empty = np.isnan(rows).all(axis=1)
+    filled = np.where(empty[:, None], 0.0, rows)
+    lo = np.where(np.isnan(filled), np.inf, filled).argmin(axis=1)
+    hi = np.where(np.isnan(filled), -np.inf, filled).argmax(axis=1)
+    base = np.arange(buckets) * width
+    keep = np.concatenate([[0, size - 1], base + lo, base + hi])
+    return np.unique(keep[keep < size])
+
+
+def indices(x: np.ndarray, y: np.ndarray, n: int, method: str = "lttb") -> np.ndarray:
+    if method == "lttb":
+        return lttb_indices(x, y, n)
+    if method == "minmax":
+        return minmax_indices(y, n)
+    if method == "none":
+        return np.arange(len(y))
+    raise ValueError(f"Unknown downsampling method {method!r}; expected one of {METHODS}")
+
+
+# ---- frames ----------------------------------------------------------------
+
+def downsample_series(s: pd.Series, n: int, method: str = "lttb") -> pd.Series:
+    """`s` reduced to about `n` points (unchanged when it is short enough)."""
+    if len(s) <= n:
+        return s
+    return s.iloc[indices(_x(s.index), s.to_numpy(dtype=float), n, method)]
+
+
+def downsample_frame(df: pd.DataFrame, n: int, method: str = "lttb") -> pd.DataFrame:
+    """
+    At most `n` rows of `df`: each of its k columns is downsampled to n // k
+    points. A row picked for one column keeps its values in all columns, so
+    lines stay joined.
+    """
+    if len(df) <= n or df.empty:
+        return df
+    x = _x(df.index)
+    per_column = max(n // max(len(df.columns), 1), 1)
+    keep = np.unique(np.concatenate(
+        [indices(x, df[c].to_numpy(dtype=float), per_column, method) for c in df.columns]
+    ))
+    return df.iloc[keep]
@@ -1,18 +1,43 @@
 # src/aq_pipeline/fetch.py
+"""
+Open-Meteo fetchers. Requests run as coroutines on one `aio.AsyncHttpClient`
+per call (sharing the process-wide rate limits); cache and store I/O and large
+decodes run in worker threads so they never block the event loop.
+`fetch_openmeteo` and `fetch_openmeteo_batch` are blocking wrappers around the
+`*_async` coroutines.
+"""
 from __future__ import annotations
 
+import asyncio
+import bisect
+import io
+import threading
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Iterable, Tuple, List
+from typing import Dict, Iterable, Tuple, List
 
+import numpy as np
 import pandas as pd
-import requests
 
+from . import aio, decode, storage
+from .aio import AsyncHttpClient
+from .cache import CacheMiss, ResponseCache
 from .utils import get_logger, ensure_parent, to_api_params
 
 BASE_URL = "https://air-quality-api.open-meteo.com/v1/air-quality"
 log = get_logger("aq_pipeline")
 
+# Open-Meteo accepts up to ~92 days per request; spans above this are split.
+MAX_WINDOW_DAYS = 92
+MIN_WINDOW_DAYS = 7
+DEFAULT_WINDOW_DAYS = 90
+# Bodies larger than this are decoded in a worker thread (incrementally when
+# `ijson` is installed), off the event loop.
+STREAM_THRESHOLD_BYTES = 8 * 1024 * 1024
+# Days older than this are final at the API (matches ResponseCache.recent_days):
+# once fetched, a gap there stays a gap.
+SETTLED_DAYS = 5
+
 # ---- helpers ---------------------------------------------------------------
 
 def _daterange_chunks(start: date, end: date, chunk_days: int = 90) -> List[Tuple[date, date]]:
@@ -30,20 +55,85 @@ def _daterange_chunks(start: date, end: date, chunk_days: int = 90) -> List[Tupl
     return out
 
 
-def _fetch_one_window(
-    *,
-    lat: float,
-    lon: float,
+class _WindowSizer:
+    """
+    Pick the next window length (days) from observed response latency and size.
+    Keeps an exponentially weighted estimate of seconds/day and bytes/day and
+    sizes windows so a single response stays near `target_seconds` and
+    `target_bytes`, clamped to [min_days, max_days]. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        initial_days: int = DEFAULT_WINDOW_DAYS,
+        target_seconds: float = 8.0,
+        target_bytes: int = 4_000_000,
+        min_days: int = MIN_WINDOW_DAYS,
+        max_days: int = MAX_WINDOW_DAYS,
+        alpha: float = 0.5,
+    ) -> None:
+        self.min_days = min_days
+        self.max_days = max_days
+        self.target_seconds = target_seconds
+        self.target_bytes = target_bytes
+        self.alpha = alpha
+        self._days = max(min_days, min(initial_days, max_days))
+        self._sec_per_day: float | None = None
+        self._bytes_per_day: float | None = None
+        self._lock = threading.Lock()
+
+    def observe(self, days: int, seconds: float, nbytes: int) -> None:
+        if days <= 0:
+            return
+        spd, bpd = seconds / days, nbytes / days
+        with self._lock:
+            if self._sec_per_day is None:
+                self._sec_per_day, self._bytes_per_day = spd, bpd
+            else:
+                a = self.alpha
+                self._sec_per_day = a * spd + (1 - a) * self._sec_per_day
+                self._bytes_per_day = a * bpd + (1 - a) * self._bytes_per_day
+            limits = [self.max_days]
+            if self._sec_per_day > 0:
+                limits.append(self.target_seconds / self._sec_per_day)
+            if self._bytes_per_day > 0:
+                limits.append(self.target_bytes / self._bytes_per_day)
+            self._days = max(self.min_days, min(int(min(limits)), self.max_days))
+
+    def next_days(self) -> int:
+        with self._lock:
+            return self._days
+
+
+def _month_pieces(start: date, end: date) -> List[Tuple[date, date]]:
+    """
+    Split [start, end] inclusive at calendar-month boundaries. These pieces are
+    the unit of caching: requests may group or split them, but each is stored
+    whole under its own key, so cache keys stay stable however requests are sized.
+    """
+    out: List[Tuple[date, date]] = []
+    one = timedelta(days=1)
+    cur = start
+    while cur <= end:
+        next_month = (cur.replace(day=1) + timedelta(days=32)).replace(day=1)
+        piece_end = min(next_month - one, end)
+        out.append((cur, piece_end))
+        cur = piece_end + one
+    return out
+
+
+def _window_params(
+    latitude: float | str,
+    longitude: float | str,
     hourly_params: list[str],
     start_date: date | None = None,
     end_date: date | None = None,
     past_days: int | None = None,
-    timeout: int = 30,
-) -> pd.DataFrame:
-    """Fetch a single window (by explicit dates or past_days) and return a tidy DataFrame."""
+) -> Tuple[dict, str]:
+    """Query parameters for one Open-Meteo request, and a short description of its window."""
     params: dict[str, str | int | float] = {
-        "latitude": lat,
-        "longitude": lon,
+        "latitude": latitude,
+        "longitude": longitude,
         "hourly": ",".join(hourly_params),
         "timezone": "UTC",
     }
@@ -54,27 +144,518 @@ def _fetch_one_window(
     else:
         params["past_days"] = int(past_days or 30)
         desc = f"past_days={params['past_days']}"
+    return params, desc
+
+
+async def _decode_body(body: bytes, hourly_params: list[str]) -> dict | list:
+    """
+    Decode a response body: one payload, or a list of them for a batched request.
+    Large bodies are decoded in a worker thread (streamed through ijson if installed).
+    """
+    if len(body) <= STREAM_THRESHOLD_BYTES:
+        return decode.loads(body)
+    if decode.can_stream():
+        load = decode.load_stream_many if body[:64].lstrip()[:1] == b"[" else decode.load_stream
+        return await asyncio.to_thread(load, io.BytesIO(body), hourly_params)
+    return await asyncio.to_thread(decode.loads, body)
+
 
+async def _request_window(
+    client: AsyncHttpClient,
+    *,
+    lat: float,
+    lon: float,
+    hourly_params: list[str],
+    start_date: date | None = None,
+    end_date: date | None = None,
+    past_days: int | None = None,
+    timeout: int = 30,
+    sizer: _WindowSizer | None = None,
+) -> dict:
+    """
+    Issue one Open-Meteo request (by explicit dates or past_days) and return the JSON payload.
+    If `sizer` is given, the response latency and size are reported to it.
+    """
+    params, desc = _window_params(lat, lon, hourly_params, start_date, end_date, past_days)
     log.info(f"Fetching {hourly_params} for ({lat},{lon}) [{desc}]")
-    r = requests.get(BASE_URL, params=params, timeout=timeout)
+    r = await client.get(BASE_URL, params=params, timeout=timeout)
     r.raise_for_status()
-    js = r.json()
+    js = await _decode_body(r.content, hourly_params)
+    if sizer is not None and start_date and end_date:
+        sizer.observe((end_date - start_date).days + 1, r.elapsed, len(r.content))
+    return js
+
+
+def _frame_from_payload(js: dict, hourly_params: list[str]) -> pd.DataFrame:
+    """Turn an Open-Meteo payload into a tidy DataFrame (time + one float64 column per param)."""
+    return decode.hourly_frame(js, hourly_params)
+
+
+def _split_payload(js: dict, pieces: List[Tuple[date, date]]) -> List[dict]:
+    """Slice one payload's hourly arrays into one payload per (start, end) piece."""
     hourly = js.get("hourly") or {}
     times = hourly.get("time") or []
+    out: List[dict] = []
+    lo = 0
+    for _s, e in pieces:
+        # ISO strings sort chronologically; every timestamp on day `e` sorts below "<e>T99"
+        hi = bisect.bisect_left(times, e.isoformat() + "T99", lo)
+        part = {k: (v[lo:hi] if isinstance(v, (list, np.ndarray)) else v) for k, v in hourly.items()}
+        out.append({"hourly": part, "hourly_units": js.get("hourly_units") or {}})
+        lo = hi
+    return out
+
+
+async def _fetch_past_days(
+    client: AsyncHttpClient,
+    *,
+    lat: float,
+    lon: float,
+    hourly_params: list[str],
+    past_days: int,
+    timeout: int = 30,
+    cache: ResponseCache | None = None,
+) -> pd.DataFrame:
+    """Fetch a relative (past_days) window and return a tidy DataFrame."""
+    key, volatile = (None, False)
+    if cache is not None:
+        key, volatile = cache.window_key(lat, lon, hourly_params, past_days=past_days)
+        body = await asyncio.to_thread(cache.get, key, volatile)
+        if body is not None:
+            return _frame_from_payload(decode.loads(body), hourly_params)
+        if cache.offline:
+            raise CacheMiss(f"Offline: no cached data for ({lat},{lon}) past_days={past_days}")
+
+    js = await _request_window(
+        client, lat=lat, lon=lon, hourly_params=hourly_params, past_days=past_days, timeout=timeout,
+    )
+    if cache is not None:
+        await asyncio.to_thread(cache.put, key, decode.dumps(js))
+    return _frame_from_payload(js, hourly_params)
+
+
+def _cached_pieces(
+    cache: ResponseCache | None,
+    lat: float,
+    lon: float,
+    hourly_params: list[str],
+    pieces: List[Tuple[date, date]],
+) -> Tuple[Dict[date, pd.DataFrame], List[Tuple[date, date]], Dict[date, tuple[str, bool]]]:
+    """Serve pieces from `cache`; return (frames by piece start, missing pieces, cache keys)."""
+    found: Dict[date, pd.DataFrame] = {}
+    missing: List[Tuple[date, date]] = []
+    keys: Dict[date, tuple[str, bool]] = {}
+    for s, e in pieces:
+        if cache is None:
+            missing.append((s, e))
+            continue
+        keys[s] = cache.window_key(lat, lon, hourly_params, s, e)
+        body = cache.get(*keys[s])
+        if body is None:
+            missing.append((s, e))
+        else:
+            found[s] = _frame_from_payload(decode.loads(body), hourly_params)
+    return found, missing, keys
+
+
+def _plan_windows(
+    cache: ResponseCache | None,
+    lat: float,
+    lon: float,
+    hourly_params: list[str],
+    start: date,
+    end: date,
+) -> Tuple[Dict[date, pd.DataFrame], List[Tuple[date, date]], Dict[date, tuple[str, bool]]]:
+    """Month pieces of [start, end] served from `cache`, as `_cached_pieces`; raises CacheMiss offline."""
+    pieces = _month_pieces(start, end)
+    by_start, missing, keys = _cached_pieces(cache, lat, lon, hourly_params, pieces)
+
+    if missing and cache is not None and cache.offline:
+        raise CacheMiss(
+            f"Offline: {len(missing)} of {len(pieces)} month windows for ({lat},{lon}) are not cached"
+        )
+    if cache is not None and pieces:
+        log.info(f"Cache: {len(pieces) - len(missing)}/{len(pieces)} windows for ({lat},{lon}) served from disk")
+    return by_start, missing, keys
+
+
+def _join_payloads(parts: List[dict]) -> dict:
+    """Concatenate the hourly arrays of consecutive payloads (the inverse of `_split_payload`)."""
+    columns: Dict[str, list] = {}
+    for part in parts:
+        for k, v in (part.get("hourly") or {}).items():
+            columns.setdefault(k, []).append(v)
+    hourly = {}
+    for k, vs in columns.items():
+        if any(isinstance(v, np.ndarray) for v in vs):
+            hourly[k] = np.concatenate([np.asarray(v, dtype=np.float64) for v in vs])
+        elif all(isinstance(v, list) for v in vs):
+            hourly[k] = [x for v in vs for x in v]
+        else:
+            hourly[k] = vs[0]
+    return {"hourly": hourly, "hourly_units": parts[0].get("hourly_units") or {}}
+
+
+class _PieceStore:
+    """
+    Collect responses for the missing month pieces of one location. A request may
+    cover several pieces or only part of one (see `_take_group`); a piece is cached
+    under its month key once all of its days have arrived, so cache keys do not
+    depend on how requests were sized. Thread-safe.
+    """
+
+    def __init__(
+        self,
+        missing: List[Tuple[date, date]],
+        keys: Dict[date, tuple[str, bool]],
+        cache: ResponseCache | None,
+        hourly_params: list[str],
+    ) -> None:
+        self.ends = dict(missing)
+        self.starts = sorted(self.ends)
+        self.keys = keys
+        self.cache = cache
+        self.hourly_params = hourly_params
+        self._parts: Dict[date, List[Tuple[date, date, dict]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, js: dict, spans: List[Tuple[date, date]]) -> List[Tuple[date, pd.DataFrame]]:
+        """Split a response over `spans`; cache and return (piece start, frame) for each piece it completes."""
+        complete = []
+        for (s, e), part in zip(spans, _split_payload(js, spans)):
+            piece = self.starts[bisect.bisect_right(self.starts, s) - 1]
+            with self._lock:
+                parts = self._parts.setdefault(piece, [])
+                parts.append((s, e, part))
+                if sum((pe - ps).days + 1 for ps, pe, _ in parts) < (self.ends[piece] - piece).days + 1:
+                    continue
+                del self._parts[piece]
+            complete.append((piece, _join_payloads([p for _s, _e, p in sorted(parts, key=lambda x: x[0])])))
+
+        out = []
+        for piece, payload in complete:
+            if self.cache is not None:
+                self.cache.put(self.keys[piece][0], decode.dumps(payload))
+            out.append((piece, _frame_from_payload(payload, self.hourly_params)))
+        return out
+
+
+def _take_group(
+    missing: List[Tuple[date, date]], i: int, limit_days: int
+) -> Tuple[List[Tuple[date, date]], int]:
+    """
+    Take contiguous spans from missing[i:] covering at most `limit_days`. A first
+    span longer than that is split in place, so requests can be shorter than a month.
+    """
+    one = timedelta(days=1)
+    limit_days = max(1, limit_days)
+    s, e = missing[i]
+    if (e - s).days + 1 > limit_days:
+        cut = s + timedelta(days=limit_days - 1)
+        missing[i:i + 1] = [(s, cut), (cut + one, e)]
+    group = [missing[i]]
+    i += 1
+    while (
+        i < len(missing)
+        and missing[i][0] == group[-1][1] + one
+        and (missing[i][1] - group[0][0]).days + 1 <= limit_days
+    ):
+        group.append(missing[i])
+        i += 1
+    return group, i
+
+
+async def _fetch_windows(
+    client: AsyncHttpClient,
+    *,
+    lat: float,
+    lon: float,
+    hourly_params: list[str],
+    start: date,
+    end: date,
+    timeout: int = 30,
+    max_in_flight: int = 4,
+    chunk_days: int | None = None,
+    cache: ResponseCache | None = None,
+) -> List[pd.DataFrame]:
+    """
+    Fetch [start, end] with up to `max_in_flight` requests in flight; frames are
+    returned in time order. If one request fails, the others are cancelled.
+
+    The span is cut into calendar-month pieces. Pieces found in `cache` are served
+    from disk; missing ones are fetched in requests of at most `chunk_days` days
+    (or an adaptive length based on observed latency/payload), grouping contiguous
+    pieces or splitting a piece when the limit is shorter than a month. Responses
+    are reassembled into month pieces and stored.
+    """
+    by_start, missing, keys = await asyncio.to_thread(_plan_windows, cache, lat, lon, hourly_params, start, end)
+    store = _PieceStore(missing, keys, cache, hourly_params)
+    sizer = _WindowSizer() if chunk_days is None else None
+
+    async def fetch_group(group: List[Tuple[date, date]]) -> List[Tuple[date, pd.DataFrame]]:
+        js = await _request_window(
+            client, lat=lat, lon=lon, hourly_params=hourly_params,
+            start_date=group[0][0], end_date=group[-1][1], timeout=timeout, sizer=sizer,
+        )
+        return await asyncio.to_thread(store.add, js, group)
+
+    pending: set[asyncio.Task] = set()
+    i = 0
+    try:
+        while i < len(missing) or pending:
+            while i < len(missing) and len(pending) < max(1, max_in_flight):
+                limit = chunk_days if chunk_days is not None else sizer.next_days()
+                group, i = _take_group(missing, i, limit)
+                pending.add(asyncio.create_task(fetch_group(group)))
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                by_start.update(task.result())
+    finally:
+        for task in pending:
+            task.cancel()
+
+    return [by_start[k] for k in sorted(by_start)]
+
+
+def _missing_days(
+    existing: pd.DataFrame,
+    hourly_params: list[str],
+    start: date,
+    end: date,
+    fetched: List[Tuple[date, date]] = (),
+) -> List[date]:
+    """
+    Days in [start, end] with at least one hour that is absent from `existing`
+    or has no value for any parameter. Hours later than now (UTC) are ignored,
+    and so are days inside `fetched` (settled days already requested once).
+    """
+    expected = pd.date_range(start, end + timedelta(days=1), freq="h", inclusive="left")
+    have = existing.loc[existing[hourly_params].notna().any(axis=1), "time"]
+    gaps = expected.difference(pd.DatetimeIndex(have))
+    gaps = gaps[gaps <= pd.Timestamp.now(tz="UTC").tz_localize(None)]
+    return sorted(d for d in set(gaps.date) if not any(lo <= d <= hi for lo, hi in fetched))
+
+
+def _day_runs(days: List[date]) -> List[Tuple[date, date]]:
+    """Collapse sorted days into contiguous (start, end) runs."""
+    runs: List[Tuple[date, date]] = []
+    one = timedelta(days=1)
+    for d in days:
+        if runs and runs[-1][1] + one == d:
+            runs[-1] = (runs[-1][0], d)
+        else:
+            runs.append((d, d))
+    return runs
+
+
+def _incremental_plan(
+    out_path: Path,
+    hourly_params: list[str],
+    start: date,
+    end: date,
+) -> List[Tuple[date, date]] | None:
+    """
+    Read the existing raw data in [start, end] and return the runs of days it is
+    missing that have not already been fetched (see `storage.read_fetched`).
+    Returns None if it cannot be reused (its columns differ).
+    """
+    existing = storage.read_frame(
+        out_path, "time", start=pd.Timestamp(start), end=pd.Timestamp(end + timedelta(days=1))
+    ).reset_index()
+    if list(existing.columns) != ["time"] + hourly_params:
+        log.info(f"Incremental: columns of {out_path} differ from {hourly_params}; doing a full fetch")
+        return None
+    fetched = storage.read_fetched(out_path)
+    return _day_runs(_missing_days(existing, hourly_params, start, end, fetched))
+
+
+def _past_span(days: int) -> Tuple[date, date]:
+    """The explicit (start, end) of a past_days window ending today."""
+    today = date.today()
+    return today - timedelta(days=days - 1), today
 
-    if not times:
-        # empty frame with correct columns
-        return pd.DataFrame(columns=["time"] + hourly_params)
 
-    df = pd.DataFrame({"time": pd.to_datetime(times)})
-    for name in hourly_params:
-        df[name] = hourly.get(name)
-    return df
+def _note_fetched(out_path: Path, spans: List[Tuple[date, date]], replace: bool = False) -> None:
+    """Record the settled part of `spans` as fetched for `out_path`."""
+    cutoff = date.today() - timedelta(days=SETTLED_DAYS + 1)
+    settled = [(s, min(e, cutoff)) for s, e in spans if s <= cutoff]
+    if settled or replace:
+        storage.record_fetched(out_path, settled, replace=replace)
+
+
+def _merge_new_rows(
+    out_path: Path,
+    frames: List[pd.DataFrame],
+    hourly_params: list[str],
+    fetched: List[Tuple[date, date]] = (),
+) -> Path:
+    """
+    Merge freshly fetched frames into the raw data at `out_path` (see
+    `storage.upsert_frame`: only touched month partitions are rewritten, and
+    CSV files are appended to when the new rows follow the stored history).
+    The requested day spans `fetched` are added to the fetch log.
+    """
+    new = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["time"] + hourly_params)
+    # hours the API has no values for yet stay missing; the next run asks again
+    # unless they are settled (see `_note_fetched`)
+    new = new.dropna(how="all", subset=hourly_params).drop_duplicates(subset=["time"]).sort_values("time")
+    if new.empty:
+        log.info(f"Incremental: no new values for {out_path}")
+    else:
+        storage.upsert_frame(new, out_path, "time", record_changes=True)
+        log.info(f"Merged {len(new)} new rows → {out_path}")
+    _note_fetched(out_path, list(fetched))
+    return out_path
+
+
+def _write_raw(
+    frames: List[pd.DataFrame],
+    hourly_params: list[str],
+    out_path: Path,
+    fetched: List[Tuple[date, date]] = (),
+) -> Path:
+    """
+    Concatenate, de-duplicate, sort, and write fetched frames as the raw data;
+    the requested day spans `fetched` replace the fetch log.
+    """
+    if frames:
+        df_all = pd.concat(frames, ignore_index=True)
+    else:
+        df_all = pd.DataFrame(columns=["time"] + hourly_params)
+
+    if not df_all.empty:
+        df_all = df_all.drop_duplicates(subset=["time"]).sort_values("time")
+
+    storage.write_frame(df_all, out_path, "time", record_changes=True)
+    _note_fetched(out_path, list(fetched), replace=True)
+    log.info(f"Saved raw data → {out_path}")
+    return out_path
+
+
+async def _request_batch(
+    client: AsyncHttpClient,
+    *,
+    coords: List[Tuple[float, float]],
+    hourly_params: list[str],
+    start_date: date | None = None,
+    end_date: date | None = None,
+    past_days: int | None = None,
+    timeout: int = 30,
+) -> List[dict]:
+    """One Open-Meteo request for several points; returns one payload per point, in order."""
+    params, desc = _window_params(
+        ",".join(str(lat) for lat, _ in coords), ",".join(str(lon) for _, lon in coords),
+        hourly_params, start_date, end_date, past_days,
+    )
+    log.info(f"Fetching {hourly_params} for {len(coords)} locations [{desc}]")
+    r = await client.get(BASE_URL, params=params, timeout=timeout)
+    r.raise_for_status()
+    js = await _decode_body(r.content, hourly_params)
+    out = js if isinstance(js, list) else [js]
+    if len(out) != len(coords):
+        raise ValueError(f"Expected {len(coords)} results from batched request, got {len(out)}")
+    return out
+
+
+def _plan_batches(
+    locations: Dict[str, Tuple[float, float]],
+    spans: Dict[str, List[Tuple[date, date]]],
+    hourly_params: list[str],
+    limit: int,
+    cache: ResponseCache | None,
+) -> tuple:
+    """
+    Serve each location's month pieces from `cache` and group the missing ones
+    by request window. Returns (found, stores, errors, {window: [(name, spans)]}).
+    """
+    found: Dict[str, Dict[date, pd.DataFrame]] = {}
+    stores: Dict[str, _PieceStore] = {}
+    errors: Dict[str, BaseException] = {}
+    by_window: Dict[Tuple[date, date], List[Tuple[str, List[Tuple[date, date]]]]] = {}
+    for name, name_spans in spans.items():
+        lat, lon = locations[name]
+        pieces = [p for s, e in name_spans for p in _month_pieces(s, e)]
+        found[name], missing, keys = _cached_pieces(cache, lat, lon, hourly_params, pieces)
+        if missing and cache is not None and cache.offline:
+            errors[name] = CacheMiss(f"Offline: {len(missing)} month windows for {name} are not cached")
+            continue
+        stores[name] = _PieceStore(missing, keys, cache, hourly_params)
+        i = 0
+        while i < len(missing):
+            group, i = _take_group(missing, i, limit)
+            by_window.setdefault((group[0][0], group[-1][1]), []).append((name, group))
+    return found, stores, errors, by_window
+
+
+async def _fetch_spans_batched(
+    client: AsyncHttpClient,
+    *,
+    locations: Dict[str, Tuple[float, float]],
+    spans: Dict[str, List[Tuple[date, date]]],
+    hourly_params: list[str],
+    timeout: int,
+    max_in_flight: int,
+    batch_size: int,
+    chunk_days: int | None,
+    cache: ResponseCache | None,
+) -> Tuple[Dict[str, List[pd.DataFrame]], Dict[str, BaseException]]:
+    """
+    Fetch each location's date spans, packing locations that need the same window
+    into one request of up to `batch_size` points. Month pieces are cached per
+    location exactly as in `_fetch_windows`. Returns ({name: frames}, {name: error}).
+    """
+    found, stores, errors, by_window = await asyncio.to_thread(
+        _plan_batches, locations, spans, hourly_params, chunk_days or DEFAULT_WINDOW_DAYS, cache,
+    )
+    slots = asyncio.Semaphore(max(1, max_in_flight))
+
+    async def fetch_batch(window: Tuple[date, date], entries: List[Tuple[str, List[Tuple[date, date]]]]) -> None:
+        async with slots:
+            payloads = await _request_batch(
+                client, coords=[locations[name] for name, _ in entries], hourly_params=hourly_params,
+                start_date=window[0], end_date=window[1], timeout=timeout,
+            )
+        for (name, group), js in zip(entries, payloads):
+            parts = await asyncio.to_thread(stores[name].add, js, group)
+            found[name].update(parts)
+
+    batches = [
+        (window, entries[k:k + max(1, batch_size)])
+        for window, entries in by_window.items()
+        for k in range(0, len(entries), max(1, batch_size))
+    ]
+    outcomes = await asyncio.gather(*(fetch_batch(w, chunk) for w, chunk in batches), return_exceptions=True)
+    for (_w, chunk), out in zip(batches, outcomes):
+        if isinstance(out, Exception):
+            names = [name for name, _ in chunk]
+            log.error(f"Batched request for {names} failed: {out}")
+            for name in names:
+                errors.setdefault(name, out)
+
+    frames = {
+        name: [by_start[k] for k in sorted(by_start)]
+        for name, by_start in found.items() if name not in errors
+    }
+    return frames, errors
+
+
+def _parse_range(start_date: str | None, end_date: str | None) -> Tuple[date | None, date | None]:
+    """Parse explicit YYYY-MM-DD bounds; (None, None) unless both are given."""
+    if not (start_date and end_date):
+        return None, None
+    try:
+        sd = datetime.strptime(start_date, "%Y-%m-%d").date()
+        ed = datetime.strptime(end_date, "%Y-%m-%d").date()
+    except ValueError as e:
+        raise SystemExit(f"Invalid date format: {e}")
+    if sd > ed:
+        raise SystemExit(f"start_date {start_date} must be ≤ end_date {end_date}")
+    return sd, ed
 
 
 # ---- public API ------------------------------------------------------------
 
-def fetch_openmeteo(
+async def fetch_openmeteo_async(
     *,
     lat: float,
     lon: float,
@@ -84,75 +665,239 @@ def fetch_openmeteo(
     start_date: str | None = None,
     end_date: str | None = None,
     timeout: int = 30,
+    max_in_flight: int = 4,
+    chunk_days: int | None = None,
+    cache: ResponseCache | None = None,
+    incremental: bool = False,
+    client: AsyncHttpClient | None = None,
 ) -> Path:
     """
-    Fetch hourly air-quality data from Open-Meteo and save as CSV at `out_csv`.
+    Fetch hourly air-quality data from Open-Meteo and save it at `out_csv`
+    (a Parquet dataset directory, or a CSV file if the path ends in .csv).
     `parameters` must be short names: pm25, pm10, no2, co.
 
-    If the requested span is > ~90 days, this function automatically splits into
-    90-day windows and stitches results into one file.
+    Explicit date ranges are split into calendar-month windows; contiguous windows
+    are grouped into requests, up to `max_in_flight` of which run concurrently, and
+    the results are stitched into one file. Window length adapts to observed
+    response latency and size unless `chunk_days` fixes it. Requests go through
+    `client`, or a client of its own on the process-wide limits.
+
+    With a `cache`, month-aligned windows already on disk are not re-downloaded;
+    in offline mode a missing window raises `CacheMiss`.
+
+    With `incremental=True` and existing data at `out_csv`, only missing hours
+    are requested (all missing ranges at once) and merged in (past_days is
+    treated as the explicit range ending today); history already on disk is
+    left untouched.
     """
     hourly_params = to_api_params(list(parameters))
+    sd, ed = _parse_range(start_date, end_date)
+    out_path = ensure_parent(out_csv)
+
+    async with aio.using(client) as client:
+        async def windows(start: date, end: date) -> List[pd.DataFrame]:
+            return await _fetch_windows(
+                client, lat=lat, lon=lon, hourly_params=hourly_params, start=start, end=end,
+                timeout=timeout, max_in_flight=max_in_flight, chunk_days=chunk_days, cache=cache,
+            )
+
+        if incremental and out_path.exists():
+            if not (sd and ed):
+                sd, ed = _past_span(int(past_days or 30))
+            runs = await asyncio.to_thread(_incremental_plan, out_path, hourly_params, sd, ed)
+            if runs is not None:
+                if not runs:
+                    log.info(f"Incremental: {out_path} already covers {sd}..{ed}")
+                    return out_path
+                log.info(f"Incremental: fetching {len(runs)} missing range(s) for ({lat},{lon}): {runs}")
+                parts = await asyncio.gather(*(windows(s, e) for s, e in runs))
+                frames = [f for part in parts for f in part]
+                return await asyncio.to_thread(_merge_new_rows, out_path, frames, hourly_params, runs)
 
-    # Resolve date inputs
-    sd: date | None = None
-    ed: date | None = None
-    if start_date and end_date:
-        try:
-            sd = datetime.strptime(start_date, "%Y-%m-%d").date()
-            ed = datetime.strptime(end_date, "%Y-%m-%d").date()
-        except ValueError as e:
-            raise SystemExit(f"Invalid date format: {e}")
-        if sd > ed:
-            raise SystemExit(f"start_date {start_date} must be ≤ end_date {end_date}")
-
-    # Decide chunking plan
-    frames: List[pd.DataFrame] = []
-
-    if sd and ed:
-        span_days = (ed - sd).days + 1
-        if span_days <= 92:
-            # single window OK
-            frames.append(_fetch_one_window(
-                lat=lat, lon=lon, hourly_params=hourly_params,
-                start_date=sd, end_date=ed, timeout=timeout
-            ))
-        else:
-            # chunk into 90-day windows
-            for win_s, win_e in _daterange_chunks(sd, ed, chunk_days=90):
-                frames.append(_fetch_one_window(
-                    lat=lat, lon=lon, hourly_params=hourly_params,
-                    start_date=win_s, end_date=win_e, timeout=timeout
-                ))
-    else:
-        # using past_days (relative to "today")
         days = int(past_days or 30)
-        if days <= 92:
-            frames.append(_fetch_one_window(
-                lat=lat, lon=lon, hourly_params=hourly_params,
-                past_days=days, timeout=timeout
-            ))
+        if sd and ed:
+            frames = await windows(sd, ed)
+        elif days <= MAX_WINDOW_DAYS:
+            sd, ed = _past_span(days)
+            frames = [await _fetch_past_days(
+                client, lat=lat, lon=lon, hourly_params=hourly_params,
+                past_days=days, timeout=timeout, cache=cache,
+            )]
         else:
-            # Convert large past_days into explicit date windows
-            today = date.today()
-            start_full = today - timedelta(days=days - 1)
-            for win_s, win_e in _daterange_chunks(start_full, today, chunk_days=90):
-                frames.append(_fetch_one_window(
-                    lat=lat, lon=lon, hourly_params=hourly_params,
-                    start_date=win_s, end_date=win_e, timeout=timeout
-                ))
-
-    # Concatenate, de-duplicate, sort, and write
-    if frames:
-        df_all = pd.concat(frames, ignore_index=True)
-    else:
-        df_all = pd.DataFrame(columns=["time"] + hourly_params)
+            # large past_days become explicit date windows
+            sd, ed = _past_span(days)
+            frames = await windows(sd, ed)
 
-    if not df_all.empty:
-        df_all = df_all.drop_duplicates(subset=["time"]).sort_values("time")
+    return await asyncio.to_thread(_write_raw, frames, hourly_params, out_path, [(sd, ed)])
 
-    # Ensure directory and save
-    out_path = ensure_parent(out_csv)
-    df_all.to_csv(out_path, index=False)
-    log.info(f"Saved raw data → {out_path}")
-    return out_path
+
+def fetch_openmeteo(**kwargs) -> Path:
+    """Blocking wrapper around `fetch_openmeteo_async` (same keyword arguments)."""
+    return aio.run(fetch_openmeteo_async(**kwargs))
+
+
+async def fetch_openmeteo_batch_async(
+    *,
+    locations: Dict[str, Tuple[float, float]],
+    parameters: Iterable[str],
+    out_paths: Dict[str, str | Path],
+    past_days: int | None = 30,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    timeout: int = 30,
+    batch_size: int = 10,
+    max_in_flight: int = 4,
+    chunk_days: int | None = None,
+    cache: ResponseCache | None = None,
+    incremental: bool = False,
+    client: AsyncHttpClient | None = None,
+) -> Tuple[Dict[str, Path], Dict[str, BaseException]]:
+    """
+    Like `fetch_openmeteo_async`, but for many named points at once: `locations`
+    maps name -> (lat, lon) and `out_paths` maps name -> raw data path.
+
+    Points that need the same window are sent as one request with comma-separated
+    coordinates (at most `batch_size` per request, `max_in_flight` requests at
+    once), and the per-point results are written to their own files. A failing
+    batch only fails its own points. Returns ({name: path}, {name: error}).
+    """
+    hourly_params = to_api_params(list(parameters))
+    out = {name: ensure_parent(out_paths[name]) for name in locations}
+    paths: Dict[str, Path] = {}
+    errors: Dict[str, BaseException] = {}
+
+    sd, ed = _parse_range(start_date, end_date)
+
+    days = int(past_days or 30)
+    if not (sd and ed) and (incremental or days > MAX_WINDOW_DAYS):
+        sd, ed = _past_span(days)
+
+    async with aio.using(client) as client:
+        if not (sd and ed):
+            # short relative window: one past_days request per batch, cached per point
+            def cached(name: str) -> bytes | None:
+                lat, lon = locations[name]
+                return cache.get(*cache.window_key(lat, lon, hourly_params, past_days=days))
+
+            todo: List[str] = []
+            for name in locations:
+                body = await asyncio.to_thread(cached, name) if cache is not None else None
+                if body is not None:
+                    paths[name] = await asyncio.to_thread(
+                        _write_raw, [_frame_from_payload(decode.loads(body), hourly_params)],
+                        hourly_params, out[name], [_past_span(days)],
+                    )
+                elif cache is not None and cache.offline:
+                    errors[name] = CacheMiss(f"Offline: no cached past_days={days} data for {name}")
+                else:
+                    todo.append(name)
+
+            slots = asyncio.Semaphore(max(1, max_in_flight))
+
+            async def fetch_chunk(chunk: List[str]) -> None:
+                async with slots:
+                    payloads = await _request_batch(
+                        client, coords=[locations[n] for n in chunk], hourly_params=hourly_params,
+                        past_days=days, timeout=timeout,
+                    )
+                for name, js in zip(chunk, payloads):
+                    if cache is not None:
+                        lat, lon = locations[name]
+                        key, _ = cache.window_key(lat, lon, hourly_params, past_days=days)
+                        await asyncio.to_thread(cache.put, key, decode.dumps(js))
+                    paths[name] = await asyncio.to_thread(
+                        _write_raw, [_frame_from_payload(js, hourly_params)],
+                        hourly_params, out[name], [_past_span(days)],
+                    )
+
+            chunks = [todo[k:k + max(1, batch_size)] for k in range(0, len(todo), max(1, batch_size))]
+            outcomes = await asyncio.gather(*(fetch_chunk(c) for c in chunks), return_exceptions=True)
+            for chunk, outcome in zip(chunks, outcomes):
+                if isinstance(outcome, Exception):
+                    log.error(f"Batched request for {chunk} failed: {outcome}")
+                    errors.update({n: outcome for n in chunk if n not in paths})
+            return paths, errors
+
+        spans: Dict[str, List[Tuple[date, date]]] = {}
+        merge: set[str] = set()
+        for name in locations:
+            runs = None
+            if incremental and out[name].exists():
+                runs = await asyncio.to_thread(_incremental_plan, out[name], hourly_params, sd, ed)
+            if runs is None:
+                spans[name] = [(sd, ed)]
+                continue
+            merge.add(name)
+            if runs:
+                spans[name] = runs
+            else:
+                log.info(f"Incremental: {out[name]} already covers {sd}..{ed}")
+                paths[name] = out[name]
+
+        frames, fetch_errors = await _fetch_spans_batched(
+            client, locations=locations, spans=spans, hourly_params=hourly_params, timeout=timeout,
+            max_in_flight=max_in_flight, batch_size=batch_size, chunk_days=chunk_days, cache=cache,
+        )
+    errors.update(fetch_errors)
+    for name, name_frames in frames.items():
+        if name in merge:
+            paths[name] = await asyncio.to_thread(_merge_new_rows, out[name], name_frames, hourly_params, spans[name])
+        else:
+            paths[name] = await asyncio.to_thread(_write_raw, name_frames, hourly_params, out[name], spans[name])
+    return paths, errors
+
+
+def fetch_openmeteo_batch(**kwargs) -> Tuple[Dict[str, Path], Dict[str, BaseException]]:
+    """Blocking wrapper around `fetch_openmeteo_batch_async` (same keyword arguments)."""
+    return aio.run(fetch_openmeteo_batch_async(**kwargs))
+
+
+async def fetch_openmeteo_many_async(
+    *,
+    locations: Dict[str, Tuple[float, float]],
+    parameters: Iterable[str],
+    out_paths: Dict[str, str | Path],
+    past_days: int | None = 30,
+    start_date: str | None = None,
+    end_date: str | None = None,
+    timeout: int = 30,
+    max_in_flight: int = 4,
+    chunk_days: int | None = None,
+    cache: ResponseCache | None = None,
+    incremental: bool = False,
+    client: AsyncHttpClient | None = None,
+) -> Tuple[Dict[str, Path], Dict[str, BaseException]]:
+    """
+    `fetch_openmeteo_async` for every name -> (lat, lon) in `locations`, all at
+    once on one client, whose limits bound the requests in flight (`max_in_flight`
+    is per point). Unlike `fetch_openmeteo_batch_async` every point gets its own
+    requests. A failing point only fails itself. Returns ({name: path}, {name: error}).
+    """
+    parameters = list(parameters)
+    _parse_range(start_date, end_date)  # bad dates fail the call, not every point
+    names = list(locations)
+    async with aio.using(client) as client:
+        outcomes = await asyncio.gather(*(
+            fetch_openmeteo_async(
+                lat=locations[name][0], lon=locations[name][1], parameters=parameters,
+                out_csv=out_paths[name], past_days=past_days, start_date=start_date,
+                end_date=end_date, timeout=timeout, max_in_flight=max_in_flight,
+                chunk_days=chunk_days, cache=cache, incremental=incremental, client=client,
+            )
+            for name in names
+        ), return_exceptions=True)
+
+    paths: Dict[str, Path] = {}
+    errors: Dict[str, BaseException] = {}
+    for name, out in zip(names, outcomes):
+        if isinstance(out, BaseException):
+            log.error(f"Fetch for {name} failed: {out}")
+            errors[name] = out
+        else:
+            paths[name] = out
+    return paths, errors
+
+
+def fetch_openmeteo_many(**kwargs) -> Tuple[Dict[str, Path], Dict[str, BaseException]]:
+    """Blocking wrapper around `fetch_openmeteo_many_async` (same keyword arguments)."""
+    return aio.run(fetch_openmeteo_many_async(**kwargs))
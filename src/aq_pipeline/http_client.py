@@ -0,0 +1,180 @@
+# src/aq_pipeline/http_client.py
+from __future__ import annotations
+
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# ---- rate limiting ---------------------------------------------------------
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens/second refill up to `capacity`.
+    `acquire()` blocks until a token is available. Thread-safe.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be > 0")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens` if available and return 0.0, else return seconds to wait."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            wait_s = self.try_acquire(tokens)
+            if wait_s <= 0:
+                return
+            time.sleep(wait_s)
+
+
+# ---- client ----------------------------------------------------------------
+
+def _retry_after_seconds(resp: requests.Response) -> float | None:
+    """Parse a Retry-After header (delta-seconds or HTTP-date) into seconds."""
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class HttpClient:
+    """
+    Pooled keep-alive HTTP client shared by all fetchers.
+
+    - one `requests.Session` with a connection pool of `pool_size` per host
+    - retries on connection errors/timeouts and on `retry_statuses`
+      with exponential backoff and full jitter, honoring `Retry-After`
+    - a per-host token bucket (`rate_per_sec`, `burst`) applied to every attempt
+    """
+
+    def __init__(
+        self,
+        *,
+        pool_size: int = 16,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 60.0,
+        rate_per_sec: float = 5.0,
+        burst: float = 10.0,
+        retry_statuses: Iterable[int] = RETRY_STATUSES,
+        session: requests.Session | None = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_per_sec = rate_per_sec
+        self.burst = burst
+        self.retry_statuses = frozenset(retry_statuses)
+        self.session = session or requests.Session()
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        host = urlsplit(url).netloc
+        with self._lock:
+            b = self._buckets.get(host)
+            if b is None:
+                b = self._buckets[host] = TokenBucket(self.rate_per_sec, self.burst)
+            return b
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(
+        self,
+        url: str,
+        *,
+        params: Dict[str, Any] | None = None,
+        timeout: float = 30,
+        stream: bool = False,
+    ) -> requests.Response:
+        """
+        GET with rate limiting and retries. Returns the final response (which may
+        still be an error status once retries are exhausted); re-raises the last
+        connection error if every attempt failed at the transport level.
+        """
+        bucket = self.bucket(url)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                resp = self.session.get(url, params=params, timeout=timeout, stream=stream)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                log.warning(f"{type(e).__name__} on {url}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            if resp.status_code not in self.retry_statuses or attempt >= self.max_retries:
+                return resp
+            retry_after = _retry_after_seconds(resp)
+            delay = min(self.backoff_max, retry_after) if retry_after is not None else self._backoff(attempt)
+            log.warning(f"HTTP {resp.status_code} on {url}; retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            resp.close()
+            time.sleep(delay)
+        raise AssertionError("unreachable")
+
+
+# ---- shared instance -------------------------------------------------------
+
+_CLIENT: HttpClient | None = None
+_CLIENT_LOCK = threading.Lock()
+
+
+def get_client() -> HttpClient:
+    """Return the process-wide HttpClient, creating it on first use."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = HttpClient()
+        return _CLIENT
+
+
+def set_client(client: HttpClient | None) -> None:
+    """Replace the process-wide client (e.g. to change limits, or None to reset)."""
+    global _CLIENT
+    with _CLIENT_LOCK:
+        _CLIENT = client
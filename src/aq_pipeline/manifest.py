@@ -0,0 +1,115 @@
+# src/aq_pipeline/manifest.py
+"""
+Per-city record of what each pipeline stage last produced, so stages whose
+inputs have not changed can be skipped.
+
+For every stage the manifest keeps a key (a hash of the stage's parameters and
+of the content of its inputs) and a content hash of each output. A stage is
+fresh when its key matches and every output still hashes to what was recorded.
+A stage is only recorded after all its outputs are written, so a run that
+crashed half-way through one is never mistaken for a finished one.
+
+File hashes are remembered together with each file's (mtime, size), so only
+files rewritten since the last run are read again.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Mapping
+
+from . import storage
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+DEFAULT_MANIFEST_DIR = storage.DEFAULT_STORE_DIR / "_manifest"
+MISSING = "-"
+
+
+def _sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """
+    Stage records for one city, stored as JSON at `path`. With `force=True`
+    nothing is considered fresh, but stages are still recorded.
+    """
+
+    def __init__(self, path: str | Path, force: bool = False) -> None:
+        self.path = Path(path)
+        self.force = force
+        self.stages: Dict[str, dict] = {}
+        self.files: Dict[str, list] = {}  # path -> [mtime_ns, size, sha256]
+        if self.path.exists():
+            try:
+                body = json.loads(self.path.read_text(encoding="utf-8"))
+                self.stages, self.files = body["stages"], body["files"]
+            except (ValueError, KeyError, TypeError) as e:
+                log.warning(f"Ignoring unreadable manifest {self.path}: {e}")
+
+    @classmethod
+    def for_city(cls, city_slug: str, root: str | Path = DEFAULT_MANIFEST_DIR, force: bool = False) -> "Manifest":
+        return cls(Path(root) / f"{city_slug}.json", force=force)
+
+    # ---- hashing ----------------------------------------------------------
+
+    def digest(self, path: str | Path) -> str:
+        """Content hash of the data stored at `path` (a file or dataset directory)."""
+        path = Path(path)
+        parts = []
+        for name, mtime_ns, size in storage.signature(path):
+            f = path / name if path.is_dir() else path
+            seen = self.files.get(str(f))
+            if seen is None or seen[:2] != [mtime_ns, size]:
+                seen = [mtime_ns, size, _sha256_file(f)]
+                self.files[str(f)] = seen
+            parts.append(f"{name}:{seen[2]}")
+        if not parts:
+            return MISSING
+        return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+    def key(self, params: Mapping[str, object], inputs: Iterable[str | Path] = ()) -> str:
+        """Hash of a stage's parameters and the content of its inputs."""
+        body = {
+            "params": {k: str(v) for k, v in params.items()},
+            "inputs": {str(p): self.digest(p) for p in inputs},
+        }
+        return hashlib.sha256(json.dumps(body, sort_keys=True).encode("utf-8")).hexdigest()
+
+    # ---- stages -----------------------------------------------------------
+
+    def fresh(self, stage: str, key: str, outputs: Iterable[str | Path]) -> bool:
+        """True if `stage` last ran with `key` and produced exactly these, unchanged, outputs."""
+        rec = self.stages.get(stage)
+        if self.force or rec is None or rec["key"] != key:
+            return False
+        outputs = {str(p) for p in outputs}
+        if set(rec["outputs"]) != outputs:
+            return False
+        return all(rec["outputs"][p] == self.digest(p) != MISSING for p in outputs)
+
+    def record(self, stage: str, key: str, outputs: Iterable[str | Path]) -> None:
+        """Note that `stage` completed with `key`, and save."""
+        self.stages[stage] = {"key": key, "outputs": {str(p): self.digest(p) for p in outputs}}
+        self.save()
+
+    def forget(self, stage: str) -> None:
+        if self.stages.pop(stage, None) is not None:
+            self.save()
+
+    def save(self) -> Path:
+        self.files = {p: v for p, v in self.files.items() if Path(p).exists()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f".{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"stages": self.stages, "files": self.files}), encoding="utf-8")
+        os.replace(tmp, self.path)
+        return self.path
@@ -0,0 +1,134 @@
+# src/aq_pipeline/nowcast.py
+"""
+Hourly "current" AQI from the raw hourly frames.
+
+    pm2_5, pm10        EPA NowCast over the last 12 hours
+    carbon_monoxide    8-hour rolling mean (at least 6 valid hours)
+    nitrogen_dioxide   the 1-hour value itself
+
+Kernels work on (hours,) or (hours, series) arrays: the NowCast uses a strided
+12-hour window view and the rolling mean uses cumulative sums, so the cost is
+O(hours) per series however many cities are stacked side by side.
+"""
+from __future__ import annotations
+
+from typing import Dict, Mapping
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from . import aqi
+
+NOWCAST_HOURS = 12
+MIN_WEIGHT = 0.5  # PM weight-factor floor
+CO_HOURS = 8
+CO_MIN_HOURS = 6
+
+# ---- kernels ---------------------------------------------------------------
+
+def _pad_front(values: np.ndarray, n: int) -> np.ndarray:
+    pad = np.full((n,) + values.shape[1:], np.nan)
+    return np.concatenate([pad, values], axis=0)
+
+
+def pm_nowcast(values: np.ndarray, hours: int = NOWCAST_HOURS, min_weight: float = MIN_WEIGHT) -> np.ndarray:
+    """
+    EPA NowCast along axis 0 of an hourly array. For each hour the weight factor
+    is min/max of the valid values in the window (floored at `min_weight`) and
+    hour i back gets weight factor**i. Needs 2 of the 3 most recent hours.
+    """
+    v = np.asarray(values, dtype=float)
+    win = sliding_window_view(_pad_front(v, hours - 1), hours, axis=0)[..., ::-1]  # [..., 0] = current hour
+    valid = ~np.isnan(win)
+    cmax = np.max(np.where(valid, win, -np.inf), axis=-1)
+    cmin = np.min(np.where(valid, win, np.inf), axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        factor = np.where(cmax > 0, cmin / cmax, 1.0)
+    factor = np.clip(factor, min_weight, 1.0)
+    weights = np.where(valid, factor[..., None] ** np.arange(hours), 0.0)
+    num = (weights * np.where(valid, win, 0.0)).sum(axis=-1)
+    den = weights.sum(axis=-1)
+    ok = valid[..., :3].sum(axis=-1) >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(ok, num / den, np.nan)
+
+
+def rolling_mean(values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    """Trailing mean along axis 0 from cumulative sums; NaN where fewer than `min_periods` values."""
+    v = np.asarray(values, dtype=float)
+    valid = ~np.isnan(v)
+    zeros = np.zeros((1,) + v.shape[1:])
+    csum = np.concatenate([zeros, np.cumsum(np.where(valid, v, 0.0), axis=0)])
+    ccnt = np.concatenate([zeros, np.cumsum(valid, axis=0)])
+    lo = np.maximum(np.arange(1, len(v) + 1) - window, 0)
+    hi = np.arange(1, len(v) + 1)
+    total = csum[hi] - csum[lo]
+    count = ccnt[hi] - ccnt[lo]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(count >= min_periods, total / count, np.nan)
+
+
+def concentrations(pollutant: str, values: np.ndarray) -> np.ndarray:
+    """The averaged concentration the hourly AQI uses for `pollutant`."""
+    if pollutant in ("pm2_5", "pm10"):
+        return pm_nowcast(values)
+    if pollutant == "carbon_monoxide":
+        return rolling_mean(values, CO_HOURS, CO_MIN_HOURS)
+    return np.asarray(values, dtype=float)
+
+
+# ---- frames ----------------------------------------------------------------
+
+def _regular(hourly: pd.DataFrame) -> pd.DataFrame:
+    """Reindex to consecutive hours so the windows count clock hours, not rows."""
+    if hourly.empty:
+        return hourly
+    idx = pd.date_range(hourly.index.min(), hourly.index.max(), freq="h", name=hourly.index.name)
+    return hourly if len(idx) == len(hourly) else hourly.reindex(idx)
+
+
+def hourly_aqi(hourly: pd.DataFrame) -> pd.DataFrame:
+    """
+    Hourly NowCast inputs (one column per pollutant present) joined with their
+    `AQI_<pollutant>` sub-indices, the overall `AQI` and the `dominant` pollutant.
+    """
+    hourly = _regular(hourly)
+    names = [p for p in aqi.POLLUTANTS if p in hourly.columns]
+    conc = pd.DataFrame(
+        {p: concentrations(p, hourly[p].to_numpy(dtype=float)) for p in names},
+        index=hourly.index,
+    )
+    return conc.join(aqi.aqi_frame(conc))
+
+
+def hourly_aqi_stack(frames: Mapping[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """`hourly_aqi` for many cities; each pollutant runs as one hours x city array."""
+    if not frames:
+        return {}
+    regular = {city: _regular(df) for city, df in frames.items()}
+    wide = _regular(pd.concat(regular, axis=1))
+    cities = list(regular)
+    conc: Dict[str, pd.DataFrame] = {city: pd.DataFrame(index=wide.index) for city in cities}
+    for p in aqi.POLLUTANTS:
+        have = [c for c in cities if p in regular[c].columns]
+        if not have:
+            continue
+        block = wide.reindex(columns=pd.MultiIndex.from_product([have, [p]])).to_numpy(dtype=float)
+        out = concentrations(p, block)
+        for j, city in enumerate(have):
+            conc[city][p] = out[:, j]
+    conc = {city: df.loc[regular[city].index] for city, df in conc.items()}
+    indices = aqi.aqi_stack(conc)
+    return {city: conc[city].join(indices[city]) for city in cities}
+
+
+def latest(hourly: pd.DataFrame, asof: pd.Timestamp | None = None) -> pd.Series | None:
+    """
+    Most recent row of `hourly_aqi` output with a valid AQI at or before `asof`
+    (default: now, UTC, since the API also returns forecast hours), or None.
+    """
+    if asof is None:
+        asof = pd.Timestamp.now("UTC").tz_localize(None)
+    valid = hourly.loc[:asof].dropna(subset=["AQI"])
+    return valid.iloc[-1] if not valid.empty else None
@@ -0,0 +1,387 @@
+# src/aq_pipeline/online.py
+from __future__ import annotations
+
+import json
+import math
+import os
+import random
+from dataclasses import dataclass, field
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from .analyze import SeriesStats
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+# Day ordinals are stored relative to this origin to keep the OLS sums well conditioned.
+ORIGIN_ORDINAL = date(2000, 1, 1).toordinal()
+STATS_FILE = "_stats.json"
+
+# ---- quantile sketch -------------------------------------------------------
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (KLL, Karnin-Lang-Liberty). Level h holds items of
+    weight 2**h; a full level is sorted and every other item is promoted. Memory
+    is O(k) and rank error is roughly O(1/k). While nothing has been compacted
+    the sketch is exact and answers like numpy's linear quantile.
+
+    The coin flip of the i-th compaction is drawn from `seed` and i, and both
+    are persisted, so the same values give the same sketch on every run, also
+    across save/load.
+    """
+
+    def __init__(self, k: int = 200, c: float = 2 / 3, seed: int = 0) -> None:
+        self.k = k
+        self.c = c
+        self.seed = seed
+        self.compactions = 0
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+
+    def _capacity(self, h: int) -> int:
+        depth = len(self.levels) - h - 1
+        return int(math.ceil(self.k * self.c ** depth)) + 1
+
+    def _size(self) -> int:
+        return sum(len(lv) for lv in self.levels)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(h) for h in range(len(self.levels)))
+
+    def _compress(self) -> None:
+        while self._size() >= self._max_size():
+            for h, lv in enumerate(self.levels):
+                if len(lv) >= self._capacity(h):
+                    if h + 1 == len(self.levels):
+                        self.levels.append([])
+                    lv.sort()
+                    keep = [lv.pop()] if len(lv) % 2 else []
+                    offset = random.Random(self.seed * 1_000_003 + self.compactions).random() < 0.5
+                    self.compactions += 1
+                    self.levels[h + 1].extend(lv[offset::2])
+                    self.levels[h] = keep
+                    break
+
+    def update(self, values: Iterable[float]) -> None:
+        vals = [float(v) for v in values if v == v]  # drop NaN
+        self.levels[0].extend(vals)
+        self.n += len(vals)
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for h, lv in enumerate(other.levels):
+            self.levels[h].extend(lv)
+        self.n += other.n
+        self._compress()
+        return self
+
+    def copy(self) -> "KLLSketch":
+        out = KLLSketch(self.k, self.c, self.seed)
+        out.compactions = self.compactions
+        out.n = self.n
+        out.levels = [list(lv) for lv in self.levels]
+        return out
+
+    def _weighted(self) -> tuple[np.ndarray, np.ndarray]:
+        items = np.array([x for lv in self.levels for x in lv], dtype=float)
+        weights = np.array([2 ** h for h, lv in enumerate(self.levels) for _ in lv], dtype=float)
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def quantile(self, q: float) -> float | None:
+        if self.n == 0:
+            return None
+        if len(self.levels) == 1:
+            return float(np.quantile(self.levels[0], q))
+        items, weights = self._weighted()
+        cum = np.cumsum(weights)
+        i = int(np.searchsorted(cum, q * cum[-1], side="left"))
+        return float(items[min(i, len(items) - 1)])
+
+    def rank(self, x: float, strict: bool = True) -> float:
+        """Estimated number of items < x (or <= x if strict is False)."""
+        items, weights = self._weighted()
+        side = "left" if strict else "right"
+        return float(weights[: np.searchsorted(items, x, side=side)].sum())
+
+    def to_dict(self) -> dict:
+        return {
+            "k": self.k, "c": self.c, "seed": self.seed, "compactions": self.compactions,
+            "n": self.n, "levels": self.levels,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "KLLSketch":
+        out = cls(d["k"], d["c"], d.get("seed", 0))
+        out.compactions = d.get("compactions", 0)
+        out.n = d["n"]
+        out.levels = [list(map(float, lv)) for lv in d["levels"]] or [[]]
+        return out
+
+
+# ---- per-series sufficient statistics --------------------------------------
+
+@dataclass
+class RunningStats:
+    """Mergeable sufficient statistics for one series of daily values."""
+    rows: int = 0            # days seen, including missing ones
+    count: int = 0           # non-missing values
+    total: float = 0.0
+    sumsq: float = 0.0
+    vmax: float | None = None
+    sx: float = 0.0          # OLS accumulators, x = day ordinal - ORIGIN_ORDINAL
+    sxx: float = 0.0
+    sxy: float = 0.0
+    sketch: KLLSketch = field(default_factory=KLLSketch)
+
+    def update(self, values: np.ndarray, x: np.ndarray) -> None:
+        """Add one value per day; NaN marks a day without data. O(len(values))."""
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        v, xv = values[valid], np.asarray(x, dtype=float)[valid]
+        self.rows += int(len(values))
+        self.count += int(v.size)
+        if v.size == 0:
+            return
+        self.total += float(v.sum())
+        self.sumsq += float((v * v).sum())
+        self.vmax = float(v.max()) if self.vmax is None else max(self.vmax, float(v.max()))
+        self.sx += float(xv.sum())
+        self.sxx += float((xv * xv).sum())
+        self.sxy += float((xv * v).sum())
+        self.sketch.update(v)
+
+    def merge(self, other: "RunningStats") -> "RunningStats":
+        self.rows += other.rows
+        self.count += other.count
+        self.total += other.total
+        self.sumsq += other.sumsq
+        if other.vmax is not None:
+            self.vmax = other.vmax if self.vmax is None else max(self.vmax, other.vmax)
+        self.sx += other.sx
+        self.sxx += other.sxx
+        self.sxy += other.sxy
+        self.sketch.merge(other.sketch)
+        return self
+
+    def copy(self) -> "RunningStats":
+        out = RunningStats(**{k: getattr(self, k) for k in self.__dataclass_fields__ if k != "sketch"})
+        out.sketch = self.sketch.copy()
+        return out
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self) -> float | None:
+        if self.count < 2:
+            return None
+        var = (self.sumsq - self.total * self.total / self.count) / (self.count - 1)
+        return math.sqrt(max(var, 0.0))
+
+    def slope(self) -> float | None:
+        if self.count < 3:
+            return None
+        n = self.count
+        sxx_c = self.sxx - self.sx * self.sx / n
+        if sxx_c <= 0:
+            return None
+        return (self.sxy - self.sx * self.total / n) / sxx_c
+
+    def anomalies(self, k: float = 1.5) -> int:
+        """IQR-rule outlier count estimated from the sketch."""
+        q1, q3 = self.sketch.quantile(0.25), self.sketch.quantile(0.75)
+        if q1 is None:
+            return 0
+        iqr = q3 - q1
+        below = self.sketch.rank(q1 - k * iqr, strict=True)
+        above = self.sketch.n - self.sketch.rank(q3 + k * iqr, strict=False)
+        return int(round(below + above))
+
+    def to_series_stats(self) -> SeriesStats:
+        return SeriesStats(
+            days=self.rows,
+            coverage_pct=0.0 if self.rows == 0 else round(100 * self.count / self.rows, 1),
+            mean=self.mean,
+            max=self.vmax,
+            p95=self.sketch.quantile(0.95),
+            trend_slope_per_day=self.slope(),
+            anomalies=self.anomalies(),
+        )
+
+    def to_dict(self) -> dict:
+        d = {k: getattr(self, k) for k in self.__dataclass_fields__ if k != "sketch"}
+        d["sketch"] = self.sketch.to_dict()
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "RunningStats":
+        d = dict(d)
+        sketch = KLLSketch.from_dict(d.pop("sketch"))
+        return cls(**d, sketch=sketch)
+
+
+def _x(index: pd.Index) -> np.ndarray:
+    days = pd.DatetimeIndex(index).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    return (days + date(1970, 1, 1).toordinal() - ORIGIN_ORDINAL).astype(float)
+
+
+# ---- per-city collection ---------------------------------------------------
+
+class OnlineStats:
+    """
+    Running statistics for every pollutant of one daily series (or a roll-up).
+
+    Days up to `committed_through` are folded into the accumulators exactly once.
+    The newest day(s), which can still change as hours arrive, are kept as a
+    small uncommitted tail that is replaced on every update and only combined
+    at query time. Changes to already committed days need `rebuild`.
+    """
+
+    def __init__(self) -> None:
+        self.series: Dict[str, RunningStats] = {}
+        self.committed_through: pd.Timestamp | None = None
+        self.tail: pd.DataFrame = pd.DataFrame()
+
+    @classmethod
+    def rebuild(cls, daily: pd.DataFrame, open_days: int = 1) -> "OnlineStats":
+        out = cls()
+        out.update(daily, open_days=open_days)
+        return out
+
+    def update(self, daily: pd.DataFrame, open_days: int = 1) -> "OnlineStats":
+        """
+        Fold in the rows of `daily` newer than `committed_through`; the last
+        `open_days` days are treated as still changing. Cost is O(new rows).
+        """
+        if daily.empty:
+            return self
+        new = daily if self.committed_through is None else daily.loc[daily.index > self.committed_through]
+        cutoff = daily.index.max() - pd.Timedelta(days=open_days)
+        commit = new.loc[new.index <= cutoff]
+        self.tail = new.loc[new.index > cutoff].copy()
+        if not commit.empty:
+            x = _x(commit.index)
+            for col in commit.columns:
+                self.series.setdefault(col, RunningStats()).update(commit[col].to_numpy(dtype=float), x)
+            self.committed_through = commit.index.max()
+        return self
+
+    def merge(self, other: "OnlineStats") -> "OnlineStats":
+        """Combine with another city's/period's statistics (e.g. for a regional roll-up)."""
+        for col, st in other.resolved().items():
+            if col in self.series:
+                self.series[col].merge(st)
+            else:
+                self.series[col] = st.copy()
+        return self
+
+    def resolved(self) -> Dict[str, RunningStats]:
+        """Committed accumulators plus the uncommitted tail."""
+        out = {col: st.copy() for col, st in self.series.items()}
+        if not self.tail.empty:
+            x = _x(self.tail.index)
+            for col in self.tail.columns:
+                out.setdefault(col, RunningStats()).update(self.tail[col].to_numpy(dtype=float), x)
+        return out
+
+    def to_metrics(self) -> Dict[str, SeriesStats]:
+        return {col: st.to_series_stats() for col, st in self.resolved().items()}
+
+    # ---- persistence ------------------------------------------------------
+
+    def to_dict(self) -> dict:
+        tail = None
+        if not self.tail.empty:
+            vals = self.tail.to_numpy(dtype=float)
+            tail = {
+                "index": [t.isoformat() for t in self.tail.index],
+                "columns": [str(c) for c in self.tail.columns],
+                "data": [[None if v != v else v for v in row] for row in vals.tolist()],
+            }
+        return {
+            "committed_through": None if self.committed_through is None else self.committed_through.isoformat(),
+            "series": {col: st.to_dict() for col, st in self.series.items()},
+            "tail": tail,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "OnlineStats":
+        out = cls()
+        if d.get("committed_through"):
+            out.committed_through = pd.Timestamp(d["committed_through"])
+        out.series = {col: RunningStats.from_dict(sd) for col, sd in d.get("series", {}).items()}
+        if d.get("tail"):
+            t = d["tail"]
+            idx = pd.DatetimeIndex(pd.to_datetime(t["index"]), name="date")
+            out.tail = pd.DataFrame(t["data"], index=idx, columns=t["columns"], dtype=float)
+        return out
+
+    def save(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.to_dict()), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str | Path) -> "OnlineStats":
+        return cls.from_dict(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def stats_path(processed: str | Path) -> Path:
+    """Where the statistics for a processed dataset/file are kept (next to it)."""
+    p = Path(processed)
+    if p.suffix:
+        return p.with_name(p.name + ".stats.json")
+    return p / STATS_FILE
+
+
+def update_stats_file(
+    processed: str | Path,
+    daily: pd.DataFrame,
+    open_days: int = 1,
+    rebuild: bool = False,
+    changed_from: pd.Timestamp | None = None,
+) -> OnlineStats:
+    """
+    Load the persisted statistics for `processed`, fold in the new rows of
+    `daily`, save and return them. Rebuilds from scratch when asked to (the
+    history was rewritten), when days from `changed_from` on were already
+    committed, or if the stored columns no longer match or the file is
+    missing/corrupt.
+    """
+    path = stats_path(processed)
+    stats: OnlineStats | None = None
+    if path.exists() and not rebuild:
+        try:
+            stats = OnlineStats.load(path)
+        except (ValueError, KeyError, TypeError) as e:
+            log.warning(f"Ignoring unreadable stats file {path}: {e}")
+    if stats is not None and changed_from is not None and stats.committed_through is not None:
+        if changed_from <= stats.committed_through:
+            stats = None
+    if stats is None or (stats.series and set(stats.series) != set(daily.columns)):
+        stats = OnlineStats.rebuild(daily, open_days=open_days)
+    else:
+        stats.update(daily, open_days=open_days)
+    stats.save(path)
+    return stats
+
+
+def merge_all(stats: Iterable[OnlineStats]) -> OnlineStats:
+    """Roll several cities'/periods' statistics up into one."""
+    out = OnlineStats()
+    for st in stats:
+        out.merge(st)
+    return out
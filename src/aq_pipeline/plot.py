@@ -3,59 +3,89 @@ from __future__ import annotations
 
 from pathlib import Path
 import pandas as pd
-import matplotlib.pyplot as plt
 
-from .utils import get_logger, ensure_parent
+from . import storage
+from .render import Renderer, RenderJob
+from .utils import get_logger
+
+YLABEL = "Concentration (µg/m³)"
+
+
+def combined_job(
+    daily_csv: str | Path | pd.DataFrame,
+    out_png: str | Path,
+    title: str = "Daily Air Quality Means",
+    dpi: int = 150,
+    downsample: str = "lttb",
+) -> RenderJob:
+    df = storage.read_frame(daily_csv, "date")
+    return RenderJob(
+        Path(out_png), df, title=title, ylabel=YLABEL, figsize=(10, 5), dpi=dpi, downsample=downsample
+    )
+
+
+def pollutant_jobs(
+    daily_csv: str | Path | pd.DataFrame,
+    out_dir: str | Path,
+    prefix: str = "",
+    dpi: int = 150,
+    downsample: str = "lttb",
+    file_prefix: str = "",
+) -> list[RenderJob]:
+    df = storage.read_frame(daily_csv, "date")
+    out_dir = Path(out_dir)
+    return [
+        RenderJob(
+            out_dir / f"{file_prefix}{prefix}{col}.png",
+            df[[col]],
+            title=f"{prefix}{col} — Daily Mean",
+            ylabel=YLABEL,
+            figsize=(8, 4),
+            dpi=dpi,
+            legend=False,
+            downsample=downsample,
+        )
+        for col in df.columns
+    ]
 
 
 def plot_combined(
-    daily_csv: str | Path,
+    daily_csv: str | Path | pd.DataFrame,
     out_png: str | Path,
     title: str = "Daily Air Quality Means",
     dpi: int = 150,
+    renderer: Renderer | None = None,
+    downsample: str = "lttb",
 ) -> Path:
-    """Plot all pollutants together from a daily CSV."""
+    """
+    Plot all pollutants together from daily data (CSV, Parquet dataset or DataFrame).
+    Series longer than the figure is wide are decimated with `downsample` ("lttb", "minmax" or "none").
+    """
     log = get_logger()
-    df = pd.read_csv(daily_csv, parse_dates=["date"]).set_index("date")
-
-    ax = df.plot(figsize=(10, 5))
-    ax.set_title(title)
-    ax.set_xlabel("Date")
-    ax.set_ylabel("Concentration (µg/m³)")
-
-    out = ensure_parent(out_png)
-    plt.tight_layout()
-    plt.savefig(out, dpi=dpi)
-    plt.close()
+    job = combined_job(daily_csv, out_png, title, dpi, downsample)
+    out = (renderer or Renderer(workers=1)).render([job])[0]
     log.info(f"Saved combined plot → {out}")
     return out
 
 
 def plot_per_pollutant(
-    daily_csv: str | Path,
+    daily_csv: str | Path | pd.DataFrame,
     out_dir: str | Path,
     prefix: str = "",
     dpi: int = 150,
+    renderer: Renderer | None = None,
+    downsample: str = "lttb",
+    file_prefix: str = "",
 ) -> list[Path]:
-    """Plot one figure per pollutant into out_dir."""
+    """
+    Plot one figure per pollutant into out_dir (daily data as path or DataFrame).
+    `prefix` goes into titles and file names, `file_prefix` into file names only.
+    With a shared `renderer` the figures are drawn in its process pool.
+    """
     log = get_logger()
-    df = pd.read_csv(daily_csv, parse_dates=["date"]).set_index("date")
-
-    out_dir = Path(out_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    paths: list[Path] = []
-    for col in df.columns:
-        ax = df[col].plot(figsize=(8, 4))
-        ax.set_title(f"{prefix}{col} — Daily Mean")
-        ax.set_xlabel("Date")
-        ax.set_ylabel("Concentration (µg/m³)")
-
-        p = out_dir / f"{prefix}{col}.png"
-        plt.tight_layout()
-        plt.savefig(p, dpi=dpi)
-        plt.close()
-        log.info(f"Saved {col} → {p}")
-        paths.append(p)
-
+    jobs = pollutant_jobs(daily_csv, out_dir, prefix, dpi, downsample, file_prefix)
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    paths = (renderer or Renderer(workers=1)).render(jobs)
+    for job, p in zip(jobs, paths):
+        log.info(f"Saved {job.data.columns[0]} → {p}")
     return paths
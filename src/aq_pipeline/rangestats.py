@@ -0,0 +1,142 @@
+# src/aq_pipeline/rangestats.py
+"""
+Range-aggregate index over daily series, for KPIs over arbitrary date ranges.
+
+Per column:
+    count, mean   prefix sums of values and valid counts        O(1)
+    max           sparse table of power-of-two window maxima    O(1)
+    p95           segment tree of KLL sketches over day blocks  O(log n) merges
+
+Building is O(n log n) per column. Ranges whose values fit in one sketch level
+(up to ~k values) get exact quantiles; longer ones are approximate, like
+online.KLLSketch.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from .online import KLLSketch
+
+BLOCK = 16      # days per sketch-tree leaf; partial blocks at the range edges are read exactly
+SKETCH_K = 200
+
+# ---- one series ------------------------------------------------------------
+
+class SeriesIndex:
+    """Range queries over positions [i, j) of one float series (NaN = missing)."""
+
+    def __init__(self, values: np.ndarray, block: int = BLOCK, k: int = SKETCH_K) -> None:
+        v = np.asarray(values, dtype=float)
+        self.values = v
+        self.block = block
+        valid = ~np.isnan(v)
+        self._csum = np.concatenate([[0.0], np.cumsum(np.where(valid, v, 0.0))])
+        self._ccnt = np.concatenate([[0], np.cumsum(valid)])
+
+        # sparse table: _max[h][i] = max(v[i : i + 2**h])
+        level = np.where(valid, v, -np.inf)
+        self._max = [level]
+        width = 1
+        while 2 * width <= len(v):
+            level = np.maximum(level[:-width], level[width:])
+            self._max.append(level)
+            width *= 2
+
+        # sketch tree over blocks: leaves at _tree[size + b]
+        nblocks = -(-len(v) // block)
+        self._size = 1
+        while self._size < max(nblocks, 1):
+            self._size *= 2
+        self._tree: List[KLLSketch | None] = [None] * (2 * self._size)
+        for b in range(nblocks):
+            leaf = KLLSketch(k, seed=b)
+            leaf.update(v[b * block:(b + 1) * block])
+            self._tree[self._size + b] = leaf
+        for node in range(self._size - 1, 0, -1):
+            left, right = self._tree[2 * node], self._tree[2 * node + 1]
+            if left is not None:
+                self._tree[node] = left.copy().merge(right) if right is not None else left
+
+    def count(self, i: int, j: int) -> int:
+        return int(self._ccnt[j] - self._ccnt[i])
+
+    def mean(self, i: int, j: int) -> float:
+        n = self.count(i, j)
+        return float((self._csum[j] - self._csum[i]) / n) if n else np.nan
+
+    def max(self, i: int, j: int) -> float:
+        if j <= i:
+            return np.nan
+        h = (j - i).bit_length() - 1
+        out = max(self._max[h][i], self._max[h][j - (1 << h)])
+        return float(out) if out > -np.inf else np.nan
+
+    def _sketches(self, lo: int, hi: int) -> Iterable[KLLSketch]:
+        """Tree nodes covering blocks [lo, hi)."""
+        lo += self._size
+        hi += self._size
+        while lo < hi:
+            if lo & 1:
+                yield self._tree[lo]
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                yield self._tree[hi]
+            lo //= 2
+            hi //= 2
+
+    def quantile(self, i: int, j: int, q: float) -> float:
+        if self.count(i, j) == 0:
+            return np.nan
+        lo = -(-i // self.block)   # first whole block
+        hi = j // self.block       # end of the last whole block
+        merged = KLLSketch(SKETCH_K, seed=0)
+        if lo < hi:
+            merged.update(self.values[i:lo * self.block])
+            merged.update(self.values[hi * self.block:j])
+            for sk in self._sketches(lo, hi):
+                merged.merge(sk)
+        else:
+            merged.update(self.values[i:j])
+        out = merged.quantile(q)
+        return np.nan if out is None else out
+
+
+# ---- frames ----------------------------------------------------------------
+
+class RangeStats:
+    """Per-column `SeriesIndex` over a frame with a sorted DatetimeIndex."""
+
+    def __init__(self, df: pd.DataFrame, block: int = BLOCK) -> None:
+        self.index = pd.DatetimeIndex(df.index)
+        self.columns: Dict[str, SeriesIndex] = {
+            str(c): SeriesIndex(df[c].to_numpy(dtype=float), block)
+            for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c])
+        }
+
+    def span(self, start=None, end=None) -> tuple[int, int]:
+        """Positions [i, j) of the rows in [start, end] (both inclusive, like .loc)."""
+        i = 0 if start is None else int(self.index.searchsorted(pd.Timestamp(start), side="left"))
+        j = len(self.index) if end is None else int(self.index.searchsorted(pd.Timestamp(end), side="right"))
+        return i, max(i, j)
+
+    def rows(self, start=None, end=None) -> int:
+        i, j = self.span(start, end)
+        return j - i
+
+    def summary(self, start=None, end=None, cols: Iterable[str] | None = None, q: float = 0.95) -> pd.DataFrame:
+        """pollutant, count, mean, p<q>, max for each of `cols` over [start, end]."""
+        i, j = self.span(start, end)
+        label = f"p{round(q * 100):d}"
+        out = []
+        for c in (self.columns if cols is None else cols):
+            ix = self.columns.get(c)
+            if ix is None:
+                continue
+            out.append({"pollutant": c, "count": ix.count(i, j), "mean": ix.mean(i, j),
+                        label: ix.quantile(i, j, q), "max": ix.max(i, j)})
+        return pd.DataFrame(out, columns=["pollutant", "count", "mean", label, "max"])
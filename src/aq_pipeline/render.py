@@ -0,0 +1,171 @@
+# src/aq_pipeline/render.py
+"""
+Figure rendering engine for the pipeline's PNGs.
+
+Figures are drawn with the object-oriented Figure API on an explicit Agg
+canvas (no pyplot, so no global state and no GUI backend), which makes them
+safe to render from threads and worker processes. Long series are decimated
+to about one point per pixel of the figure width (see downsample). A
+`Renderer` fans jobs out to a process pool; every PNG carries a hash of its
+input data and render parameters in its metadata, and a job whose output
+already carries the same hash is skipped.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List
+
+import matplotlib
+import matplotlib.dates as mdates
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from .downsample import downsample_series, points_for_width
+from .utils import get_logger, ensure_parent
+
+log = get_logger("aq_pipeline")
+
+RENDER_VERSION = 2   # bump when the drawing code changes, to invalidate cached PNGs
+KEY_FIELD = "aq-render-key"
+
+# ---- jobs ------------------------------------------------------------------
+
+@dataclass(frozen=True)
+class RenderJob:
+    """One line chart: a line per column of `data` against its DatetimeIndex."""
+    out_png: Path
+    data: pd.DataFrame = field(compare=False)
+    title: str = ""
+    xlabel: str = "Date"
+    ylabel: str = "Concentration (µg/m³)"
+    figsize: tuple[float, float] = (10, 5)
+    dpi: int = 150
+    legend: bool = True
+    downsample: str = "lttb"  # see downsample.METHODS
+
+    def key(self) -> str:
+        """Hash of the input data and everything that affects the pixels."""
+        h = hashlib.sha256()
+        h.update(pd.util.hash_pandas_object(self.data, index=True).to_numpy().tobytes())
+        params = {
+            "columns": [str(c) for c in self.data.columns],
+            "title": self.title,
+            "xlabel": self.xlabel,
+            "ylabel": self.ylabel,
+            "figsize": list(self.figsize),
+            "dpi": self.dpi,
+            "legend": self.legend,
+            "downsample": self.downsample,
+            "version": RENDER_VERSION,
+            "matplotlib": matplotlib.__version__,
+        }
+        h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+        return h.hexdigest()
+
+
+def draw(job: RenderJob, key: str | None = None) -> Path:
+    """Render `job` to its PNG (atomically) and return the path."""
+    fig = Figure(figsize=job.figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    n = points_for_width(job.figsize[0] * job.dpi, job.downsample)
+    for col in job.data.columns:
+        s = downsample_series(job.data[col].astype(float), n, job.downsample)
+        ax.plot(s.index, s.to_numpy(), label=str(col))
+    locator = mdates.AutoDateLocator()
+    ax.xaxis.set_major_locator(locator)
+    ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+    ax.set_title(job.title)
+    ax.set_xlabel(job.xlabel)
+    ax.set_ylabel(job.ylabel)
+    if job.legend and len(job.data.columns) > 1:
+        ax.legend()
+    fig.tight_layout()
+
+    out = ensure_parent(job.out_png)
+    tmp = out.with_name(f".{out.stem}.{os.getpid()}.{threading.get_ident()}.tmp.png")
+    fig.savefig(tmp, dpi=job.dpi, format="png", metadata={KEY_FIELD: key or job.key()})
+    os.replace(tmp, out)
+    return out
+
+
+def cached_key(png: str | Path) -> str | None:
+    """Render key stored in an existing PNG, or None."""
+    try:
+        from PIL import Image  # matplotlib depends on Pillow
+        with Image.open(png) as im:
+            return im.info.get(KEY_FIELD)
+    except (OSError, ImportError, ValueError):
+        return None
+
+
+# ---- engine ----------------------------------------------------------------
+
+def _done(value) -> Future:
+    fut: Future = Future()
+    fut.set_result(value)
+    return fut
+
+
+class Renderer:
+    """
+    Renders jobs in a shared process pool of `workers` processes (started on
+    first use); `workers=1` renders inline in the calling thread. Safe to
+    submit to from several threads, e.g. one per city.
+    """
+
+    def __init__(self, workers: int | None = None) -> None:
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.rendered = 0
+        self.skipped = 0
+        self._pool: ProcessPoolExecutor | None = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # fork is unsafe once the pipeline runs threads
+                method = "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn"
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context(method))
+            return self._pool
+
+    def submit(self, jobs: Iterable[RenderJob]) -> List[Future]:
+        """Queue `jobs`; each future resolves to the PNG path (cached ones at once)."""
+        futures = []
+        for job in jobs:
+            key = job.key()
+            if cached_key(job.out_png) == key:
+                with self._lock:
+                    self.skipped += 1
+                futures.append(_done(Path(job.out_png)))
+                continue
+            with self._lock:
+                self.rendered += 1
+            if self.workers == 1:
+                futures.append(_done(draw(job, key)))
+            else:
+                futures.append(self._executor().submit(draw, job, key))
+        return futures
+
+    def render(self, jobs: Iterable[RenderJob]) -> List[Path]:
+        return [f.result() for f in self.submit(jobs)]
+
+    def close(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def __enter__(self) -> "Renderer":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
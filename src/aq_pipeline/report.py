@@ -5,7 +5,9 @@ from pathlib import Path
 import pandas as pd
 
 from .analyze import analyze_csv, SeriesStats
-from .utils import get_logger, ensure_parent
+from .rollup import select
+from .storage import read_frame
+from .utils import atomic_write, get_logger
 
 
 def _fmt(x: float | None, nd: int = 2) -> str:
@@ -13,20 +15,28 @@ def _fmt(x: float | None, nd: int = 2) -> str:
 
 
 def write_summary_report(
-    daily_csv: str | Path,
+    daily_csv: str | Path | pd.DataFrame,
     out_txt: str | Path,
     city: str | None = None,
+    metrics: dict[str, SeriesStats] | None = None,
+    overview: pd.DataFrame | None = None,
+    overview_level: str = "",
 ) -> Path:
     """
-    Generates a human-readable text report with:
+    Generates a human-readable text report (from a daily path or DataFrame) with:
       - date range
       - coverage %
       - mean / max / p95
       - trend slope (µg/m³ per day)
       - anomaly count (IQR rule)
+    Precomputed `metrics` (e.g. from the online statistics) skip the recomputation.
+    An `overview` rollup frame (see aq_pipeline.rollup) adds a table of its means.
     """
     log = get_logger()
-    df, metrics = analyze_csv(daily_csv)
+    if metrics is None:
+        df, metrics = analyze_csv(daily_csv)
+    else:
+        df = read_frame(daily_csv, "date")
 
     lines: list[str] = []
     if city:
@@ -52,7 +62,16 @@ def write_summary_report(
             f"{st.anomalies}"
         )
 
-    out_path = ensure_parent(out_txt)
-    Path(out_path).write_text("\n".join(lines) + "\n", encoding="utf-8")
+    if overview is not None and not overview.empty:
+        means = select(overview, "mean")
+        lines.append("")
+        lines.append(f"Overview ({overview_level} means):")
+        lines.append("period | " + " | ".join(means.columns))
+        lines.append("-------|" + "|".join("-" * (len(c) + 2) for c in means.columns))
+        for ts, row in means.iterrows():
+            lines.append(f"{ts.date()} | " + " | ".join(_fmt(None if pd.isna(v) else v) for v in row))
+
+    text = "\n".join(lines) + "\n"
+    out_path = atomic_write(out_txt, lambda tmp: tmp.write_text(text, encoding="utf-8"))
     log.info(f"Saved report → {out_path}")
     return out_path
@@ -0,0 +1,180 @@
+# src/aq_pipeline/rollup.py
+"""
+Multi-resolution rollups of the hourly series, per city and pollutant:
+
+    hourly   the (interpolated) hourly values themselves, read from the raw store
+    daily    data/store/rollup/daily/city=<slug>
+    weekly   data/store/rollup/weekly/city=<slug>    weeks start on Monday
+    monthly  data/store/rollup/monthly/city=<slug>
+
+Every stored level has `<pollutant>__mean`, `__max`, `__count` and `__p95`
+columns. Mean, max and count are rolled up from the daily level (the daily mean
+equals `clean.daily_means`); p95 is taken over the hours of each bucket.
+`pick_level` chooses the level a chart or report should read for a range.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from . import storage
+from .clean import hourly_values
+from .utils import get_logger
+
+log = get_logger("aq_pipeline")
+
+LEVELS = ("hourly", "daily", "weekly", "monthly")
+STORED_LEVELS = ("daily", "weekly", "monthly")
+STATS = ("mean", "max", "count", "p95")
+FREQ = {"hourly": "h", "daily": "D", "weekly": "W-MON", "monthly": "MS"}
+# nominal bucket length, for estimating how many points a range needs
+BUCKET = {
+    "hourly": pd.Timedelta(hours=1),
+    "daily": pd.Timedelta(days=1),
+    "weekly": pd.Timedelta(days=7),
+    "monthly": pd.Timedelta(days=30.44),
+}
+SEP = "__"
+
+
+def layer(level: str) -> str:
+    return f"rollup/{level}"
+
+
+def stat_column(pollutant: str, stat: str) -> str:
+    return f"{pollutant}{SEP}{stat}"
+
+
+def select(df: pd.DataFrame, stat: str = "mean") -> pd.DataFrame:
+    """One column per pollutant holding `stat` (e.g. the means) of a rollup frame."""
+    suffix = f"{SEP}{stat}"
+    cols = [c for c in df.columns if c.endswith(suffix)]
+    return df[cols].rename(columns=lambda c: c[: -len(suffix)])
+
+
+# ---- building ----------------------------------------------------------------
+
+def _bucket_start(ts: pd.Timestamp, level: str) -> pd.Timestamp:
+    day = pd.Timestamp(ts).floor("D")
+    if level == "weekly":
+        return day - pd.Timedelta(days=day.weekday())
+    if level == "monthly":
+        return day.replace(day=1)
+    return day
+
+
+def _resample(df: pd.DataFrame, level: str):
+    return df.resample(FREQ[level], label="left", closed="left")
+
+
+def _combine(parts: Dict[str, pd.DataFrame], columns: List[str]) -> pd.DataFrame:
+    out = pd.DataFrame(
+        {stat_column(c, stat): parts[stat][c] for c in columns for stat in STATS},
+        index=parts["mean"].index,
+    )
+    out.index.name = "date"
+    return out
+
+
+def build_rollups(hourly: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """
+    Daily, weekly and monthly aggregates of an hourly frame (already cleaned,
+    see clean.hourly_values). Coarser means are count-weighted from the daily level.
+    """
+    cols = list(hourly.columns)
+    r = _resample(hourly, "daily")
+    daily = {"mean": r.mean(), "max": r.max(), "count": r.count().astype(float), "p95": r.quantile(0.95)}
+    out = {"daily": _combine(daily, cols)}
+    weighted = daily["mean"].fillna(0.0) * daily["count"]
+    for level in ("weekly", "monthly"):
+        count = _resample(daily["count"], level).sum()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = _resample(weighted, level).sum() / count.where(count > 0)
+        parts = {
+            "mean": mean,
+            "max": _resample(daily["max"], level).max(),
+            "count": count,
+            "p95": _resample(hourly, level).quantile(0.95),
+        }
+        out[level] = _combine(parts, cols)
+    return out
+
+
+def write_rollups(city_slug: str, hourly: pd.DataFrame, root: str | Path = storage.DEFAULT_STORE_DIR) -> Dict[str, Path]:
+    """Build and store every level for a city, replacing what was there."""
+    paths = {}
+    for level, df in build_rollups(hourly).items():
+        paths[level] = storage.write_frame(df, storage.dataset_path(layer(level), city_slug, root), "date")
+    return paths
+
+
+def update_rollups(
+    city_slug: str,
+    raw: str | Path,
+    first_day: pd.Timestamp,
+    last_day: pd.Timestamp,
+    interpolate: bool = True,
+    root: str | Path = storage.DEFAULT_STORE_DIR,
+) -> None:
+    """
+    Recompute the buckets of every level that contain days in [first_day, last_day]
+    (e.g. the days clean.update_daily re-aggregated) and splice them in.
+    """
+    lo = min(_bucket_start(first_day, lv) for lv in STORED_LEVELS)
+    hi_week = _bucket_start(last_day, "weekly") + pd.Timedelta(days=7)
+    hi_month = _bucket_start(last_day, "monthly") + pd.offsets.MonthBegin(1)
+    hi = max(hi_week, hi_month) - pd.Timedelta(microseconds=1)
+    hourly = hourly_values(raw, lo, hi, interpolate=interpolate)
+    for level, df in build_rollups(hourly).items():
+        keep = df.loc[_bucket_start(first_day, level):_bucket_start(last_day, level)]
+        storage.upsert_frame(keep, storage.dataset_path(layer(level), city_slug, root), "date")
+    log.info(f"Updated rollups for {city_slug}: {first_day.date()}..{last_day.date()}")
+
+
+# ---- reading -----------------------------------------------------------------
+
+def pick_level(
+    start: pd.Timestamp,
+    end: pd.Timestamp,
+    max_points: int = 1000,
+    levels: tuple[str, ...] = LEVELS,
+) -> str:
+    """Finest level that needs at most `max_points` buckets over [start, end] (else the coarsest)."""
+    span = pd.Timestamp(end) - pd.Timestamp(start)
+    for level in levels:
+        if span / BUCKET[level] + 1 <= max_points:
+            return level
+    return levels[-1]
+
+
+def available_levels(city_slug: str, root: str | Path = storage.DEFAULT_STORE_DIR) -> tuple[str, ...]:
+    """Levels that can be read for a city (hourly needs the raw store)."""
+    have = []
+    for level in LEVELS:
+        name = "raw" if level == "hourly" else layer(level)
+        if storage.dataset_path(name, city_slug, root).is_dir():
+            have.append(level)
+    return tuple(have)
+
+
+def load_level(
+    city_slug: str,
+    level: str,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    interpolate: bool = True,
+    root: str | Path = storage.DEFAULT_STORE_DIR,
+) -> pd.DataFrame:
+    """
+    A city's rollup frame at `level` for [start, end] (partitions outside are not read).
+    `interpolate` applies to the hourly level, which is read from the raw store.
+    """
+    if level == "hourly":
+        hourly = hourly_values(storage.dataset_path("raw", city_slug, root), start, end, interpolate=interpolate)
+        parts = {"mean": hourly, "max": hourly, "count": hourly.notna().astype(float), "p95": hourly}
+        return _combine(parts, list(hourly.columns))
+    lo = _bucket_start(start, level) if start is not None else None
+    return storage.read_frame(storage.dataset_path(layer(level), city_slug, root), "date", start=lo, end=end)
@@ -0,0 +1,465 @@
+# src/aq_pipeline/storage.py
+"""
+Storage for raw (hourly, time column "time") and processed (daily, "date") frames.
+
+Parquet datasets are the primary format. A dataset is a directory, usually one
+per city (`<root>/<layer>/city=<slug>`), split into month partitions:
+
+    city=milan/_schema.parquet              zero-row file carrying the typed schema
+    city=milan/month=2024-01/part-0.parquet
+    city=milan/month=2024-02/part-0.parquet
+
+so appends and reloads only touch the months involved. Any path ending in
+`.csv` is read/written as CSV instead; the pipeline uses that for exports.
+
+Writers can record the time span they changed in a small change journal
+(`_changes.json` in a dataset, `<file>.changes.json` next to a file), which
+downstream stages read to refresh only what is affected and then clear.
+A second small file (`_fetched.json` / `<file>.fetched.json`) lists the days
+already requested from the API, so gaps the API has no data for are not
+requested again on every run.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .utils import atomic_write, get_logger, ensure_parent
+
+log = get_logger("aq_pipeline")
+
+DEFAULT_STORE_DIR = Path("data/store")
+COMPRESSION = "zstd"
+SCHEMA_FILE = "_schema.parquet"
+PART_FILE = "part-0.parquet"
+CHANGES_FILE = "_changes.json"
+FETCHED_FILE = "_fetched.json"
+MAX_CHANGE_SPANS = 32
+# journal entry meaning "everything changed" (data rewritten wholesale)
+FULL_SPAN = (pd.Timestamp.min, pd.Timestamp.max)
+
+
+def dataset_path(layer: str, city_slug: str, root: str | Path = DEFAULT_STORE_DIR) -> Path:
+    """Directory of a city's dataset for `layer` ("raw", "daily", ...)."""
+    return Path(root) / layer / f"city={city_slug}"
+
+
+def list_datasets(layer: str, root: str | Path = DEFAULT_STORE_DIR) -> Dict[str, Path]:
+    """Return {city_slug: dataset_dir} for every city stored under `layer`."""
+    base = Path(root) / layer
+    if not base.is_dir():
+        return {}
+    return {
+        p.name.split("=", 1)[1]: p
+        for p in sorted(base.glob("city=*"))
+        if p.is_dir()
+    }
+
+
+def is_csv(path: str | Path) -> bool:
+    return Path(path).suffix.lower() == ".csv"
+
+
+# ---- schema ----------------------------------------------------------------
+
+def schema_for(df: pd.DataFrame, time_col: str, float32: bool = False) -> pa.Schema:
+    """Typed schema: non-null timestamp column first, then one float column per value."""
+    value_type = pa.float32() if float32 else pa.float64()
+    fields = [pa.field(time_col, pa.timestamp("us"), nullable=False)]
+    fields += [pa.field(str(c), value_type) for c in df.columns if c != time_col]
+    return pa.schema(fields)
+
+
+def _to_table(df: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=False)
+
+
+def _write_table_atomic(table: pa.Table, path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    pq.write_table(table, tmp, compression=COMPRESSION)
+    os.replace(tmp, path)
+
+
+# ---- partitioned datasets --------------------------------------------------
+
+def _month_dirs(root: Path) -> Dict[str, Path]:
+    return {
+        p.name.split("=", 1)[1]: p
+        for p in sorted(root.glob("month=*"))
+        if (p / PART_FILE).exists()
+    }
+
+
+def _split_months(df: pd.DataFrame, time_col: str) -> Dict[str, pd.DataFrame]:
+    periods = df[time_col].dt.to_period("M")
+    return {str(per): part for per, part in df.groupby(periods, sort=True)}
+
+
+def _prepare(df: pd.DataFrame, time_col: str) -> pd.DataFrame:
+    """Return df with `time_col` as a sorted datetime column (not the index)."""
+    if time_col not in df.columns and df.index.name == time_col:
+        df = df.reset_index()
+    df = df.copy()
+    df[time_col] = pd.to_datetime(df[time_col])
+    return df.sort_values(time_col, kind="stable")
+
+
+def _write_months(
+    months: Dict[str, pd.DataFrame], root: Path, schema: pa.Schema
+) -> None:
+    for month, part in months.items():
+        _write_table_atomic(_to_table(part, schema), root / f"month={month}" / PART_FILE)
+
+
+def _merge_rows(old: pd.DataFrame, new: pd.DataFrame, time_col: str) -> pd.DataFrame:
+    """
+    `old` with `new`'s rows merged in, sorted by time. Where a timestamp is in
+    both, `new` wins for its own columns; columns only in `old` keep their values.
+    """
+    new = new.drop_duplicates(subset=[time_col], keep="last").set_index(time_col)
+    old = old.drop_duplicates(subset=[time_col], keep="last").set_index(time_col)
+    cols = list(dict.fromkeys([*old.columns, *new.columns]))
+    merged = old.reindex(index=old.index.union(new.index), columns=cols)
+    merged.loc[new.index, list(new.columns)] = new.to_numpy()
+    return merged.rename_axis(time_col).reset_index()
+
+
+def _read_dataset(
+    root: Path,
+    start: pd.Timestamp | None = None,
+    end: pd.Timestamp | None = None,
+    columns: List[str] | None = None,
+) -> pd.DataFrame:
+    months = _month_dirs(root)
+    lo = str(pd.Timestamp(start).to_period("M")) if start is not None else None
+    hi = str(pd.Timestamp(end).to_period("M")) if end is not None else None
+    tables = [
+        pq.read_table(p / PART_FILE, columns=columns)
+        for m, p in months.items()
+        if (lo is None or m >= lo) and (hi is None or m <= hi)
+    ]
+    if not tables:
+        schema_file = root / SCHEMA_FILE
+        if schema_file.exists():
+            return pq.read_table(schema_file, columns=columns).to_pandas()
+        return pd.DataFrame(columns=columns or [])
+    return pa.concat_tables(tables, promote_options="default").to_pandas()
+
+
+# ---- public API ------------------------------------------------------------
+
+def read_frame(
+    src: str | Path | pd.DataFrame,
+    time_col: str,
+    *,
+    start: str | pd.Timestamp | None = None,
+    end: str | pd.Timestamp | None = None,
+) -> pd.DataFrame:
+    """
+    Load a frame indexed by `time_col` (sorted) from a CSV file, a Parquet file,
+    or a month-partitioned Parquet dataset. `start`/`end` (inclusive) prune
+    partitions before reading. A DataFrame is passed through (indexed by
+    `time_col` if it is still a column), so callers can hand over data in memory.
+    """
+    if isinstance(src, pd.DataFrame):
+        df = src.set_index(time_col) if time_col in src.columns else src
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
+        return df.loc[start:end] if start is not None or end is not None else df
+
+    path = Path(src)
+    if is_csv(path):
+        df = pd.read_csv(path, parse_dates=[time_col])
+    elif path.is_dir():
+        df = _read_dataset(path, start, end)
+    else:
+        df = pq.read_table(path).to_pandas()
+    if time_col not in df.columns:
+        df[time_col] = pd.Series(dtype="datetime64[us]")
+    df = df.set_index(time_col).sort_index()
+    if start is not None or end is not None:
+        df = df.loc[start:end]
+    return df
+
+
+def iter_frames(
+    src: str | Path | pd.DataFrame,
+    time_col: str,
+    chunk_rows: int = 100_000,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield the data at `src` in stored order as frames indexed by `time_col`, at
+    most `chunk_rows` rows each, without loading it all: CSV is read in chunks,
+    Parquet in record batches (month partitions in calendar order).
+    """
+    if isinstance(src, pd.DataFrame):
+        df = read_frame(src, time_col)
+        for i in range(0, len(df), chunk_rows):
+            yield df.iloc[i:i + chunk_rows]
+        return
+    path = Path(src)
+    if is_csv(path):
+        for chunk in pd.read_csv(path, parse_dates=[time_col], chunksize=chunk_rows):
+            yield chunk.set_index(time_col)
+        return
+    files = [p / PART_FILE for p in _month_dirs(path).values()] if path.is_dir() else [path]
+    # partitions may predate a column; align every batch to the dataset schema
+    names = pq.read_schema(path / SCHEMA_FILE).names if (path / SCHEMA_FILE).exists() else None
+    for f in files:
+        for batch in pq.ParquetFile(f).iter_batches(batch_size=chunk_rows):
+            df = batch.to_pandas()
+            if names is not None:
+                df = df.reindex(columns=names)
+            yield df.set_index(time_col)
+
+
+def write_frame(
+    df: pd.DataFrame,
+    dst: str | Path,
+    time_col: str,
+    *,
+    float32: bool = False,
+    record_changes: bool = False,
+) -> Path:
+    """
+    Replace the data at `dst` with `df` (time as index or column). A `.csv` path
+    is written as CSV; a `.parquet` path as one file; any other path as a
+    month-partitioned dataset directory with a typed, compressed schema.
+    With `record_changes` the whole span of `df` is added to the change journal.
+    """
+    path = ensure_parent(dst)
+    df = _prepare(df, time_col)
+    if record_changes:
+        _record_span(path, df, time_col, full=True)
+    if is_csv(path):
+        return atomic_write(path, lambda tmp: df.to_csv(tmp, index=False))
+
+    schema = schema_for(df, time_col, float32)
+    if path.suffix.lower() == ".parquet":
+        _write_table_atomic(_to_table(df, schema), path)
+        return path
+
+    path.mkdir(parents=True, exist_ok=True)
+    months = _split_months(df, time_col)
+    _write_months(months, path, schema)
+    _write_table_atomic(schema.empty_table(), path / SCHEMA_FILE)
+    for month, p in _month_dirs(path).items():
+        if month not in months:
+            shutil.rmtree(p, ignore_errors=True)
+    return path
+
+
+def upsert_frame(
+    new: pd.DataFrame,
+    dst: str | Path,
+    time_col: str,
+    *,
+    float32: bool = False,
+    record_changes: bool = False,
+) -> Path:
+    """
+    Merge `new` rows into the data at `dst`; rows with an existing timestamp are
+    replaced. For a partitioned dataset only the months present in `new` are
+    rewritten. For CSV, rows after the stored history are appended in place.
+    Stored columns missing from `new` are kept (as NaN for rows only in `new`).
+    With `record_changes` the span of `new` is added to the change journal.
+    """
+    path = Path(dst)
+    if not path.exists():
+        return write_frame(new, path, time_col, float32=float32, record_changes=record_changes)
+    new = _prepare(new, time_col)
+    if new.empty:
+        return path
+    if record_changes:
+        _record_span(path, new, time_col)
+
+    if is_csv(path) or path.suffix.lower() == ".parquet":
+        existing = read_frame(path, time_col).reset_index()
+        appendable = set(new.columns) <= set(existing.columns)
+        if is_csv(path) and appendable and (existing.empty or new[time_col].min() > existing[time_col].max()):
+            new.reindex(columns=existing.columns).to_csv(path, mode="a", header=existing.empty, index=False)
+            return path
+        return write_frame(_merge_rows(existing, new, time_col), path, time_col, float32=float32)
+
+    schema = schema_for(new, time_col, float32)
+    if (path / SCHEMA_FILE).exists():
+        stored = pq.read_schema(path / SCHEMA_FILE)
+        schema = pa.schema([*stored, *(f for f in schema if f.name not in stored.names)])
+    stored_months = _month_dirs(path)
+    months: Dict[str, pd.DataFrame] = {}
+    for month, part in _split_months(new, time_col).items():
+        if month in stored_months:
+            old = pq.read_table(stored_months[month] / PART_FILE).to_pandas()
+            part = _merge_rows(old, part, time_col)
+        months[month] = part.reindex(columns=schema.names)
+    _write_months(months, path, schema)
+    _write_table_atomic(schema.empty_table(), path / SCHEMA_FILE)
+    log.info(f"Upserted {len(new)} rows into {len(months)} month partition(s) of {path}")
+    return path
+
+
+# ---- change journal --------------------------------------------------------
+
+def changes_path(path: str | Path) -> Path:
+    p = Path(path)
+    if is_csv(p) or p.suffix.lower() == ".parquet":
+        return p.with_name(p.name + ".changes.json")
+    return p / CHANGES_FILE
+
+
+def _merge_spans(spans: List[List[pd.Timestamp]]) -> List[List[pd.Timestamp]]:
+    out: List[List[pd.Timestamp]] = []
+    for lo, hi in sorted(spans):
+        if out and lo <= out[-1][1]:
+            out[-1][1] = max(out[-1][1], hi)
+        else:
+            out.append([lo, hi])
+    if len(out) > MAX_CHANGE_SPANS:
+        out = [[out[0][0], max(hi for _, hi in out)]]
+    return out
+
+
+def read_changes(path: str | Path) -> List[tuple[pd.Timestamp, pd.Timestamp]]:
+    """Recorded (first, last) time spans changed since the journal was last cleared."""
+    jp = changes_path(path)
+    try:
+        raw = json.loads(jp.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    except ValueError:
+        log.warning(f"Unreadable change journal {jp}; treating everything as changed")
+        return [FULL_SPAN]
+    if raw.get("full"):
+        return [FULL_SPAN]
+    return [(pd.Timestamp(lo), pd.Timestamp(hi)) for lo, hi in raw.get("spans", [])]
+
+
+def _write_changes(path: Path, spans: List[List[pd.Timestamp]], full: bool = False) -> None:
+    jp = changes_path(path)
+    if not spans and not full:
+        jp.unlink(missing_ok=True)
+        return
+    jp.parent.mkdir(parents=True, exist_ok=True)
+    body = {"full": full, "spans": [[lo.isoformat(), hi.isoformat()] for lo, hi in spans]}
+    tmp = jp.with_name(f".{jp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(body), encoding="utf-8")
+    os.replace(tmp, jp)
+
+
+def _record_span(path: Path, df: pd.DataFrame, time_col: str, full: bool = False) -> None:
+    if full:
+        # the data was replaced wholesale; every consumer has to start over
+        _write_changes(path, [], full=True)
+        return
+    if df.empty:
+        return
+    current = [list(s) for s in read_changes(path)]
+    if FULL_SPAN in [tuple(c) for c in current]:
+        return
+    current.append([df[time_col].min(), df[time_col].max()])
+    _write_changes(path, _merge_spans(current))
+
+
+def clear_changes(path: str | Path, seen: List[tuple[pd.Timestamp, pd.Timestamp]]) -> None:
+    """
+    Drop the journal after a consumer has handled the spans it read (`seen`).
+    Spans recorded in the meantime are kept.
+    """
+    now = read_changes(path)
+    _write_changes(Path(path), [list(s) for s in now if s not in seen])
+
+
+# ---- fetch log -------------------------------------------------------------
+
+def fetched_path(path: str | Path) -> Path:
+    p = Path(path)
+    if is_csv(p) or p.suffix.lower() == ".parquet":
+        return p.with_name(p.name + ".fetched.json")
+    return p / FETCHED_FILE
+
+
+def read_fetched(path: str | Path) -> List[Tuple[date, date]]:
+    """Day spans (inclusive) recorded as already fetched for the data at `path`."""
+    fp = fetched_path(path)
+    try:
+        raw = json.loads(fp.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return []
+    except ValueError:
+        log.warning(f"Unreadable fetch log {fp}; ignoring it")
+        return []
+    return [(date.fromisoformat(lo), date.fromisoformat(hi)) for lo, hi in raw.get("spans", [])]
+
+
+def record_fetched(path: str | Path, spans: Iterable[Tuple[date, date]], replace: bool = False) -> None:
+    """Add day spans to the fetch log (or, with `replace`, make them the whole log)."""
+    merged: List[List[date]] = []
+    for lo, hi in sorted([*([] if replace else read_fetched(path)), *spans]):
+        if merged and lo <= merged[-1][1] + timedelta(days=1):
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    fp = fetched_path(path)
+    if not merged:
+        fp.unlink(missing_ok=True)
+        return
+    body = {"spans": [[lo.isoformat(), hi.isoformat()] for lo, hi in merged]}
+    atomic_write(fp, lambda tmp: tmp.write_text(json.dumps(body), encoding="utf-8"))
+
+
+def time_bounds(src: str | Path, time_col: str) -> tuple[pd.Timestamp, pd.Timestamp] | None:
+    """(first, last) timestamp stored at `src` without reading all of it, or None if empty."""
+    path = Path(src)
+    if not path.exists():
+        return None
+    if path.is_dir():
+        months = list(_month_dirs(path).values())
+        if not months:
+            return None
+        lo = pq.read_table(months[0] / PART_FILE, columns=[time_col]).column(0)
+        hi = pq.read_table(months[-1] / PART_FILE, columns=[time_col]).column(0)
+        times = [pd.Series(lo.to_pandas()), pd.Series(hi.to_pandas())]
+    elif is_csv(path):
+        times = [pd.read_csv(path, usecols=[time_col], parse_dates=[time_col])[time_col]]
+    else:
+        times = [pq.read_table(path, columns=[time_col]).column(0).to_pandas()]
+    times = [t for t in times if len(t)]
+    if not times:
+        return None
+    return min(t.min() for t in times), max(t.max() for t in times)
+
+
+def signature(src: str | Path) -> tuple:
+    """
+    (name, mtime_ns, size) of every data file stored at `src`; changes whenever
+    the data does, so callers can key caches on it. Empty if nothing is stored.
+    """
+    path = Path(src)
+    if path.is_dir():
+        files = sorted(path.rglob("*.parquet"))
+    else:
+        files = [path] if path.exists() else []
+    out = []
+    for f in files:
+        try:
+            st = f.stat()
+        except FileNotFoundError:  # replaced between listing and stat
+            continue
+        out.append((f.relative_to(path).as_posix() if f != path else f.name, st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+def export_csv(src: str | Path, dst_csv: str | Path, time_col: str) -> Path:
+    """Write the data stored at `src` as a CSV file at `dst_csv`."""
+    df = read_frame(src, time_col)
+    return atomic_write(dst_csv, df.to_csv)
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
+import os
+import threading
 from pathlib import Path
+from typing import Callable
 
 # ---------------------------- logging ----------------------------
 
@@ -23,6 +26,17 @@ def ensure_parent(p: str | Path) -> Path:
     path.parent.mkdir(parents=True, exist_ok=True)
     return path
 
+def atomic_write(p: str | Path, write: Callable[[Path], object]) -> Path:
+    """Call write(tmp) for a temp file next to `p`, then rename it over `p`."""
+    path = ensure_parent(p)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return path
+
 # ------------------------- param mapping -------------------------
 
 # Accept ONLY short names; map to Open-Meteo API names
@@ -1,7 +1,66 @@
 ﻿import argparse
+import numpy as np
 import pandas as pd
 from typing import Optional
 
+def _prepare_rows(df: pd.DataFrame) -> pd.DataFrame:
+    if "date" not in df or "value" not in df:
+        raise ValueError("Input must contain 'date' and 'value'.")
+    df["date"] = pd.to_datetime(df["date"], errors="coerce", utc=False)
+    df = df.dropna(subset=["date", "value"])
+    if "parameter" not in df:
+        df["parameter"] = "value"
+    return df
+
+def _unit_map(counts: pd.Series) -> pd.Series:
+    """Mode per parameter from (parameter, unit) counts; ties go to the smallest unit, as Series.mode() does."""
+    ranked = counts.rename("n").reset_index().sort_values(["parameter", "n", "unit"], ascending=[True, False, True])
+    return ranked.drop_duplicates("parameter").set_index("parameter")["unit"]
+
+def _finish_daily(
+    wide: pd.DataFrame,
+    unit_map: Optional[pd.Series],
+    interpolate: bool,
+    method: str,
+    limit: Optional[int],
+) -> pd.DataFrame:
+    """
+    Daily means as a (day x parameter) matrix -> long format on a continuous
+    calendar per parameter (its first to last day with data), with the unit
+    column and optional interpolation, all without a per-parameter loop.
+    """
+    wide = wide.sort_index(axis=1)
+    days = pd.date_range(wide.index.min(), wide.index.max(), freq="D")
+    wide = wide.reindex(days)
+    values = wide.to_numpy(dtype=float)
+
+    # each parameter only spans its own first..last day with data
+    has = ~np.isnan(values)
+    pos = np.arange(len(days))[:, None]
+    first = np.where(has, pos, len(days)).min(axis=0)
+    last = np.where(has, pos, -1).max(axis=0)
+    in_range = (pos >= first) & (pos <= last)
+
+    if interpolate:
+        # linear and time are the same on a daily calendar
+        filled = wide.interpolate(method="linear", limit=limit, limit_direction="both", axis=0)
+        values = filled.to_numpy(dtype=float)
+
+    # parameter-major order, like a groupby over parameters
+    keep = in_range.T.ravel()
+    params = np.asarray(wide.columns, dtype=object)
+    daily = pd.DataFrame({
+        "date": days.take(np.tile(np.arange(len(days)), len(params))[keep]),
+        "parameter": np.repeat(params, len(days))[keep],
+        "value": values.T.ravel()[keep],
+    })
+
+    if unit_map is not None:
+        daily["unit"] = daily["parameter"].map(unit_map).fillna("")
+    else:
+        daily["unit"] = ""
+    return daily
+
 def daily_mean(
     raw_df: pd.DataFrame,
     interpolate: bool = False,
@@ -14,51 +73,50 @@ def daily_mean(
       - multi-parameter long format (date,parameter,value[,unit])
     Returns long format: date, parameter, value, unit
     """
-    df = raw_df.copy()
-    if "date" not in df or "value" not in df:
-        raise ValueError("Input must contain 'date' and 'value'.")
-    df["date"] = pd.to_datetime(df["date"], errors="coerce", utc=False)
-    df = df.dropna(subset=["date", "value"]).sort_values(["date"] + (["parameter"] if "parameter" in df else []))
+    df = _prepare_rows(raw_df.copy())
     if df.empty:
         return pd.DataFrame(columns=["date","parameter","value","unit"])
 
-    if "parameter" not in df:
-        df["parameter"] = "value"
-
-    # daily mean per parameter
-    daily = (
-        df.set_index("date")
-          .groupby("parameter")["value"]
-          .resample("D").mean()
-          .reset_index()
-    )
+    # one aggregation over all (day, parameter) cells, pivoted to a day x parameter matrix
+    day = df["date"].dt.floor("D").rename("date")
+    wide = df.groupby([day, "parameter"])["value"].mean().unstack("parameter")
 
-    # build continuous calendar per parameter
-    out = []
-    for p, g in daily.groupby("parameter", as_index=False):
-        g = g.set_index("date")
-        idx = pd.date_range(g.index.min().floor("D"), g.index.max().ceil("D"), freq="D")
-        g = g.reindex(idx).rename_axis("date").reset_index()
-        g["parameter"] = p
-        out.append(g)
-    daily = pd.concat(out, ignore_index=True)
-
-    # unit column (mode per parameter if present)
+    unit_map = None
     if "unit" in df and not df["unit"].dropna().empty:
-        unit_map = df.groupby("parameter")["unit"].agg(lambda s: s.mode().iloc[0] if not s.mode().empty else "")
-        daily["unit"] = daily["parameter"].map(unit_map).fillna("")
-    else:
-        daily["unit"] = ""
+        unit_map = _unit_map(df.groupby(["parameter", "unit"]).size())
+    return _finish_daily(wide, unit_map, interpolate, method, limit)
 
-    if interpolate:
-        daily["value"] = daily.groupby("parameter", group_keys=False)["value"].apply(
-            lambda s: s.interpolate(
-                method=method if method in ("linear","time") else "linear",
-                limit=limit,
-                limit_direction="both"
-            )
-        )
-    return daily
+def daily_mean_chunked(
+    path: str,
+    chunksize: int = 500_000,
+    interpolate: bool = False,
+    method: str = "linear",
+    limit: Optional[int] = None,
+) -> pd.DataFrame:
+    """
+    Same result as `daily_mean(pd.read_csv(path), ...)`, but the CSV is read
+    `chunksize` rows at a time and only per-(parameter, day) sums/counts and
+    per-(parameter, unit) counts are kept, so memory follows the output size
+    rather than the input size.
+    """
+    sums: Optional[pd.DataFrame] = None
+    units: Optional[pd.Series] = None
+    for chunk in pd.read_csv(path, chunksize=chunksize):
+        df = _prepare_rows(chunk)
+        if df.empty:
+            continue
+        day = df["date"].dt.floor("D").rename("date")
+        part = df.groupby(["parameter", day])["value"].agg(["sum", "count"])
+        sums = part if sums is None else sums.add(part, fill_value=0)
+        if "unit" in df:
+            u = df.groupby(["parameter", "unit"]).size()
+            units = u if units is None else units.add(u, fill_value=0)
+    if sums is None:
+        return pd.DataFrame(columns=["date","parameter","value","unit"])
+
+    wide = (sums["sum"] / sums["count"]).unstack("parameter")
+    unit_map = _unit_map(units) if units is not None and not units.empty else None
+    return _finish_daily(wide, unit_map, interpolate, method, limit)
 
 def main():
     ap = argparse.ArgumentParser(description="Daily mean with continuous calendar (supports multiple pollutants).")
@@ -67,10 +125,15 @@ def main():
     ap.add_argument("--interpolate", action="store_true")
     ap.add_argument("--interp_method", default="linear")
     ap.add_argument("--interp_limit", type=int, default=None)
+    ap.add_argument("--chunksize", type=int, default=None,
+                    help="Stream the input this many rows at a time (for files larger than memory)")
     args = ap.parse_args()
 
-    raw = pd.read_csv(args.inp)
-    daily = daily_mean(raw, args.interpolate, args.interp_method, args.interp_limit)
+    if args.chunksize:
+        daily = daily_mean_chunked(args.inp, args.chunksize, args.interpolate, args.interp_method, args.interp_limit)
+    else:
+        raw = pd.read_csv(args.inp)
+        daily = daily_mean(raw, args.interpolate, args.interp_method, args.interp_limit)
     daily.to_csv(args.out, index=False)
     print(f"Saved daily mean: {args.out} | rows={len(daily)} | params={daily['parameter'].nunique()} | interpolate={args.interpolate}")
 
@@ -5,15 +5,34 @@ from __future__ import annotations
 import streamlit as st
 st.set_page_config(page_title="Air Quality Dashboard", layout="wide")
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple
 import numpy as np
 import pandas as pd
+import threading
 import traceback
 
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from aq_pipeline import aqi, downsample, nowcast, rollup, storage
+from aq_pipeline.rangestats import RangeStats
+
+# Cached results are keyed by storage.signature() of the files behind them, so a
+# rerun after a widget change reuses them and a pipeline run invalidates them.
+# Entries for old signatures age out of the bounded caches.
+CACHE_ENTRIES = 256
+LOAD_WORKERS = 8
+
 # ============================ File discovery & loading ============================
-def find_processed_files(processed_dir: str | Path = "data/processed") -> Dict[str, Path]:
-    """Return {city_slug: latest_processed_csv_path} by picking newest file per city."""
+def find_processed_files(
+    processed_dir: str | Path = "data/processed",
+    store_dir: str | Path = storage.DEFAULT_STORE_DIR,
+) -> Dict[str, Path]:
+    """
+    Return {city_slug: daily data path}. Cities in the Parquet store win;
+    otherwise the newest exported/legacy CSV per city is used.
+    """
     processed = Path(processed_dir)
     processed.mkdir(parents=True, exist_ok=True)
     files = sorted(processed.glob("*_daily*.csv"))
@@ -24,27 +43,33 @@ def find_processed_files(processed_dir: str | Path = "data/processed") -> Dict[s
         city = stem.split("_daily")[0]
         if city not in latest or p.stat().st_mtime > latest[city].stat().st_mtime:
             latest[city] = p
+    latest.update(storage.list_datasets("daily", store_dir))
     return latest
 
-def load_daily_df(csv_path: Path) -> pd.DataFrame:
-    df = pd.read_csv(csv_path, parse_dates=["date"]).set_index("date").sort_index()
-    return df
+def _dir_stamp(*dirs: Path) -> tuple:
+    """mtimes of `dirs`; a directory's mtime changes when entries are added or removed."""
+    return tuple(d.stat().st_mtime_ns if d.is_dir() else None for d in map(Path, dirs))
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _discover(processed_dir: str, store_dir: str, stamp: tuple) -> tuple[Dict[str, Path], Dict[str, Path]]:
+    return find_processed_files(processed_dir, store_dir), storage.list_datasets("raw", store_dir)
+
+def discover(
+    processed_dir: str | Path = "data/processed",
+    store_dir: str | Path = storage.DEFAULT_STORE_DIR,
+) -> tuple[Dict[str, Path], Dict[str, Path]]:
+    """({city: daily data path}, {city: raw dataset}), re-listed only when the directories change."""
+    store = Path(store_dir)
+    stamp = _dir_stamp(Path(processed_dir), store / "daily", store / "raw")
+    return _discover(str(processed_dir), str(store_dir), stamp)
+
+def load_daily_df(path: Path) -> pd.DataFrame:
+    return storage.read_frame(path, "date")
 
 # ============================ Helpers ============================
-def kpi_summary(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
-    out = []
-    for c in cols:
-        if c in df.columns:
-            s = df[c].dropna()
-            out.append(
-                dict(
-                    pollutant=c,
-                    mean=np.round(s.mean(), 2) if not s.empty else np.nan,
-                    p95=np.round(s.quantile(0.95), 2) if not s.empty else np.nan,
-                    max=np.round(s.max(), 2) if not s.empty else np.nan,
-                )
-            )
-    return pd.DataFrame(out)
+def kpi_summary(index: RangeStats, start: pd.Timestamp, end: pd.Timestamp, cols: List[str]) -> pd.DataFrame:
+    """Mean, p95 and max per pollutant over [start, end], answered from the range index."""
+    return index.summary(start, end, cols).drop(columns="count").round(2)
 
 def get_global_bounds(city_data: dict[str, pd.DataFrame]) -> tuple[pd.Timestamp, pd.Timestamp]:
     """Return the min/max date across all selected cities' data."""
@@ -58,80 +83,74 @@ def get_global_bounds(city_data: dict[str, pd.DataFrame]) -> tuple[pd.Timestamp,
         return today, today
     return min(mins), max(maxs)
 
-# ============================ AQI (US EPA, PM-only) ============================
-PM25_BP = [
-    (0.0, 12.0, 0, 50),
-    (12.1, 35.4, 51, 100),
-    (35.5, 55.4, 101, 150),
-    (55.5, 150.4, 151, 200),
-    (150.5, 250.4, 201, 300),
-    (250.5, 350.4, 301, 400),
-    (350.5, 500.4, 401, 500),
-]
-PM10_BP = [
-    (0, 54, 0, 50),
-    (55, 154, 51, 100),
-    (155, 254, 101, 150),
-    (255, 354, 151, 200),
-    (355, 424, 201, 300),
-    (425, 504, 301, 400),
-    (505, 604, 401, 500),
-]
-
-def _to_scalar(x):
-    """Coerce pandas/NumPy scalars/Series to a float or np.nan (never a Series)."""
-    if x is None:
-        return np.nan
-    if isinstance(x, (list, tuple)) and len(x) > 0:
-        x = x[0]
-    if isinstance(x, (pd.Series, pd.Index, np.ndarray)):
-        arr = np.asarray(x).ravel()
-        return float(arr[0]) if arr.size >= 1 else np.nan
-    try:
-        return float(x)
-    except Exception:
-        return np.nan
-
-def _aqi_from_breakpoints(c, bps):
-    c = _to_scalar(c)
-    if np.isnan(c):
-        return None
-    for c_low, c_high, i_low, i_high in bps:
-        if c_low <= c <= c_high:
-            return (i_high - i_low) / (c_high - c_low) * (c - c_low) + i_low
-    return None
-
-def pm_aqi_row(pm25, pm10):
-    aqi25 = _aqi_from_breakpoints(pm25, PM25_BP)
-    aqi10 = _aqi_from_breakpoints(pm10, PM10_BP)
-    vals = [v for v in (aqi25, aqi10) if v is not None]
-    return max(vals) if vals else None
-
-def add_pm_aqi(df: pd.DataFrame) -> pd.DataFrame:
-    """Adds 'AQI_PM' column using PM2.5/PM10 if present."""
+# ============================ AQI (US EPA) ============================
+def add_aqi(df: pd.DataFrame, hourly: pd.DataFrame | None = None) -> pd.DataFrame:
+    """
+    Adds 'AQI_PM' (PM2.5/PM10 only), the overall 'AQI' and its dominant pollutant
+    ('AQI_dominant'). With hourly data NO2/CO use their proper averaging periods;
+    otherwise the daily means are used as an approximation.
+    """
     out = df.copy()
-    s25 = out["pm2_5"] if "pm2_5" in out.columns else pd.Series(np.nan, index=out.index)
-    s10 = out["pm10"]  if "pm10"  in out.columns else pd.Series(np.nan, index=out.index)
-    out["AQI_PM"] = [pm_aqi_row(s25.iloc[i], s10.iloc[i]) for i in range(len(out))]
+    out["AQI_PM"] = aqi.aqi_frame(df, ["pm2_5", "pm10"])["AQI"]
+    inputs = aqi.daily_inputs(hourly).reindex(df.index) if hourly is not None else df
+    full = aqi.aqi_frame(inputs)
+    out["AQI"] = full["AQI"]
+    out["AQI_dominant"] = full["dominant"]
     return out
 
-def aqi_label(aqi: float | None) -> str:
-    if aqi is None or (isinstance(aqi, float) and np.isnan(aqi)):
-        return "N/A"
-    if aqi <= 50:  return "Good"
-    if aqi <= 100: return "Moderate"
-    if aqi <= 150: return "Unhealthy for Sensitive"
-    if aqi <= 200: return "Unhealthy"
-    if aqi <= 300: return "Very Unhealthy"
-    return "Hazardous"
+def aqi_label(value: float | None) -> str:
+    return str(aqi.category(np.nan if value is None else value))
+
+def nowcast_rows(hourly: pd.DataFrame) -> pd.DataFrame:
+    """The hourly AQI rows nowcast.latest() can pick from now on: the current one and later ones."""
+    valid = nowcast.hourly_aqi(hourly).dropna(subset=["AQI"])
+    now = pd.Timestamp.now("UTC").tz_localize(None)
+    return pd.concat([valid.loc[:now].tail(1), valid.loc[valid.index > now]])
+
+# ============================ Cached loading ============================
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _load_city(daily_path: Path, daily_sig: tuple, raw_path: Path | None, raw_sig: tuple) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    df = load_daily_df(daily_path)
+    hourly = storage.read_frame(raw_path, "time") if raw_path is not None else None
+    now = nowcast_rows(hourly) if hourly is not None else None
+    return add_aqi(df, hourly), now
+
+def load_city(daily_path: Path, raw_path: Path | None) -> tuple[pd.DataFrame, pd.DataFrame | None]:
+    """Daily frame with AQI columns and the NowCast rows, cached until either dataset changes."""
+    raw_sig = storage.signature(raw_path) if raw_path is not None else ()
+    return _load_city(daily_path, storage.signature(daily_path), raw_path, raw_sig)
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _kpi_index(daily_path: Path, daily_sig: tuple, _df: pd.DataFrame) -> RangeStats:
+    return RangeStats(_df)
+
+def kpi_index(daily_path: Path, df: pd.DataFrame) -> RangeStats:
+    """Range index over a city's daily frame, built once per version of its data (shared, read-only)."""
+    return _kpi_index(daily_path, storage.signature(daily_path), df)
+
+def load_cities(cities: List[str], files: Dict[str, Path], raw_files: Dict[str, Path]) -> Dict[str, object]:
+    """{city: load_city(...) result, or the exception it raised}, loaded on a thread pool."""
+    ctx = get_script_run_ctx()
+
+    def one(city: str):
+        add_script_run_ctx(threading.current_thread(), ctx)  # lets the worker use st.cache_data
+        try:
+            return load_city(files[city], raw_files.get(city))
+        except Exception as e:
+            return e
+
+    if not cities:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(LOAD_WORKERS, len(cities)), thread_name_prefix="load") as pool:
+        return dict(zip(cities, pool.map(one, cities)))
 
 # ============================ UI ============================
 st.title("🌍 Air Quality — Multi-City Dashboard")
 st.caption("Data source: Open-Meteo Air Quality API · Daily means from your pipeline")
 
-files = find_processed_files()
+files, raw_files = discover()
 if not files:
-    st.warning("No processed files found in `data/processed/`.\n\n"
+    st.warning("No processed data found in `data/store/daily/` or `data/processed/`.\n\n"
                "Run: `python run_pipeline.py --city milan --past-days 10 --timestamp`")
     st.stop()
 
@@ -145,20 +164,24 @@ sel_pollutants = st.sidebar.multiselect("Pollutants to display", options=all_pol
 
 # Load data per city + compute global bounds
 city_data: Dict[str, pd.DataFrame] = {}
+city_now: Dict[str, pd.Series] = {}
 date_min = None
 date_max = None
-for city in sel_cities:
-    try:
-        df = load_daily_df(files[city])
-        df = add_pm_aqi(df)
-        city_data[city] = df
-        if not df.empty:
-            dmin, dmax = df.index.min(), df.index.max()
-            date_min = dmin if date_min is None else min(date_min, dmin)
-            date_max = dmax if date_max is None else max(date_max, dmax)
-    except Exception as e:
+for city, loaded in load_cities(sel_cities, files, raw_files).items():
+    if isinstance(loaded, Exception):
         with st.expander(f"⚠️ Failed to load {city}"):
-            st.exception(e)
+            st.exception(loaded)
+        continue
+    df, now_rows = loaded
+    if now_rows is not None:
+        now = nowcast.latest(now_rows)
+        if now is not None:
+            city_now[city] = now
+    city_data[city] = df
+    if not df.empty:
+        dmin, dmax = df.index.min(), df.index.max()
+        date_min = dmin if date_min is None else min(date_min, dmin)
+        date_max = dmax if date_max is None else max(date_max, dmax)
 
 if date_min is None:
     st.warning("Selected cities have no data.")
@@ -184,24 +207,69 @@ if auto_clamp:
     end_ts   = min(end_ts,   global_max)
 
 st.sidebar.caption(f"Available data across selected cities: **{global_min.date()} → {global_max.date()}**")
+# match the pipeline's cleaning (run_pipeline.py --no-interpolate) when charts read hourly data
+interpolate_hourly = st.sidebar.checkbox("Interpolate gaps in hourly data", value=True)
 
 # Tabs
-tab1, tab2, tab3 = st.tabs(["📈 Time Series", "📊 KPIs", "🧪 AQI (PM-based)"])
+tab1, tab2, tab3 = st.tabs(["📈 Time Series", "📊 KPIs", "🧪 AQI"])
 
 # ---- Tab 1: Time Series
+CHART_WIDTH_PX = 750  # typical rendered width of a line chart
+CHART_DOWNSAMPLE = "minmax"  # keeps the peaks visible
+MAX_CHART_POINTS = downsample.points_for_width(CHART_WIDTH_PX, CHART_DOWNSAMPLE)
+
+def series_for_range(
+    city: str, start: pd.Timestamp, end: pd.Timestamp, interpolate: bool = True
+) -> tuple[pd.DataFrame, str]:
+    """Means for a city over [start, end] at the finest rollup level that fits the chart."""
+    levels = rollup.available_levels(city)
+    if not levels:
+        return city_data[city].loc[start:end], "daily"
+    level = rollup.pick_level(start, end, max_points=MAX_CHART_POINTS, levels=levels)
+    return level_means(city, level, start, end, interpolate), level
+
+@st.cache_data(max_entries=CACHE_ENTRIES, show_spinner=False)
+def _level_means(city: str, level: str, sig: tuple, start=None, end=None, interpolate=True) -> pd.DataFrame:
+    return rollup.select(rollup.load_level(city, level, start, end, interpolate=interpolate), "mean")
+
+def level_means(
+    city: str, level: str, start: pd.Timestamp, end: pd.Timestamp, interpolate: bool = True
+) -> pd.DataFrame:
+    """
+    Rollup means for [start, end]. Stored levels are cached whole and sliced, so
+    moving the date range does not re-read them; hourly values are cached per range.
+    """
+    if level == "hourly":
+        return _level_means(city, level, storage.signature(storage.dataset_path("raw", city)), start, end, interpolate)
+    frame = _level_means(city, level, storage.signature(storage.dataset_path(rollup.layer(level), city)))
+    first = max(frame.index.searchsorted(start, side="right") - 1, 0)  # the bucket holding `start`
+    return frame.iloc[first:].loc[:end]
+
 with tab1:
-    st.subheader("Daily Means")
+    city_series: Dict[str, pd.DataFrame] = {}
+    levels_used = set()
+    for city in sel_cities:
+        if city not in city_data:
+            continue
+        try:
+            city_series[city], lvl = series_for_range(
+                city, start_ts, end_ts + pd.Timedelta(days=1) - pd.Timedelta(hours=1), interpolate_hourly
+            )
+            levels_used.add(lvl)
+        except Exception as e:
+            with st.expander(f"⚠️ {city} rollup failed"):
+                st.exception(e)
+    st.subheader(f"{' / '.join(sorted(levels_used)).title() or 'Daily'} Means")
     for p in sel_pollutants:
         try:
             st.markdown(f"**{p}**")
             df_plot = pd.DataFrame(
-                {city: city_data[city].loc[start_ts:end_ts][p]
-                 for city in sel_cities if p in city_data[city].columns}
+                {city: df[p] for city, df in city_series.items() if p in df.columns}
             )
             if df_plot.empty:
                 st.info(f"No data for **{p}** in the selected range.")
             else:
-                st.line_chart(df_plot)
+                st.line_chart(downsample.downsample_frame(df_plot, MAX_CHART_POINTS, CHART_DOWNSAMPLE))
         except Exception as e:
             with st.expander(f"⚠️ {p} plot failed"):
                 st.exception(e)
@@ -215,10 +283,10 @@ with tab2:
         for city in sel_cities:
             if city not in city_data:
                 continue
-            df = city_data[city].loc[start_ts:end_ts]
-            if df.empty:
+            index = kpi_index(files[city], city_data[city])
+            if index.rows(start_ts, end_ts) == 0:
                 continue
-            kpi_frames.append(kpi_summary(df, sel_pollutants).assign(city=city))
+            kpi_frames.append(kpi_summary(index, start_ts, end_ts, sel_pollutants).assign(city=city))
         if kpi_frames:
             kpis = pd.concat(kpi_frames, ignore_index=True)
             st.dataframe(kpis, use_container_width=True)
@@ -229,26 +297,39 @@ with tab2:
             st.exception(e)
             st.text(traceback.format_exc())
 
-# ---- Tab 3: AQI (PM-only)
+# ---- Tab 3: AQI
 with tab3:
     try:
-        st.subheader("Overall AQI (PM₂.₅ / PM₁₀)")
-        st.caption("Calculated using US EPA breakpoints (µg/m³). NO₂/CO not included in AQI here.")
+        st.subheader("Overall AQI")
+        st.caption("US EPA breakpoints. PM₂.₅/PM₁₀ use 24-hour means, NO₂ the daily max 1-hour and "
+                   "CO the daily max 8-hour mean (when hourly data is available). "
+                   "NowCast is the current hourly AQI.")
         aqi_df = pd.DataFrame(
-            {city: city_data[city].loc[start_ts:end_ts]["AQI_PM"]
-             for city in sel_cities if "AQI_PM" in city_data[city].columns}
+            {city: city_data[city].loc[start_ts:end_ts]["AQI"]
+             for city in sel_cities if city in city_data}
         )
-        if aqi_df.empty:
+        if aqi_df.dropna(how="all").empty:
             st.info("No AQI values in the selected range.")
         else:
-            st.line_chart(aqi_df)
+            st.line_chart(downsample.downsample_frame(aqi_df, MAX_CHART_POINTS, CHART_DOWNSAMPLE))
             st.markdown("**Latest AQI (by city)**")
             latest = []
             for city in sel_cities:
-                ser = city_data[city].loc[start_ts:end_ts]["AQI_PM"].dropna()
-                val = float(ser.iloc[-1]) if not ser.empty else np.nan
-                latest.append(dict(city=city, AQI_PM=np.round(val, 1), Category=aqi_label(val)))
-                st.dataframe(pd.DataFrame(latest), use_container_width=True)
+                if city not in city_data:
+                    continue
+                sub = city_data[city].loc[start_ts:end_ts].dropna(subset=["AQI"])
+                val = float(sub["AQI"].iloc[-1]) if not sub.empty else np.nan
+                pm = float(sub["AQI_PM"].iloc[-1]) if not sub.empty else np.nan
+                latest.append(dict(
+                    city=city,
+                    AQI=np.round(val, 1),
+                    AQI_PM=np.round(pm, 1),
+                    Dominant=sub["AQI_dominant"].iloc[-1] if not sub.empty else None,
+                    Category=aqi_label(val),
+                    NowCast=np.round(city_now[city]["AQI"], 1) if city in city_now else np.nan,
+                    NowCast_at=city_now[city].name if city in city_now else None,
+                ))
+            st.dataframe(pd.DataFrame(latest), use_container_width=True)
     except Exception as e:
         with st.expander("⚠️ AQI section failed"):
             st.exception(e)
@@ -1,38 +1,136 @@
-﻿import argparse, time, requests, pandas as pd
+﻿import argparse, asyncio, pandas as pd
 from config import SETTINGS
+from aq_pipeline import aio
+from aq_pipeline.http_client import TokenBucket
 
-def fetch_once(params):
-    r = requests.get(SETTINGS.base_url, params=params, timeout=SETTINGS.timeout)
+async def fetch_once(client, params, budget=None):
+    """One page of results (a list of records); `budget` is a TokenBucket shared by all pages."""
+    if budget is not None:
+        await aio.acquire(budget)
+    r = await client.get(SETTINGS.base_url, params=params, timeout=SETTINGS.timeout)
     if r.status_code >= 400:
         raise RuntimeError(f"HTTP {r.status_code} | params={params} | msg={r.text[:300]}")
-    data = r.json().get("results", [])
-    return pd.json_normalize(data, sep=".") if data else pd.DataFrame()
+    return r.json().get("results", [])
 
-def fetch_all(city, parameter, limit=1000, pages=5, sleep=0.3):
-    variants = [
+def flatten(rec, prefix=""):
+    """Nested dict -> {"a.b": value}, like pd.json_normalize(sep=".")."""
+    out = {}
+    for k, v in rec.items():
+        if isinstance(v, dict):
+            out.update(flatten(v, f"{prefix}{k}."))
+        else:
+            out[f"{prefix}{k}"] = v
+    return out
+
+class FrameBuilder:
+    """Columns of flattened records, appended page by page; one DataFrame at the end."""
+
+    def __init__(self):
+        self.columns = {}
+        self.rows = 0
+
+    def add(self, records):
+        for rec in records:
+            flat = flatten(rec)
+            for k in flat.keys() - self.columns.keys():
+                self.columns[k] = [None] * self.rows
+            for k, col in self.columns.items():
+                col.append(flat.get(k))
+            self.rows += 1
+
+    def frame(self):
+        return pd.DataFrame(self.columns) if self.rows else pd.DataFrame()
+
+def query_variants(city, parameter, limit):
+    """Queries to try, from the most to the least specific."""
+    return [
         {"city": city, "parameter": parameter, "limit": limit},
         {"city": city, "parameter": parameter, "limit": limit, "country": "IT"},
         {"city": "Milano", "parameter": parameter, "limit": limit, "country": "IT"},
         {"parameter": parameter, "limit": limit, "country": "IT"},
     ]
-    frames = []
-    for v in variants:
-        for p in range(1, pages + 1):
-            q = dict(v, page=p)
-            try:
-                df = fetch_once(q)
-            except Exception as e:
-                if p == 1:
-                    break
+
+async def _first_page(client, variant, budget):
+    return variant, await fetch_once(client, dict(variant, page=1), budget)
+
+async def _cancel(tasks):
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+async def paginate(client, variant, builder, pages, budget=None, max_in_flight=4):
+    """
+    Fetch pages 2..`pages` of `variant` into `builder`, up to `max_in_flight` at a
+    time. The first empty page ends the walk: later pages are cancelled or dropped.
+    Pages reach the builder in order, as soon as every earlier one has arrived.
+    """
+    stop = pages + 1          # first page known to be empty
+    nxt = 2                   # next page to request
+    flush = 2                 # next page to hand to the builder
+    arrived = {}
+    pending = {}
+    try:
+        while pending or nxt < stop:
+            while nxt < stop and len(pending) < max(1, max_in_flight):
+                task = asyncio.create_task(fetch_once(client, dict(variant, page=nxt), budget))
+                pending[task] = nxt
+                nxt += 1
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            pages_done = {pending.pop(t): t for t in done}
+            for page, t in sorted(pages_done.items()):
+                if page >= stop:
+                    continue
+                records = t.result()  # an error past page 1 fails the fetch, as a page-1 error fails the variant
+                if not records:
+                    stop = page
                 else:
-                    raise
-            if df.empty:
-                break
-            frames.append(df)
-            time.sleep(sleep)
-        if frames:
-            break
-    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+                    arrived[page] = records
+            late = [t for t, page in pending.items() if page > stop]
+            for t in late:
+                del pending[t]
+            await _cancel(late)
+            while flush < stop and flush in arrived:
+                builder.add(arrived.pop(flush))
+                flush += 1
+    finally:
+        await _cancel(list(pending))
+
+async def fetch_all_async(city, parameter, limit=1000, pages=5, sleep=0.3, client=None, max_in_flight=4):
+    """
+    All pages of the most specific query variant that returns data. Every
+    variant's first page is requested at once; once one has data, only the more
+    specific variants still in flight are awaited, and the less specific ones are
+    cancelled. Page requests share a rate budget of one per `sleep` seconds
+    (on average) and up to `max_in_flight` of them run at once.
+    `client` is an aio.AsyncHttpClient (or a new one).
+    """
+    budget = TokenBucket(1.0 / sleep) if sleep > 0 else None
+    builder = FrameBuilder()
+    async with aio.using(client) as client:
+        tasks = [asyncio.create_task(_first_page(client, v, budget)) for v in query_variants(city, parameter, limit)]
+        rank = {t: i for i, t in enumerate(tasks)}
+        found = {}                # rank -> (variant, records) of variants with data
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None and t.result()[1]:
+                        found[rank[t]] = t.result()
+                if found:
+                    late = [t for t in pending if rank[t] > min(found)]
+                    pending.difference_update(late)
+                    await _cancel(late)
+        finally:
+            await _cancel(tasks)
+        if found:
+            winner, records = found[min(found)]
+            builder.add(records)
+            await paginate(client, winner, builder, pages, budget, max_in_flight)
+    return builder.frame()
+
+def fetch_all(city, parameter, limit=1000, pages=5, sleep=0.3, max_in_flight=4):
+    return aio.run(fetch_all_async(city, parameter, limit, pages, sleep, max_in_flight=max_in_flight))
 
 def simplify(df):
     keep = {
@@ -57,10 +155,11 @@ if __name__ == "__main__":
     ap.add_argument("--parameter", default=SETTINGS.default_parameter)
     ap.add_argument("--limit", type=int, default=SETTINGS.default_limit)
     ap.add_argument("--pages", type=int, default=5)
+    ap.add_argument("--max-in-flight", type=int, default=4, help="page requests in flight at once")
     ap.add_argument("--out", required=True)
     args = ap.parse_args()
 
-    df = fetch_all(args.city, args.parameter, args.limit, args.pages)
+    df = fetch_all(args.city, args.parameter, args.limit, args.pages, max_in_flight=args.max_in_flight)
     if df.empty:
         raise SystemExit(
             "No data returned after trying multiple query variants. "
@@ -1,6 +1,6 @@
 ﻿import argparse
-import requests
 import pandas as pd
+from aq_pipeline.http_client import get_client
 
 BASE = "https://air-quality-api.open-meteo.com/v1/air-quality"
 
@@ -25,7 +25,7 @@ def fetch_hourly_multi(lat, lon, parameters, date_from=None, date_to=None):
     if date_from: params["start_date"] = date_from
     if date_to:   params["end_date"]   = date_to
 
-    r = requests.get(BASE, params=params, timeout=30)
+    r = get_client().get(BASE, params=params, timeout=30)
     r.raise_for_status()
     j = r.json()
     hours = j.get("hourly", {})
@@ -1,8 +1,9 @@
-﻿import argparse, requests, pandas as pd
+﻿import argparse, pandas as pd
+from aq_pipeline.http_client import get_client
 BASE = "https://api.openaq.org/v2"
 
 def get(endpoint, **params):
-    r = requests.get(f"{BASE}/{endpoint}", params=params, timeout=30)
+    r = get_client().get(f"{BASE}/{endpoint}", params=params, timeout=30)
     r.raise_for_status()
     return r.json().get("results", [])
 
@@ -5,6 +5,10 @@ import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import sys
 
+from aq_pipeline.downsample import METHODS, downsample_frame, points_for_width
+
+FIG_WIDTH = 9  # inches
+
 
 def _format_date_axis(ax):
     loc = mdates.AutoDateLocator()
@@ -12,10 +16,17 @@ def _format_date_axis(ax):
     ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(loc))
 
 
-def _save_line_plot(df, title, y_label, out_path, dpi=150):
+def _thin(g, dpi, method):
+    """Rows of one parameter's series worth drawing at the figure's pixel width."""
+    n = points_for_width(FIG_WIDTH * dpi, method)
+    return downsample_frame(g.set_index("date")[["value"]], n, method).reset_index()
+
+
+def _save_line_plot(df, title, y_label, out_path, dpi=150, method="lttb"):
     print(f"[plot] saving: {out_path}")
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    plt.figure(figsize=(9, 5))
+    df = _thin(df, dpi, method)
+    plt.figure(figsize=(FIG_WIDTH, 5))
     plt.plot(df["date"], df["value"])
     _format_date_axis(plt.gca())
     plt.title(title)
@@ -38,6 +49,8 @@ if __name__ == "__main__":
     ap.add_argument("--separate_dir", default=None,
                     help="Folder to save per-pollutant PNGs (one file per parameter). If omitted, only combined is saved.")
     ap.add_argument("--dpi", type=int, default=150)
+    ap.add_argument("--downsample", choices=METHODS, default="lttb",
+                    help="Decimation for series longer than the figure is wide (default: lttb).")
     args = ap.parse_args()
 
     print(f"[start] quick_plot.py")
@@ -70,11 +83,12 @@ if __name__ == "__main__":
     # ---- combined plot
     print("[combined] plotting…")
     Path(args.out_combined).parent.mkdir(parents=True, exist_ok=True)
-    plt.figure(figsize=(9, 5))
+    plt.figure(figsize=(FIG_WIDTH, 5))
     for p, g in df.groupby("parameter"):
         if g.empty:
             print(f"[warn] parameter {p} has no data, skipping.")
             continue
+        g = _thin(g, args.dpi, args.downsample)
         plt.plot(g["date"], g["value"], label=p.upper())
 
     _format_date_axis(plt.gca())
@@ -106,6 +120,7 @@ if __name__ == "__main__":
                 y_label=unit if unit else "Value",
                 out_path=out_path,
                 dpi=args.dpi,
+                method=args.downsample,
             )
 
     # ---- report
@@ -0,0 +1,141 @@
+# tests/test_aio.py
+import asyncio
+import threading
+import time
+
+import pandas as pd
+import requests
+
+import fetch_openaq
+from aq_pipeline import aio, fetch
+from aq_pipeline.aio import AsyncHttpClient
+
+
+class _Resp:
+    def __init__(self, status, body=b"{}", headers=None):
+        self.status_code = status
+        self.content = body
+        self.headers = headers or {}
+        self.url = "https://example.org/x"
+
+    def close(self):
+        pass
+
+
+class _Session:
+    """Blocking fake session that records how many calls overlap."""
+
+    def __init__(self, outcomes=(), delay=0.0):
+        self.outcomes = list(outcomes)
+        self.delay = delay
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, params=None, timeout=None):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            out = self.outcomes.pop(0) if self.outcomes else _Resp(200)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+
+def _client(session, **kw):
+    kw = {"rate_per_sec": 1000, "burst": 1000, "backoff_base": 0.01, **kw}
+    return AsyncHttpClient(backend="thread", session=session, **kw)
+
+
+def test_async_client_retries_and_respects_host_limit():
+    session = _Session([requests.ConnectionError("reset"), _Resp(503, headers={"Retry-After": "0"})], delay=0.02)
+
+    async def main():
+        async with _client(session, per_host=3) as client:
+            first = await client.get("https://example.org/x")
+            rest = await asyncio.gather(*(client.get("https://example.org/x") for _ in range(12)))
+        return first, rest
+
+    first, rest = aio.run(main())
+    assert first.status_code == 200
+    assert all(r.status_code == 200 for r in rest)
+    assert session.calls == 3 + 12
+    assert 1 < session.peak <= 3
+
+
+def test_fetch_openmeteo_many_writes_each_point(tmp_path, monkeypatch):
+    async def fake(client, *, lat, lon, hourly_params, start_date=None, end_date=None, sizer=None, **kw):
+        if lat < 0:
+            raise requests.HTTPError("boom")
+        await asyncio.sleep(0)
+        times = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq="h")
+        hourly = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+        hourly.update({p: [lat] * len(times) for p in hourly_params})
+        return {"hourly": hourly}
+
+    monkeypatch.setattr(fetch, "_request_window", fake)
+    locations = {"a": (1.0, 1.0), "b": (2.0, 2.0), "bad": (-1.0, 0.0)}
+    paths, errors = fetch.fetch_openmeteo_many(
+        locations=locations, parameters=["pm25"], start_date="2024-01-20", end_date="2024-02-10",
+        out_paths={n: tmp_path / f"{n}.csv" for n in locations}, client=_client(_Session()),
+    )
+    assert set(paths) == {"a", "b"} and set(errors) == {"bad"}
+    df = pd.read_csv(paths["b"])
+    assert len(df) == 22 * 24 and (df["pm2_5"] == 2.0).all()
+
+
+def test_fetch_all_first_variant_with_data_wins_and_pages_stop_early(monkeypatch):
+    seen = []
+
+    async def fake_once(client, params, budget=None):
+        seen.append((params.get("city"), params["page"]))
+        if "country" not in params:
+            raise RuntimeError("HTTP 404")
+        if params.get("city") == "Milan":
+            return []  # no data under the English name
+        if params.get("city") is None:
+            await asyncio.sleep(0.2)  # the country-wide query is cancelled before it answers
+        elif params["page"] == 2:
+            await asyncio.sleep(0.05)  # pages still come out in order
+        if params["page"] > 3:
+            return []
+        return [{"value": params["page"], "coordinates": {"latitude": 45.4}, "city": params.get("city")}]
+
+    monkeypatch.setattr(fetch_openaq, "fetch_once", fake_once)
+    df = fetch_openaq.fetch_all("Milan", "pm25", pages=50, sleep=0, max_in_flight=3)
+    assert df["value"].tolist() == [1, 2, 3]
+    assert set(df["city"]) == {"Milano"} and "coordinates.latitude" in df
+    assert max(page for city, page in seen if city == "Milano") <= 7
+    assert all(page == 1 for city, page in seen if city != "Milano")
+
+
+def test_fetch_all_prefers_specific_variant_over_faster_fallback(monkeypatch):
+    async def fake_once(client, params, budget=None):
+        if params.get("city") is None:
+            return [{"value": -1, "city": None}] if params["page"] == 1 else []  # answers first
+        await asyncio.sleep(0.05 if params.get("country") is None else 0.1)
+        if params.get("country") is None and params["page"] == 1:
+            return []
+        if params["page"] > 2:
+            return []
+        return [{"value": params["page"], "city": params["city"], "country": params["country"]}]
+
+    monkeypatch.setattr(fetch_openaq, "fetch_once", fake_once)
+    df = fetch_openaq.fetch_all("Milan", "pm25", pages=50, sleep=0)
+    assert df["value"].tolist() == [1, 2]
+    assert set(zip(df["city"], df["country"])) == {("Milan", "IT")}
+
+
+def test_frame_builder_aligns_columns():
+    b = fetch_openaq.FrameBuilder()
+    b.add([{"a": 1}])
+    b.add([{"a": 2, "b": {"c": "x"}}, {"b": {"c": "y"}}])
+    df = b.frame()
+    assert df.columns.tolist() == ["a", "b.c"]
+    assert pd.isna(df["b.c"].iloc[0]) and df["b.c"].iloc[1:].tolist() == ["x", "y"]
+    assert df["a"].iloc[:2].tolist() == [1, 2] and pd.isna(df["a"].iloc[2])
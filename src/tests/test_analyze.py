@@ -16,3 +16,65 @@ def test_compute_metrics_basic():
     assert metrics["pm2_5"].mean is not None
     assert metrics["pm2_5"].max  is not None
     assert metrics["pm2_5"].trend_slope_per_day is not None
+
+
+def _legacy_metrics(df):
+    import numpy as np
+    out = {}
+    for col in df.columns:
+        s = df[col].dropna()
+        slope = None
+        if len(s) >= 3:
+            x = s.index.map(pd.Timestamp.toordinal).to_numpy(dtype=float)
+            slope = float(np.polyfit(x, s.to_numpy(dtype=float), 1)[0])
+        anomalies = 0
+        if not s.empty:
+            q1, q3 = s.quantile(0.25), s.quantile(0.75)
+            anomalies = int(((s < q1 - 1.5 * (q3 - q1)) | (s > q3 + 1.5 * (q3 - q1))).sum())
+        out[col] = (
+            round(100 * len(s) / len(df), 1),
+            float(s.mean()) if not s.empty else None,
+            float(s.max()) if not s.empty else None,
+            float(s.quantile(0.95)) if not s.empty else None,
+            slope,
+            anomalies,
+        )
+    return out
+
+
+def test_vectorized_metrics_match_per_column_reference():
+    import numpy as np
+    from pytest import approx
+    from aq_pipeline.analyze import compute_metrics_stack
+
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2023-01-01", periods=200, freq="D")
+    vals = rng.gamma(2.0, 10.0, size=(200, 4))
+    vals[rng.random((200, 4)) < 0.2] = np.nan
+    vals[:, 3] = np.nan
+    vals[5, 3] = 1.0  # a single point: no slope
+    df = pd.DataFrame(vals, index=idx, columns=["a", "b", "c", "d"])
+
+    ref = _legacy_metrics(df)
+    got = compute_metrics(df)
+    for col, (cov, mean, vmax, p95, slope, anomalies) in ref.items():
+        st = got[col]
+        assert st.coverage_pct == cov and st.anomalies == anomalies and st.max == vmax
+        assert st.mean == approx(mean) and st.p95 == approx(p95)
+        assert (st.trend_slope_per_day is None) == (slope is None)
+        if slope is not None:
+            assert st.trend_slope_per_day == approx(slope, rel=1e-6)
+
+    stacked = compute_metrics_stack({"x": df, "y": df.iloc[:50]})
+    assert stacked["x"]["b"] == got["b"]
+    assert stacked["y"]["a"].days == 50
+    assert stacked["y"]["a"].mean == approx(df["a"].iloc[:50].mean())
+
+
+def test_compute_metrics_empty_frame():
+    df = pd.DataFrame({"pm2_5": [], "pm10": []}, index=pd.DatetimeIndex([]), dtype=float)
+    metrics = compute_metrics(df)
+    assert set(metrics) == {"pm2_5", "pm10"}
+    st = metrics["pm2_5"]
+    assert st.days == 0 and st.coverage_pct == 0.0 and st.anomalies == 0
+    assert st.mean is None and st.max is None and st.p95 is None and st.trend_slope_per_day is None
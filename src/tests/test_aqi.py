@@ -0,0 +1,48 @@
+# tests/test_aqi.py
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from aq_pipeline import aqi
+
+
+def _row_aqi(c, bps):
+    # the dashboard's original per-value scan
+    for c_low, c_high, i_low, i_high in bps:
+        if c_low <= c <= c_high:
+            return (i_high - i_low) / (c_high - c_low) * (c - c_low) + i_low
+    return np.nan
+
+
+def test_sub_index_matches_breakpoint_scan():
+    conc = np.round(np.random.default_rng(0).uniform(0, 520, 2000), 1)
+    got = aqi.sub_index("pm2_5", conc)
+    ref = [_row_aqi(c, aqi.PM25_BP) for c in conc]
+    assert np.allclose(got, ref, equal_nan=True)
+    # truncation closes the gaps between table rows instead of dropping the value
+    assert aqi.sub_index("pm2_5", [12.05])[0] == approx(50.0)
+    assert np.isnan(aqi.sub_index("pm10", [700.0])[0])
+
+
+def test_dominant_pollutant_and_stack():
+    idx = pd.date_range("2024-01-01", periods=3, freq="D", name="date")
+    a = pd.DataFrame({"pm2_5": [10.0, 40.0, np.nan], "nitrogen_dioxide": [150.0, 20.0, np.nan]}, index=idx)
+    b = pd.DataFrame({"pm10": [60.0, 5.0, 1.0]}, index=idx)
+    fa = aqi.aqi_frame(a)
+    assert list(fa["dominant"].iloc[:2]) == ["nitrogen_dioxide", "pm2_5"]
+    assert pd.isna(fa["dominant"].iloc[2]) and np.isnan(fa["AQI"].iloc[2])
+
+    stacked = aqi.aqi_stack({"a": a, "b": b})
+    pd.testing.assert_frame_equal(stacked["a"], fa)
+    pd.testing.assert_frame_equal(stacked["b"], aqi.aqi_frame(b))
+
+
+def test_daily_inputs_use_pollutant_averaging_periods():
+    idx = pd.date_range("2024-01-01", periods=24, freq="h")
+    no2 = np.full(24, 10.0)
+    no2[7] = 90.0
+    hourly = pd.DataFrame({"pm2_5": np.arange(24.0), "nitrogen_dioxide": no2, "carbon_monoxide": 500.0}, index=idx)
+    d = aqi.daily_inputs(hourly)
+    assert d["pm2_5"].iloc[0] == approx(11.5)
+    assert d["nitrogen_dioxide"].iloc[0] == 90.0
+    assert d["carbon_monoxide"].iloc[0] == approx(500.0)
@@ -0,0 +1,99 @@
+# tests/test_clean.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline import storage
+from aq_pipeline.clean import clean_daily, daily_means
+
+
+def _raw(seed=0):
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2024-01-01 03:00", periods=24 * 60, freq="h", name="time")
+    v = rng.uniform(1, 50, size=(len(idx), 3))
+    v[rng.random(v.shape) < 0.3] = np.nan
+    v[100:400, 0] = np.nan   # gap spanning many days (and chunks)
+    v[-50:, 1] = np.nan      # trailing gap: never closed
+    v[:30, 2] = np.nan       # leading gap
+    df = pd.DataFrame(v, index=idx, columns=["pm2_5", "pm10", "carbon_monoxide"])
+    return df.drop(idx[900:950])  # rows missing altogether
+
+
+def test_streaming_clean_matches_in_memory():
+    df = _raw()
+    ref = daily_means(df)
+    for chunk_rows in (1, 7, 500, 10_000):
+        got = daily_means(df, chunk_rows=chunk_rows)
+        pd.testing.assert_frame_equal(got, ref, check_freq=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(
+        daily_means(df, interpolate=False, chunk_rows=100),
+        daily_means(df, interpolate=False),
+        check_freq=False, rtol=1e-9,
+    )
+
+
+def test_streaming_clean_daily_from_store(tmp_path):
+    df = _raw(1)
+    src = storage.write_frame(df, tmp_path / "raw" / "city=x", "time")
+    out = clean_daily(src, tmp_path / "daily.csv", chunk_rows=200)
+    got = pd.read_csv(out, parse_dates=["date"]).set_index("date")
+    pd.testing.assert_frame_equal(got, daily_means(df), check_freq=False, check_index_type=False, rtol=1e-9)
+
+
+def test_long_format_chunked_daily_mean(tmp_path):
+    from clean_airquality import daily_mean, daily_mean_chunked
+
+    rng = np.random.default_rng(2)
+    n = 3000
+    raw = pd.DataFrame({
+        "date": pd.date_range("2024-01-01", periods=n, freq="37min").astype(str),
+        "parameter": rng.choice(["pm25", "no2"], n),
+        "value": rng.uniform(0, 50, n),
+        "unit": rng.choice(["µg/m³", "ppm"], n),
+    })
+    path = tmp_path / "long.csv"
+    raw.to_csv(path, index=False)
+    for interp in (False, True):
+        pd.testing.assert_frame_equal(
+            daily_mean_chunked(str(path), 250, interp),
+            daily_mean(pd.read_csv(path), interp),
+            rtol=1e-9,
+        )
+
+
+def test_incremental_update_splices_only_dirty_days(tmp_path):
+    from aq_pipeline.clean import update_daily
+
+    full = _raw(3)
+    raw, proc = tmp_path / "raw", tmp_path / "daily"
+    old = full.iloc[:1000].copy()
+    old.iloc[-120:, 1] = np.nan  # values not published yet
+    storage.write_frame(old, raw, "time", record_changes=True)
+    update_daily(raw, proc, storage.read_changes(raw))
+    storage.clear_changes(raw, storage.read_changes(raw))
+    assert storage.read_changes(raw) == []
+
+    storage.upsert_frame(full.iloc[950:1200], raw, "time", record_changes=True)
+    days = update_daily(raw, proc, storage.read_changes(raw))
+    # the gap before the new hours is re-interpolated, older history is not touched
+    assert days.index.min() > full.index.min() + pd.Timedelta(days=20)
+
+    got = storage.read_frame(proc, "date")
+    ref = daily_means(storage.read_frame(raw, "time"))
+    pd.testing.assert_frame_equal(got, ref, check_freq=False, rtol=1e-9)
+
+
+def test_long_format_calendar_per_parameter():
+    from clean_airquality import daily_mean
+
+    raw = pd.DataFrame({
+        "date": ["2024-01-01 05:00", "2024-01-01 07:00", "2024-01-04 00:00", "2024-01-02 12:00", "2024-01-03 12:00"],
+        "parameter": ["pm25", "pm25", "pm25", "no2", "no2"],
+        "value": [10.0, 20.0, 30.0, 5.0, 7.0],
+        "unit": ["µg/m³", "µg/m³", "ug", None, None],
+    })
+    out = daily_mean(raw, interpolate=True)
+    no2, pm25 = out[out.parameter == "no2"], out[out.parameter == "pm25"]
+    assert list(no2["date"].dt.day) == [2, 3] and set(no2["unit"]) == {""}
+    assert list(pm25["date"].dt.day) == [1, 2, 3, 4]
+    assert list(pm25["value"]) == [15.0, 20.0, 25.0, 30.0]
+    assert set(pm25["unit"]) == {"µg/m³"}
@@ -0,0 +1,57 @@
+# tests/test_dag.py
+import threading
+import time
+from functools import partial
+
+from aq_pipeline import dag
+
+
+def _step(log, lock, name, delay=0.01):
+    time.sleep(delay)
+    with lock:
+        log.append(name)
+    return name
+
+
+def _fail():
+    raise RuntimeError("boom")
+
+
+def test_failures_skip_only_their_descendants():
+    log, lock = [], threading.Lock()
+    g = dag.Graph()
+    for city in ("a", "b", "c"):
+        fetch = g.add(f"{city}/fetch", _fail if city == "b" else partial(_step, log, lock, f"{city}/fetch"), stage="fetch")
+        clean = g.add(f"{city}/clean", partial(_step, log, lock, f"{city}/clean"), deps=[fetch], kind="cpu", stage="clean")
+        g.add(f"{city}/report", partial(_step, log, lock, f"{city}/report"), deps=[clean], kind="cpu", stage="report")
+
+    done = []
+    results, errors = dag.run(g, io_workers=2, on_done=lambda n, r: done.append(n))
+    assert set(results) == {f"{c}/{s}" for c in "ac" for s in ("fetch", "clean", "report")}
+    assert isinstance(errors["b/fetch"], RuntimeError)
+    assert all(isinstance(errors[f"b/{s}"], dag.UpstreamFailed) for s in ("clean", "report"))
+    for c in "ac":  # dependencies finish first
+        assert done.index(f"{c}/fetch") < done.index(f"{c}/clean") < done.index(f"{c}/report")
+
+
+def test_queue_size_bounds_a_fast_stage():
+    fetched, seen, lock = [], [], threading.Lock()
+
+    def fetch():
+        with lock:
+            fetched.append(1)
+
+    def clean():
+        time.sleep(0.05)
+        with lock:
+            seen.append(len(fetched))
+
+    g = dag.Graph()
+    for i in range(8):
+        f = g.add(f"{i}/fetch", fetch, stage="fetch")
+        g.add(f"{i}/clean", clean, deps=[f], kind="cpu", stage="clean")
+    results, errors = dag.run(g, io_workers=4, queue_size=2)
+    assert not errors and len(results) == 16
+    # by the time the first clean is done, fetch has run at most its queue plus
+    # the items the (two) running cleans took off it
+    assert seen[0] <= 4
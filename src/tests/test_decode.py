@@ -0,0 +1,51 @@
+# tests/test_decode.py
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aq_pipeline import decode
+
+
+def _payload(times, **cols):
+    return {"hourly": {"time": times, **cols}, "hourly_units": {k: "µg/m³" for k in cols}}
+
+
+def test_hourly_frame_regular_index_and_nulls():
+    times = [t.strftime("%Y-%m-%dT%H:%M") for t in pd.date_range("2024-03-30", periods=72, freq="h")]
+    vals = [float(i) for i in range(72)]
+    vals[5] = None
+    df = decode.hourly_frame(_payload(times, pm10=vals), ["pm10", "pm2_5"])
+
+    pd.testing.assert_index_equal(pd.DatetimeIndex(df["time"]), pd.DatetimeIndex(pd.to_datetime(times)),
+                                  check_names=False, exact=False)
+    assert df["pm10"].dtype == np.float64 and np.isnan(df["pm10"].iloc[5])
+    assert df["pm2_5"].isna().all()  # absent from payload
+
+
+def test_hourly_index_falls_back_on_gaps():
+    times = ["2024-01-01T00:00", "2024-01-01T01:00", "2024-01-01T05:00"]
+    idx = decode.hourly_index(times)
+    assert list(idx) == [pd.Timestamp(t) for t in times]
+
+
+def test_load_stream_matches_loads():
+    pytest.importorskip("ijson")
+    times = [t.strftime("%Y-%m-%dT%H:%M") for t in pd.date_range("2024-01-01", periods=10, freq="h")]
+    js = _payload(times, pm10=[1.5, None] * 5)
+    body = json.dumps(js).encode()
+    streamed = decode.hourly_frame(decode.load_stream(io.BytesIO(body), ["pm10"]), ["pm10"])
+    pd.testing.assert_frame_equal(streamed, decode.hourly_frame(decode.loads(body), ["pm10"]))
+
+
+def test_load_stream_many_splits_locations():
+    pytest.importorskip("ijson")
+    times = [t.strftime("%Y-%m-%dT%H:%M") for t in pd.date_range("2024-01-01", periods=4, freq="h")]
+    js = [_payload(times, pm10=[1.0, None, 3.0, 4.0]), _payload(times, pm10=[5.0] * 4)]
+    body = json.dumps(js).encode()
+    streamed = decode.load_stream_many(io.BytesIO(body), ["pm10"])
+    assert len(streamed) == 2
+    for got, want in zip(streamed, js):
+        pd.testing.assert_frame_equal(decode.hourly_frame(got, ["pm10"]), decode.hourly_frame(want, ["pm10"]))
@@ -0,0 +1,44 @@
+# tests/test_downsample.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline import downsample
+
+
+def _series(n=5000):
+    rng = np.random.default_rng(1)
+    y = rng.gamma(2.0, 10.0, n)
+    y[1000:1200] = np.nan
+    y[3000] = 500.0
+    return pd.Series(y, index=pd.date_range("2024-01-01", periods=n, freq="h"))
+
+
+def test_lttb_keeps_ends_and_budget():
+    s = _series()
+    out = downsample.downsample_series(s, 300)
+    assert len(out) == 300
+    assert out.index[0] == s.index[0] and out.index[-1] == s.index[-1]
+    assert out.index.is_monotonic_increasing
+    assert out.isna().any()  # the gap survives
+
+
+def test_minmax_keeps_extremes():
+    s = _series()
+    out = downsample.downsample_series(s, 200, "minmax")
+    assert len(out) <= 200
+    assert out.max() == s.max() and out.min() == s.min()
+
+
+def test_short_series_untouched():
+    df = pd.DataFrame({"a": [1.0, 2.0, 3.0]})
+    assert downsample.downsample_frame(df, 10) is df
+
+
+def test_frame_budget_holds_across_columns():
+    rng = np.random.default_rng(1)
+    idx = pd.date_range("2020-01-01", periods=5000, freq="h")
+    df = pd.DataFrame(rng.normal(size=(5000, 6)), index=idx, columns=list("abcdef"))
+    for method in ("lttb", "minmax"):
+        for n in (3, 100, 1500):
+            out = downsample.downsample_frame(df, n, method)
+            assert 0 < len(out) <= n
@@ -0,0 +1,189 @@
+# tests/test_fetch.py
+import asyncio
+import random
+import time
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from aq_pipeline import fetch, storage
+from aq_pipeline.cache import CacheMiss, ResponseCache
+from aq_pipeline.fetch import _WindowSizer, fetch_openmeteo
+
+
+def _fake_request(calls):
+    async def fake(client, *, lat, lon, hourly_params, start_date=None, end_date=None, sizer=None, **kw):
+        calls.append((start_date, end_date))
+        await asyncio.sleep(random.random() / 100)  # finish out of order
+        times = pd.date_range(start_date, pd.Timestamp(end_date) + pd.Timedelta(hours=23), freq="h")
+        hourly = {"time": [t.strftime("%Y-%m-%dT%H:%M") for t in times]}
+        for p in hourly_params:
+            hourly[p] = [1.0] * len(times)
+        return {"hourly": hourly}
+    return fake
+
+
+def test_fetch_openmeteo_windows_stitched_in_order(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetch, "_request_window", _fake_request(calls))
+    out = fetch_openmeteo(
+        lat=1.0, lon=2.0, parameters=["pm25"], out_csv=tmp_path / "raw.csv",
+        start_date="2023-01-01", end_date="2023-12-31", max_in_flight=3, chunk_days=62,
+    )
+    df = pd.read_csv(out, parse_dates=["time"])
+    assert len(calls) == 6  # two calendar months per request
+    assert df["time"].is_monotonic_increasing
+    assert len(df) == 365 * 24
+    assert df["time"].iloc[0] == pd.Timestamp("2023-01-01")
+
+
+def test_fetch_openmeteo_served_from_cache_on_rerun(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetch, "_request_window", _fake_request(calls))
+    cache = ResponseCache(tmp_path / "cache")
+    kw = dict(lat=1.0, lon=2.0, parameters=["pm25", "pm10"],
+              start_date="2023-01-15", end_date="2023-06-10", cache=cache)
+    first = pd.read_csv(fetch_openmeteo(out_csv=tmp_path / "a.csv", **kw))
+    n_first = len(calls)
+    assert n_first > 0
+
+    offline = ResponseCache(tmp_path / "cache", offline=True)
+    second = pd.read_csv(fetch_openmeteo(out_csv=tmp_path / "b.csv", **dict(kw, cache=offline)))
+    assert len(calls) == n_first
+    pd.testing.assert_frame_equal(first, second)
+
+    with pytest.raises(CacheMiss):
+        fetch_openmeteo(out_csv=tmp_path / "c.csv", **dict(kw, end_date="2023-07-10", cache=offline))
+
+
+def test_sub_month_requests_are_cached_as_whole_months(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetch, "_request_window", _fake_request(calls))
+    cache = ResponseCache(tmp_path / "cache")
+    kw = dict(lat=1.0, lon=2.0, parameters=["pm25"], start_date="2023-01-15", end_date="2023-03-10")
+    first = pd.read_csv(fetch_openmeteo(out_csv=tmp_path / "a.csv", cache=cache, chunk_days=10, **kw))
+    assert max((e - s).days + 1 for s, e in calls) <= 10
+
+    stored = {p.stem for p in (tmp_path / "cache").rglob("*.json")}
+    months = [(date(2023, 1, 15), date(2023, 1, 31)), (date(2023, 2, 1), date(2023, 2, 28)),
+              (date(2023, 3, 1), date(2023, 3, 10))]
+    assert stored == {cache.window_key(1.0, 2.0, ["pm2_5"], s, e)[0] for s, e in months}
+
+    offline = ResponseCache(tmp_path / "cache", offline=True)
+    second = pd.read_csv(fetch_openmeteo(out_csv=tmp_path / "b.csv", cache=offline, **kw))
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(tmp_path, max_bytes=250)
+    cache.put("aa1", b"x" * 100)
+    time.sleep(0.01)
+    cache.put("bb2", b"x" * 100)
+    time.sleep(0.01)
+    assert cache.get("aa1") is not None  # touch: bb2 is now the LRU entry
+    cache.put("cc3", b"x" * 100)
+    assert cache.get("bb2") is None
+    assert cache.get("aa1") is not None and cache.get("cc3") is not None
+
+
+def test_window_sizer_shrinks_on_slow_responses():
+    sizer = _WindowSizer(initial_days=90, target_seconds=5.0)
+    assert sizer.next_days() == 90
+    sizer.observe(days=90, seconds=45.0, nbytes=1000)  # 0.5 s/day -> 10 days
+    assert sizer.next_days() == 10
+    sizer.observe(days=10, seconds=0.01, nbytes=100)
+    assert sizer.next_days() > 10
+
+
+def test_slow_responses_split_months_into_shorter_requests(tmp_path, monkeypatch):
+    calls = []
+    fake = _fake_request(calls)
+
+    async def slow(client, *, sizer=None, **kw):
+        days = (kw["end_date"] - kw["start_date"]).days + 1
+        if sizer is not None:
+            sizer.observe(days, seconds=2.0 * days, nbytes=0)  # 2 s/day -> clamped to MIN_WINDOW_DAYS
+        return await fake(client, **kw)
+
+    monkeypatch.setattr(fetch, "_request_window", slow)
+    out = fetch_openmeteo(
+        lat=1.0, lon=2.0, parameters=["pm25"], out_csv=tmp_path / "raw.csv",
+        start_date="2024-01-01", end_date="2024-03-31", max_in_flight=1,
+    )
+    assert [(str(s), str(e)) for s, e in calls] == [
+        ("2024-01-01", "2024-02-29"),  # two whole months before anything is observed
+        ("2024-03-01", "2024-03-07"), ("2024-03-08", "2024-03-14"), ("2024-03-15", "2024-03-21"),
+        ("2024-03-22", "2024-03-28"), ("2024-03-29", "2024-03-31"),
+    ]
+    df = pd.read_csv(out, parse_dates=["time"])
+    assert len(df) == 91 * 24 and df["time"].is_monotonic_increasing
+
+
+def test_incremental_fetch_requests_only_missing_days(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(fetch, "_request_window", _fake_request(calls))
+    out = tmp_path / "raw.csv"
+    kw = dict(lat=1.0, lon=2.0, parameters=["pm25"], out_csv=out, incremental=True)
+    fetch_openmeteo(start_date="2023-03-01", end_date="2023-03-20", **kw)
+    before = out.read_text()
+
+    calls.clear()
+    fetch_openmeteo(start_date="2023-03-01", end_date="2023-03-22", **kw)
+    assert [(str(s), str(e)) for s, e in calls] == [("2023-03-21", "2023-03-22")]
+    assert out.read_text().startswith(before)  # appended, history untouched
+
+    calls.clear()
+    fetch_openmeteo(start_date="2023-03-01", end_date="2023-03-22", **kw)
+    assert calls == []
+    assert len(pd.read_csv(out)) == 22 * 24
+
+
+def test_incremental_fetch_does_not_rerequest_settled_gaps(tmp_path, monkeypatch):
+    calls = []
+    fake = _fake_request(calls)
+
+    async def with_gap(client, **kw):
+        js = await fake(client, **kw)
+        hourly = js["hourly"]
+        hourly["pm2_5"] = [None if t.startswith("2023-03-05") else v for t, v in zip(hourly["time"], hourly["pm2_5"])]
+        return js
+
+    monkeypatch.setattr(fetch, "_request_window", with_gap)
+    out = tmp_path / "raw"
+    kw = dict(lat=1.0, lon=2.0, parameters=["pm25"], out_csv=out, incremental=True)
+    fetch_openmeteo(start_date="2023-03-01", end_date="2023-03-10", **kw)
+    assert storage.read_fetched(out) == [(date(2023, 3, 1), date(2023, 3, 10))]
+
+    calls.clear()
+    fetch_openmeteo(start_date="2023-03-01", end_date="2023-03-12", **kw)
+    assert [(str(s), str(e)) for s, e in calls] == [("2023-03-11", "2023-03-12")]
+    assert storage.read_fetched(out) == [(date(2023, 3, 1), date(2023, 3, 12))]
+
+
+def test_batch_fetch_packs_locations_and_splits_results(tmp_path, monkeypatch):
+    calls = []
+    single = _fake_request([])
+
+    async def fake_batch(client, *, coords, hourly_params, start_date=None, end_date=None, **kw):
+        calls.append((len(coords), start_date, end_date))
+        out = []
+        for lat, lon in coords:
+            js = await single(client, lat=lat, lon=lon, hourly_params=hourly_params, start_date=start_date, end_date=end_date)
+            js["hourly"][hourly_params[0]] = [lat] * len(js["hourly"]["time"])
+            out.append(js)
+        return out
+
+    monkeypatch.setattr(fetch, "_request_batch", fake_batch)
+    locations = {f"c{i}": (float(i), 0.0) for i in range(5)}
+    out_paths = {name: tmp_path / f"{name}.csv" for name in locations}
+    paths, errors = fetch.fetch_openmeteo_batch(
+        locations=locations, parameters=["pm25"], out_paths=out_paths,
+        start_date="2023-01-01", end_date="2023-02-28", batch_size=2,
+    )
+    assert errors == {}
+    assert sorted(n for n, _, _ in calls) == [1, 2, 2]  # 5 points, one 59-day window
+    for name, (lat, _lon) in locations.items():
+        df = pd.read_csv(paths[name])
+        assert len(df) == 59 * 24
+        assert (df["pm2_5"] == lat).all()
@@ -0,0 +1,57 @@
+# tests/test_http_client.py
+import requests
+
+from aq_pipeline import http_client
+from aq_pipeline.http_client import HttpClient, TokenBucket
+
+
+class _FakeResponse:
+    def __init__(self, status, headers=None):
+        self.status_code = status
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None, **kw):
+        self.calls += 1
+        out = self.outcomes.pop(0)
+        if isinstance(out, Exception):
+            raise out
+        return out
+
+
+def test_retries_then_succeeds_and_honors_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(http_client.time, "sleep", sleeps.append)
+    session = _FakeSession([
+        requests.ConnectionError("reset"),
+        _FakeResponse(429, {"Retry-After": "7"}),
+        _FakeResponse(200),
+    ])
+    client = HttpClient(session=session, rate_per_sec=1000, burst=1000, backoff_base=0.1)
+    resp = client.get("https://example.org/x")
+    assert resp.status_code == 200
+    assert session.calls == 3
+    assert sleeps[0] <= 0.1 and sleeps[1] == 7.0
+
+
+def test_gives_up_after_max_retries(monkeypatch):
+    monkeypatch.setattr(http_client.time, "sleep", lambda s: None)
+    session = _FakeSession([_FakeResponse(503)] * 3)
+    client = HttpClient(session=session, max_retries=2, rate_per_sec=1000, burst=1000)
+    assert client.get("https://example.org/x").status_code == 503
+    assert session.calls == 3
+
+
+def test_token_bucket_reports_wait_when_empty():
+    b = TokenBucket(rate=1.0, capacity=2)
+    assert b.try_acquire() == 0.0
+    assert b.try_acquire() == 0.0
+    assert b.try_acquire() > 0.0
@@ -0,0 +1,33 @@
+# tests/test_manifest.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline import storage
+from aq_pipeline.manifest import Manifest
+
+
+def _write(ds, value):
+    df = pd.DataFrame({"time": pd.date_range("2024-01-01", periods=48, freq="h"), "pm10": np.full(48, value)})
+    storage.write_frame(df, ds, "time")
+
+
+def test_stage_fresh_until_inputs_or_outputs_change(tmp_path):
+    raw, out = tmp_path / "raw", tmp_path / "out.txt"
+    _write(raw, 1.0)
+    memo = Manifest(tmp_path / "m.json")
+    key = memo.key({"interpolate": True}, [raw])
+    out.write_text("a")
+    memo.record("clean", key, [out])
+
+    memo = Manifest(tmp_path / "m.json")  # reloaded from disk
+    assert memo.fresh("clean", memo.key({"interpolate": True}, [raw]), [out])
+    assert not memo.fresh("clean", memo.key({"interpolate": False}, [raw]), [out])
+    assert not Manifest(tmp_path / "m.json", force=True).fresh("clean", key, [out])
+
+    _write(raw, 1.0)  # rewritten with identical content: still the same key
+    assert memo.key({"interpolate": True}, [raw]) == key
+    _write(raw, 2.0)
+    assert memo.key({"interpolate": True}, [raw]) != key
+
+    out.write_text("half-written")
+    assert not memo.fresh("clean", key, [out])
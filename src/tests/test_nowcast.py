@@ -0,0 +1,45 @@
+# tests/test_nowcast.py
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from aq_pipeline import nowcast
+
+
+def _reference_nowcast(window):
+    # direct EPA definition; window[0] is the current hour
+    c = np.asarray(window, dtype=float)
+    valid = ~np.isnan(c)
+    if valid[:3].sum() < 2:
+        return np.nan
+    w = max(np.nanmin(c) / np.nanmax(c), 0.5)
+    wts = np.where(valid, w ** np.arange(len(c)), 0.0)
+    return float(np.nansum(wts * c) / wts.sum())
+
+
+def test_pm_nowcast_matches_definition_on_a_stack():
+    rng = np.random.default_rng(0)
+    vals = rng.uniform(1, 80, size=(200, 3))
+    vals[rng.random(vals.shape) < 0.15] = np.nan
+    got = nowcast.pm_nowcast(vals)
+    for j in range(3):
+        for t in range(200):
+            win = vals[max(0, t - 11): t + 1, j][::-1]
+            win = np.concatenate([win, np.full(12 - len(win), np.nan)])
+            ref = _reference_nowcast(win)
+            assert (np.isnan(got[t, j]) and np.isnan(ref)) or got[t, j] == approx(ref)
+
+
+def test_co_rolling_mean_and_hourly_aqi_gaps():
+    idx = pd.date_range("2024-01-01", periods=48, freq="h", name="time")
+    co = pd.Series(np.linspace(300, 900, 48), index=idx)
+    co.iloc[10] = np.nan
+    ref = co.rolling(8, min_periods=6).mean().to_numpy()
+    assert np.allclose(nowcast.rolling_mean(co.to_numpy(), 8, 6), ref, equal_nan=True)
+
+    df = pd.DataFrame({"pm2_5": 20.0, "carbon_monoxide": co}, index=idx).drop(idx[20:23])
+    out = nowcast.hourly_aqi(df)
+    assert len(out) == 48  # missing hours are restored, not skipped by the window
+    stacked = nowcast.hourly_aqi_stack({"a": df, "b": df.iloc[5:]})
+    pd.testing.assert_frame_equal(stacked["a"], out)
+    assert nowcast.latest(out, asof=idx[-1]).name == idx[-1]
@@ -0,0 +1,75 @@
+# tests/test_online.py
+import numpy as np
+import pandas as pd
+from pytest import approx
+
+from aq_pipeline.analyze import compute_metrics
+from aq_pipeline.online import KLLSketch, OnlineStats, merge_all, update_stats_file
+
+
+def _daily(n=120, seed=0, start="2024-01-01"):
+    rng = np.random.default_rng(seed)
+    vals = rng.gamma(2.0, 10.0, size=(n, 2))
+    vals[rng.random((n, 2)) < 0.1] = np.nan
+    idx = pd.date_range(start, periods=n, freq="D", name="date")
+    return pd.DataFrame(vals, index=idx, columns=["pm2_5", "pm10"])
+
+
+def test_incremental_updates_match_full_metrics(tmp_path):
+    df = _daily()
+    dst = tmp_path / "city=x"
+    # grow the history a few days at a time, with the last day still changing
+    for end in (30, 31, 60, 119):
+        partial = df.iloc[:end].copy()
+        partial.iloc[-1] = partial.iloc[-1] * 0.5
+        update_stats_file(dst, partial)
+    stats = update_stats_file(dst, df)
+
+    got, ref = stats.to_metrics(), compute_metrics(df)
+    for col in df.columns:
+        g, r = got[col], ref[col]
+        assert g.days == r.days and g.coverage_pct == r.coverage_pct
+        assert g.mean == approx(r.mean) and g.max == approx(r.max)
+        assert g.p95 == approx(r.p95)  # exact while the sketch has not compacted
+        assert g.trend_slope_per_day == approx(r.trend_slope_per_day)
+        assert g.anomalies == r.anomalies
+
+
+def test_identical_incremental_runs_give_identical_quantiles(tmp_path):
+    df = _daily(n=1500, seed=4)  # well past the sketch's compaction point
+    runs = []
+    for name in ("a", "b"):
+        dst = tmp_path / name
+        for end in (400, 900, 1500):
+            stats = update_stats_file(dst, df.iloc[:end])
+        runs.append(stats)
+    assert runs[0].series["pm2_5"].sketch.compactions > 0
+    assert runs[0].to_metrics() == runs[1].to_metrics()
+    assert runs[0].to_dict() == runs[1].to_dict()
+
+
+def test_sketch_merge_and_accuracy():
+    rng = np.random.default_rng(1)
+    parts = [rng.lognormal(3, 0.5, 20_000) for _ in range(3)]
+    sketches = []
+    for i, p in enumerate(parts):
+        sk = KLLSketch(k=200, seed=i)
+        sk.update(p)
+        sketches.append(sk)
+    merged = sketches[0].merge(sketches[1]).merge(sketches[2])
+    allv = np.concatenate(parts)
+    assert merged.n == allv.size
+    for q in (0.25, 0.5, 0.95):
+        rank = (allv < merged.quantile(q)).mean()
+        assert abs(rank - q) < 0.02
+
+
+def test_regional_rollup_and_roundtrip():
+    a, b = _daily(seed=2), _daily(seed=3)
+    region = merge_all([OnlineStats.rebuild(a), OnlineStats.rebuild(b)])
+    both = pd.concat([a, b])
+    m = region.to_metrics()["pm2_5"]
+    assert m.days == len(both)
+    assert m.mean == approx(both["pm2_5"].mean())
+    again = OnlineStats.from_dict(region.to_dict()).to_metrics()["pm2_5"]
+    assert again == m
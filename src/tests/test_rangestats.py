@@ -0,0 +1,35 @@
+# tests/test_rangestats.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline.rangestats import RangeStats
+
+
+def _daily(days=3000):
+    rng = np.random.default_rng(3)
+    v = rng.gamma(2.0, 10.0, size=(days, 2))
+    v[rng.random(v.shape) < 0.1] = np.nan
+    idx = pd.date_range("2015-01-01", periods=days, freq="D", name="date")
+    return pd.DataFrame(v, index=idx, columns=["pm2_5", "pm10"])
+
+
+def test_range_kpis_match_direct_computation():
+    df = _daily()
+    rs = RangeStats(df)
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        start, end = sorted(rng.choice(df.index, 2))
+        s = df.loc[start:end, "pm2_5"].dropna()
+        got = rs.summary(start, end, ["pm2_5"]).iloc[0]
+        assert got["count"] == len(s)
+        assert np.isclose(got["mean"], s.mean()) and got["max"] == s.max()
+        if len(s) <= 150:  # fits in one sketch level: exact
+            assert np.isclose(got["p95"], s.quantile(0.95))
+        else:
+            assert abs((s < got["p95"]).mean() - 0.95) < 0.02
+
+
+def test_empty_range():
+    rs = RangeStats(_daily(100))
+    assert rs.rows("2030-01-01", "2030-02-01") == 0
+    assert rs.summary("2030-01-01", "2030-02-01")["mean"].isna().all()
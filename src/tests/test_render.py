@@ -0,0 +1,28 @@
+# tests/test_render.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline.plot import pollutant_jobs
+from aq_pipeline.render import Renderer, cached_key
+
+
+def _daily(scale=1.0):
+    idx = pd.date_range("2024-01-01", periods=30, freq="D", name="date")
+    return pd.DataFrame({"pm2_5": np.arange(30.0) * scale, "pm10": np.ones(30)}, index=idx)
+
+
+def test_unchanged_figures_are_skipped(tmp_path):
+    with Renderer(workers=1) as r:
+        paths = r.render(pollutant_jobs(_daily(), tmp_path, prefix="x_"))
+        assert [p.name for p in paths] == ["x_pm2_5.png", "x_pm10.png"]
+        assert all(cached_key(p) for p in paths)
+        r.render(pollutant_jobs(_daily(), tmp_path, prefix="x_"))
+        assert (r.rendered, r.skipped) == (2, 2)
+        r.render(pollutant_jobs(_daily(2.0), tmp_path, prefix="x_"))
+        assert (r.rendered, r.skipped) == (3, 3)
+
+
+def test_file_prefix_stays_out_of_titles(tmp_path):
+    jobs = pollutant_jobs(_daily(), tmp_path, file_prefix="milan_")
+    assert jobs[0].out_png.name == "milan_pm2_5.png"
+    assert jobs[0].title == "pm2_5 — Daily Mean"
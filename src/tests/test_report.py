@@ -18,3 +18,13 @@ def test_write_summary_report(tmp_path: Path):
     assert out.exists()
     assert "Pollutant Summary" in text
     assert "Testville" in text
+
+def test_write_summary_report_from_frame(tmp_path: Path):
+    df = pd.DataFrame(
+        {"pm2_5": [10, 11, 12, 13, 14]},
+        index=pd.date_range("2024-01-01", periods=5, freq="D", name="date"),
+    )
+    out = write_summary_report(df, tmp_path / "report.txt", city="Framed")
+    text = out.read_text(encoding="utf-8")
+    assert "Range: 2024-01-01 – 2024-01-05" in text
+    assert "pm2_5 | 100.0 | 12.00" in text
@@ -0,0 +1,57 @@
+# tests/test_rollup.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline import rollup, storage
+from aq_pipeline.clean import daily_means, hourly_values
+
+
+def _raw():
+    rng = np.random.default_rng(0)
+    idx = pd.date_range("2024-01-03 05:00", periods=24 * 100, freq="h", name="time")
+    v = rng.uniform(1, 50, size=(len(idx), 2))
+    v[rng.random(v.shape) < 0.2] = np.nan
+    return pd.DataFrame(v, index=idx, columns=["pm2_5", "pm10"])
+
+
+def test_levels_agree_with_direct_aggregation():
+    raw = _raw()
+    hourly = hourly_values(raw)
+    levels = rollup.build_rollups(hourly)
+    pd.testing.assert_frame_equal(rollup.select(levels["daily"]), daily_means(raw), check_freq=False)
+    weekly = hourly.resample("W-MON", label="left", closed="left")
+    assert np.allclose(rollup.select(levels["weekly"], "mean"), weekly.mean(), equal_nan=True)
+    assert np.allclose(rollup.select(levels["weekly"], "count"), weekly.count())
+    assert np.allclose(rollup.select(levels["monthly"], "max"), hourly.resample("MS").max())
+
+
+def test_update_rollups_matches_full_build(tmp_path):
+    raw = _raw()
+    src = storage.dataset_path("raw", "x", tmp_path)
+    storage.write_frame(raw.iloc[:1500], src, "time")
+    rollup.write_rollups("x", hourly_values(raw.iloc[:1500]), tmp_path)
+    storage.upsert_frame(raw.iloc[1400:], src, "time")
+    rollup.update_rollups("x", src, pd.Timestamp("2024-03-01"), raw.index[-1].floor("D"), root=tmp_path)
+
+    full = rollup.build_rollups(hourly_values(raw))
+    for level in rollup.STORED_LEVELS:
+        got = rollup.load_level("x", level, root=tmp_path)
+        pd.testing.assert_frame_equal(got, full[level], check_freq=False, rtol=1e-9)
+
+
+def test_hourly_level_honours_interpolate(tmp_path):
+    raw = _raw()
+    storage.write_frame(raw, storage.dataset_path("raw", "x", tmp_path), "time")
+    t0, t1 = raw.index[24], raw.index[24 * 10]
+    filled = rollup.load_level("x", "hourly", t0, t1, root=tmp_path)
+    gaps = rollup.load_level("x", "hourly", t0, t1, interpolate=False, root=tmp_path)
+    pd.testing.assert_frame_equal(rollup.select(gaps), hourly_values(raw, t0, t1, interpolate=False), check_freq=False, check_names=False)
+    assert rollup.select(gaps).isna().sum().sum() > rollup.select(filled).isna().sum().sum()
+
+
+def test_pick_level():
+    t = pd.Timestamp("2024-01-01")
+    assert rollup.pick_level(t, t + pd.Timedelta(days=30)) == "hourly"
+    assert rollup.pick_level(t, t + pd.Timedelta(days=800)) == "daily"
+    assert rollup.pick_level(t, t + pd.Timedelta(days=800), max_points=200) == "weekly"
+    assert rollup.pick_level(t, t + pd.Timedelta(days=10_000), max_points=10) == "monthly"
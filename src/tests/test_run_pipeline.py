@@ -0,0 +1,61 @@
+# tests/test_run_pipeline.py
+import threading
+import time
+from pathlib import Path
+
+import run_pipeline
+
+
+def test_run_targets_isolates_failures(monkeypatch):
+    def fake_run_one_city(city_name, lat, lon, **kwargs):
+        if city_name == "Bad":
+            raise RuntimeError("boom")
+        return {"processed": Path(f"{city_name}.csv")}
+
+    monkeypatch.setattr(run_pipeline, "run_one_city", fake_run_one_city)
+    targets = [("Good", 1.0, 2.0), ("Bad", 3.0, 4.0), (None, 5.0, 6.0)]
+    results, errors = run_pipeline.run_targets(targets, workers=3)
+
+    assert set(results) == {"Good", "5.0,6.0"}
+    assert set(errors) == {"Bad"}
+    assert isinstance(errors["Bad"], RuntimeError)
+
+
+def test_run_graph_overlaps_batched_fetch_with_cleaning(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    events, lock = [], threading.Lock()
+
+    def note(what):
+        with lock:
+            events.append(what)
+
+    def fake_batched(batch, **kwargs):
+        labels = [target_label for target_label, _lat, _lon in batch]
+        if "Slow" in labels:
+            time.sleep(0.5)
+        note(("fetched", tuple(labels)))
+        return {"Bad": RuntimeError("no data")} if "Bad" in labels else {}
+
+    def stage(name):
+        def fn(job, *args):
+            note((name, job.label))
+            return run_pipeline.StageResult()
+        return fn
+
+    monkeypatch.setattr(run_pipeline, "fetch_targets_batched", fake_batched)
+    for name in ("clean", "plot", "report"):
+        monkeypatch.setattr(run_pipeline, f"{name}_stage", stage(name))
+
+    targets = [("Fast", 1.0, 1.0), ("Bad", 2.0, 2.0), ("Slow", 3.0, 3.0), ("Late", 4.0, 4.0)]
+    results, errors, _figures = run_pipeline.run_graph(
+        targets, io_workers=4, batch_size=2, parameters=("pm25",), interpolate=True,
+        timestamped=False, dpi=72, past_days=None, start="2024-01-01", end="2024-01-31",
+    )
+
+    assert set(results) == {"Fast", "Slow", "Late"}
+    assert set(errors) == {"Bad"} and isinstance(errors["Bad"], RuntimeError)
+    assert ("clean", "Bad") not in events
+    # the first batch's cities are cleaned and reported while the slow batch is still fetching
+    slow_done = events.index(("fetched", ("Slow", "Late")))
+    assert events.index(("report", "Fast")) < slow_done
+    assert events.index(("clean", "Slow")) > slow_done
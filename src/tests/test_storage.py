@@ -0,0 +1,73 @@
+# tests/test_storage.py
+import numpy as np
+import pandas as pd
+
+from aq_pipeline import storage
+
+
+def _hourly(start, periods, value=1.0):
+    return pd.DataFrame({
+        "time": pd.date_range(start, periods=periods, freq="h"),
+        "pm10": np.full(periods, value),
+        "pm2_5": np.arange(periods, dtype=float),
+    })
+
+
+def test_partitioned_roundtrip_and_pruning(tmp_path):
+    ds = tmp_path / "raw" / "city=testville"
+    df = _hourly("2024-01-30", 24 * 5)  # spans January and February
+    storage.write_frame(df, ds, "time")
+
+    assert sorted(p.name for p in ds.glob("month=*")) == ["month=2024-01", "month=2024-02"]
+    back = storage.read_frame(ds, "time")
+    pd.testing.assert_frame_equal(back, df.set_index("time"), check_index_type=False, check_freq=False)
+
+    feb = storage.read_frame(ds, "time", start="2024-02-01", end="2024-02-29")
+    assert feb.index.min() == pd.Timestamp("2024-02-01") and len(feb) == 24 * 3
+    assert storage.list_datasets("raw", tmp_path) == {"testville": ds}
+
+
+def test_upsert_rewrites_only_touched_months(tmp_path):
+    ds = tmp_path / "city=x"
+    storage.write_frame(_hourly("2024-01-01", 24 * 40), ds, "time")
+    jan = ds / "month=2024-01" / storage.PART_FILE
+    jan_bytes = jan.read_bytes()
+
+    storage.upsert_frame(_hourly("2024-02-05", 48, value=9.0), ds, "time")
+    assert jan.read_bytes() == jan_bytes
+    back = storage.read_frame(ds, "time")
+    assert len(back) == 24 * 40  # Feb 5-6 replaced in place, not duplicated
+    assert (back.loc["2024-02-05":"2024-02-06", "pm10"] == 9.0).all()
+    assert (back.loc["2024-02-07":, "pm10"] == 1.0).all()
+
+
+def test_upsert_keeps_columns_missing_from_new_rows(tmp_path):
+    for dst in (tmp_path / "city=x", tmp_path / "x.csv"):
+        storage.write_frame(_hourly("2024-01-01", 48), dst, "time")
+        new = _hourly("2024-01-02", 48, value=5.0)[["time", "pm10"]]
+        storage.upsert_frame(new, dst, "time")
+        back = storage.read_frame(dst, "time")
+        assert list(back.columns) == ["pm10", "pm2_5"] and len(back) == 72
+        assert (back.loc["2024-01-02":, "pm10"] == 5.0).all()
+        assert back.loc["2024-01-02", "pm2_5"].tolist() == [float(h) for h in range(24, 48)]
+        assert back.loc["2024-01-03":, "pm2_5"].isna().all()
+
+
+def test_float32_and_csv(tmp_path):
+    df = _hourly("2024-01-01", 10)
+    p = storage.write_frame(df, tmp_path / "one.parquet", "time", float32=True)
+    assert storage.read_frame(p, "time")["pm10"].dtype == np.float32
+
+    csv = storage.write_frame(df, tmp_path / "one.csv", "time")
+    assert storage.read_frame(csv, "time").shape == (10, 2)
+
+
+def test_signature_tracks_rewrites(tmp_path):
+    ds = tmp_path / "city=x"
+    assert storage.signature(ds) == ()
+    storage.write_frame(_hourly("2024-01-01", 24 * 40), ds, "time")
+    before = storage.signature(ds)
+    assert len(before) == 3  # schema + two months
+    storage.upsert_frame(_hourly("2024-02-05", 48, value=9.0), ds, "time")
+    after = storage.signature(ds)
+    assert after != before and after[1] == before[1]  # January untouched